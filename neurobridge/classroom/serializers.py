@@ -46,6 +46,10 @@ class ClassroomMembershipSerializer(serializers.ModelSerializer):
         return obj.classroom.name
 
 
+class RescoreClassroomSerializer(serializers.Serializer):
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+
 class JoinClassroomSerializer(serializers.Serializer):
     join_code = serializers.CharField(max_length=6)
     
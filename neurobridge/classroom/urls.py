@@ -11,6 +11,7 @@ urlpatterns = [
     path('<int:pk>/delete/', views.ClassroomDeleteView.as_view(), name='classroom-delete'),
     path('<int:pk>/students/', views.ClassroomStudentsView.as_view(), name='classroom-students'),
     path('<int:classroom_id>/remove-student/<int:student_id>/', views.remove_student, name='remove-student'),
+    path('<int:classroom_id>/rescore/', views.rescore_classroom, name='rescore-classroom'),
     
     # Student classroom management
     path('student-classrooms/', views.StudentClassroomListView.as_view(), name='student-classrooms'),
@@ -1,3 +1,4 @@
+import time
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -7,7 +8,7 @@ from django.db import IntegrityError
 from .models import Classroom, ClassroomMembership
 from .serializers import (
     ClassroomSerializer, ClassroomMembershipSerializer, 
-    JoinClassroomSerializer, ClassroomRosterSerializer
+    JoinClassroomSerializer, ClassroomRosterSerializer, RescoreClassroomSerializer
 )
 from profiles.models import StudentProfile, TeacherProfile
 
@@ -363,6 +364,83 @@ def remove_student(request, classroom_id, student_id):
         )
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def rescore_classroom(request, classroom_id):
+    """
+    Re-run the dyslexia/autism predictions of a classroom (teachers only), e.g. after a
+    model update. Each active student's latest assessment is scored, with one batched
+    model call per condition; pass {"dry_run": true} (or "true"/"1") to return the results
+    without updating the student profiles.
+    """
+    from quiz_generator.batch_predictions import latest_assessment_sessions, rescore_sessions
+
+    if request.user.user_type != 'teacher':
+        return Response(
+            {'error': 'Only teachers can rescore classrooms.'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    serializer = RescoreClassroomSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    dry_run = serializer.validated_data['dry_run']
+
+    try:
+        teacher_profile = request.user.teacher_profile
+        classroom = get_object_or_404(Classroom, id=classroom_id, teacher=teacher_profile)
+
+        students = {
+            profile.user_id: profile
+            for profile in StudentProfile.objects.filter(
+                classroom_memberships__classroom=classroom,
+                classroom_memberships__is_active=True
+            ).select_related('user')
+        }
+        sessions = latest_assessment_sessions(list(students))
+
+        started = time.perf_counter()
+        results = rescore_sessions(sessions, update_profiles=not dry_run)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        def summary(result):
+            if result is None:
+                return None
+            return {
+                'predicted_level': result['predicted_level'],
+                'confidence': result['confidence'],
+                'question_count': result['question_count'],
+            }
+
+        scored = []
+        for session in sessions:
+            student = students[session.user_id]
+            scored.append({
+                'student_id': student.id,
+                'student_name': student.user.get_full_name() or student.user.username,
+                'session_id': str(session.session_id),
+                'assessment_type': session.assessment_type,
+                'assessed_at': session.created_at,
+                'dyslexia': summary(results[session.pk]['dyslexia']),
+                'autism': summary(results[session.pk]['autism']),
+            })
+
+        return Response({
+            'classroom_id': classroom.id,
+            'dry_run': dry_run,
+            'total_students': len(students),
+            'sessions_scored': len(sessions),
+            'elapsed_ms': round(elapsed_ms, 2),
+            'results': scored,
+        })
+
+    except TeacherProfile.DoesNotExist:
+        return Response(
+            {'error': 'Teacher profile not found.'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def classroom_stats(request, classroom_id):
@@ -248,3 +248,80 @@ CELERY_RESULT_SERIALIZER = 'json'
 
 # Google API Configuration
 GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+
+# Quiz question bank: pre-generated questions per (condition, difficulty) partition
+QUESTION_BANK_ENABLED = os.environ.get('QUESTION_BANK_ENABLED', 'True') == 'True'
+QUESTION_BANK_LOW_WATER_MARK = int(os.environ.get('QUESTION_BANK_LOW_WATER_MARK', 20))
+QUESTION_BANK_REFILL_BATCH_SIZE = 10
+QUESTION_BANK_CLAIM_ATTEMPTS = 3  # Draws per quiz when concurrent requests claim the same rows
+
+# Quiz generation fan-out: one concurrent Gemini prompt per (condition, difficulty) shard
+QUIZ_GENERATION_FAN_OUT = os.environ.get('QUIZ_GENERATION_FAN_OUT', 'True') == 'True'
+QUIZ_GENERATION_MAX_WORKERS = 6
+QUIZ_GENERATION_SHARD_RETRIES = 2
+# Hold single-call mixed generations to the exact dyslexia/autism split per difficulty
+# (re-requesting the short side); False accepts any split with the right count per difficulty
+QUIZ_EXACT_MIXED_SPLIT = os.environ.get('QUIZ_EXACT_MIXED_SPLIT', 'True') == 'True'
+
+# LLM backend for question generation: {'name': 'gemini'}, the offline
+# {'name': 'fake', 'latency': 2.0, 'tokens_per_second': 80, 'error_rate': 0.0}, or several
+# backends raced with hedging, e.g. {'name': 'hedged', 'hedge_percentile': 95,
+# 'backends': [{'name': 'gemini'}, {'name': 'gemini', 'model': 'gemini-1.5-flash-8b'}]}
+# (QUIZ_LLM_BACKEND=hedged alone races two Gemini requests)
+QUIZ_LLM_BACKEND = {'name': os.environ.get('QUIZ_LLM_BACKEND', 'gemini')}
+
+# Background quiz generation jobs (/api/quiz/jobs/)
+QUIZ_GENERATION_JOB_WORKERS = int(os.environ.get('QUIZ_GENERATION_JOB_WORKERS', 4))
+QUIZ_GENERATION_JOB_TIMEOUT = 300  # Seconds before an unfinished job is reported as failed
+
+# Share one generation between identical in-flight quiz requests, and cap the number of
+# LLM calls running at once per process; excess calls queue for up to the timeout (seconds)
+QUIZ_GENERATION_COALESCE = os.environ.get('QUIZ_GENERATION_COALESCE', 'True') == 'True'
+QUIZ_LLM_MAX_CONCURRENT_CALLS = int(os.environ.get('QUIZ_LLM_MAX_CONCURRENT_CALLS', 8))
+QUIZ_LLM_QUEUE_TIMEOUT = 30
+
+# Circuit breaker around question generation: opens when at least MIN_CALLS generations in
+# the window ran and FAILURE_RATE of them failed or took longer than SLOW_CALL_SECONDS.
+# While open, quizzes come from stored questions and the generator is probed every OPEN_SECONDS.
+QUIZ_BREAKER_WINDOW_SECONDS = 60
+QUIZ_BREAKER_MIN_CALLS = 5
+QUIZ_BREAKER_FAILURE_RATE = 0.5
+QUIZ_BREAKER_SLOW_CALL_SECONDS = 20
+QUIZ_BREAKER_OPEN_SECONDS = 30
+
+# In-process LRU cache of question answer keys used to score submissions. Question edits
+# change a version stamp in the VERSION_CACHE Django cache, checked on every lookup; it must
+# be a cache shared by all workers (Redis, Memcached, database) for edits to reach them at
+# once. With the default per-process LocMemCache, other workers can serve an edited key for
+# up to TTL seconds.
+QUIZ_ANSWER_KEY_CACHE_SIZE = int(os.environ.get('QUIZ_ANSWER_KEY_CACHE_SIZE', 10000))
+QUIZ_ANSWER_KEY_CACHE_TTL = 300
+QUIZ_ANSWER_KEY_VERSION_CACHE = 'default'
+
+# Post-submission ML predictions run from a DB-backed queue (PredictionTask). EXECUTOR is
+# 'thread' or 'process' to run them in a pool inside the web process once the submission
+# commits, or 'worker' to leave them to `manage.py run_prediction_worker`, which also
+# retries failures and recovers tasks left behind by restarts.
+QUIZ_PREDICTION_EXECUTOR = os.environ.get('QUIZ_PREDICTION_EXECUTOR', 'thread')
+QUIZ_PREDICTION_WORKERS = int(os.environ.get('QUIZ_PREDICTION_WORKERS', 2))
+QUIZ_PREDICTION_MAX_ATTEMPTS = 3
+QUIZ_PREDICTION_RETRY_DELAY = 5  # Seconds before the first retry, doubled for each further one
+QUIZ_PREDICTION_TASK_TIMEOUT = 300  # Seconds before a running task is considered stale
+
+# Prediction model artifacts, loaded once per process by quiz_generator.model_registry and
+# shared by both predictors (autism reuses the dyslexia model unless given its own path).
+# With WARM_UP_MODELS the WSGI app and prediction workers load them at startup.
+# The models default to the tree-array export of dyslexia_level_predictor.joblib and the
+# encoder to the categories of difficulty_encoder.joblib (rebuild both with
+# `manage.py export_model_arrays` after retraining): they are memory-mapped with
+# MODEL_MMAP_MODE, so worker processes share their pages, and need no XGBoost, sklearn or
+# pandas at runtime.
+QUIZ_DYSLEXIA_MODEL_PATH = os.path.join(BASE_DIR, 'dyslexia_level_predictor.trees.joblib')
+QUIZ_AUTISM_MODEL_PATH = QUIZ_DYSLEXIA_MODEL_PATH
+QUIZ_DIFFICULTY_ENCODER_PATH = os.path.join(BASE_DIR, 'difficulty_encoder.categories.joblib')
+QUIZ_WARM_UP_MODELS = os.environ.get('QUIZ_WARM_UP_MODELS', 'False') == 'True'
+QUIZ_MODEL_MMAP_MODE = 'r'  # None reads exported arrays into each process's memory instead
+# Pickled XGBoost models given as model paths are flattened at load and evaluated with
+# NumPy (quiz_generator.tree_ensemble) like the exported arrays; False keeps XGBoost.
+# Compare the two with `manage.py benchmark_tree_evaluator`.
+QUIZ_CONVERT_XGBOOST_MODELS = os.environ.get('QUIZ_CONVERT_XGBOOST_MODELS', 'True') == 'True'
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neurobridge.settings')
 
 application = get_wsgi_application()
+
+# Load the prediction models before the first request instead of during it
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'QUIZ_WARM_UP_MODELS', False):
+    from quiz_generator.model_registry import get_model_registry
+    get_model_registry().warm_up()
@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import AssessmentQuestion, AssessmentSession, AssessmentResponse
+from .models import AssessmentQuestion, AssessmentSession, AssessmentResponse, PredictionTask, QuizGenerationJob, QuizSession
 
 @admin.register(AssessmentQuestion)
 class AssessmentQuestionAdmin(admin.ModelAdmin):
     list_display = ['question_id', 'condition_type', 'difficulty_level', 'question_text_short', 'correct_answer', 'created_at']
-    list_filter = ['condition_type', 'difficulty_level', 'created_at']
-    search_fields = ['question_text', 'question_id']
-    readonly_fields = ['question_id', 'created_at']
+    list_filter = ['condition_type', 'difficulty_level', 'in_bank', 'created_at']
+    search_fields = ['question_text', 'question_id', 'content_hash']
+    readonly_fields = ['question_id', 'content_hash', 'created_at']
     
     def question_text_short(self, obj):
         return obj.question_text[:50] + "..." if len(obj.question_text) > 50 else obj.question_text
@@ -44,3 +44,24 @@ class AssessmentResponseAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('session__user', 'question')
+
+@admin.register(QuizGenerationJob)
+class QuizGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'user', 'assessment_type', 'status', 'questions_ready', 'created_at', 'completed_at']
+    list_filter = ['status', 'assessment_type', 'created_at']
+    search_fields = ['user__username', 'job_id']
+    readonly_fields = ['job_id', 'created_at', 'started_at', 'completed_at']
+
+@admin.register(QuizSession)
+class QuizSessionAdmin(admin.ModelAdmin):
+    list_display = ['session_id', 'user', 'assessment_type', 'total_questions', 'created_at']
+    list_filter = ['assessment_type', 'created_at']
+    search_fields = ['user__username', 'session_id']
+    readonly_fields = ['session_id', 'created_at']
+
+@admin.register(PredictionTask)
+class PredictionTaskAdmin(admin.ModelAdmin):
+    list_display = ['session', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'completed_at']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['session__user__username', 'session__session_id']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
@@ -0,0 +1,182 @@
+# quiz_generator/answer_key_cache.py
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+# Everything scoring needs from an AssessmentQuestion; pk lets responses be bulk-created
+# with question_id=pk without fetching the question row
+AnswerKey = namedtuple('AnswerKey', ['pk', 'question_id', 'options', 'correct_answer', 'condition_type', 'difficulty_level'])
+
+ANSWER_KEY_FIELDS = ['id', 'question_id', 'options', 'correct_answer', 'condition_type', 'difficulty_level']
+
+# Django cache key of the stamp that changes whenever any answer key is edited
+ANSWER_KEY_VERSION_KEY = 'quiz_generator:answer_key_version'
+
+
+def to_answer_key(question):
+    """Build the AnswerKey for an AssessmentQuestion."""
+    return AnswerKey(
+        pk=question.pk,
+        question_id=str(question.question_id),
+        options=tuple(question.options or ()),
+        correct_answer=question.correct_answer,
+        condition_type=question.condition_type,
+        difficulty_level=question.difficulty_level
+    )
+
+
+class AnswerKeyCache:
+    """
+    Bounded, thread-safe LRU cache of AnswerKeys keyed by str(question_id).
+
+    When given a version callable, every lookup first compares its result with the
+    version the entries were cached under and drops them all if it changed; that is how
+    an edit made in another worker process reaches this one. Entries older than ttl
+    seconds are also treated as misses, bounding staleness should an edit not change
+    the version.
+
+    Args:
+        max_size (int): Maximum number of cached questions.
+        ttl (float, optional): Seconds an entry stays valid; None keeps entries until evicted.
+        version (callable, optional): Returns the current answer-key version.
+    """
+
+    def __init__(self, max_size=10000, ttl=None, version=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = version
+        self._entries = OrderedDict()  # question_id -> (stored_at, AnswerKey)
+        self._entries_version = None
+        self._lock = threading.Lock()
+        self.version_changes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, question_ids):
+        """
+        Look up several question ids at once.
+
+        Returns:
+            tuple: ({question_id: AnswerKey} for cached ids, [ids that missed]).
+        """
+        found = {}
+        missing = []
+        now = time.monotonic()
+        version = self.version() if self.version is not None else None
+        with self._lock:
+            if version != self._entries_version:
+                if self._entries:
+                    self.version_changes += 1
+                self._entries.clear()
+                self._entries_version = version
+            for question_id in question_ids:
+                entry = self._entries.get(question_id)
+                if entry is not None and (self.ttl is None or now - entry[0] < self.ttl):
+                    self._entries.move_to_end(question_id)
+                    found[question_id] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._entries[question_id]
+                    missing.append(question_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, questions):
+        """Cache AssessmentQuestions (or AnswerKeys); returns the AnswerKeys."""
+        keys = [question if isinstance(question, AnswerKey) else to_answer_key(question) for question in questions]
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._entries[key.question_id] = (now, key)
+                self._entries.move_to_end(key.question_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return keys
+
+    def invalidate(self, question_id):
+        with self._lock:
+            self._entries.pop(str(question_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'version_changes': self.version_changes,
+            }
+
+
+def _version_cache():
+    from django.conf import settings
+    from django.core.cache import caches
+    return caches[getattr(settings, 'QUIZ_ANSWER_KEY_VERSION_CACHE', 'default')]
+
+
+def current_answer_key_version():
+    """The answer-key version stamp in Django's cache (None until the first edit)."""
+    try:
+        return _version_cache().get(ANSWER_KEY_VERSION_KEY)
+    except Exception:
+        # Without the stamp every lookup refetches, which is slower but never stale
+        return uuid.uuid4().hex
+
+
+def invalidate_answer_keys(question_ids=()):
+    """
+    Make every worker drop its cached answer keys once the current transaction commits,
+    so none of them can re-cache the old row in between.
+
+    The post_save and post_delete signals call this for single-row edits. Writes that
+    fire no signals (QuerySet.update, bulk_update, raw SQL) must call it themselves when
+    they change a question's options, correct answer, condition or difficulty.
+
+    Args:
+        question_ids (iterable, optional): Edited question ids, dropped from this
+                                           process's cache even if the stamp cannot be set.
+    """
+    from django.db import transaction
+    question_ids = list(question_ids)
+
+    def publish():
+        cache = get_answer_key_cache()
+        for question_id in question_ids:
+            cache.invalidate(question_id)
+        try:
+            _version_cache().set(ANSWER_KEY_VERSION_KEY, uuid.uuid4().hex, None)
+        except Exception as e:
+            print(f"Failed to publish answer-key invalidation: {e}")
+
+    transaction.on_commit(publish)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_key_cache():
+    """Return the process-wide AnswerKeyCache, sized from settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from django.conf import settings
+                _cache = AnswerKeyCache(
+                    max_size=getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_SIZE', 10000),
+                    ttl=getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_TTL', 300),
+                    version=current_answer_key_version
+                )
+    return _cache
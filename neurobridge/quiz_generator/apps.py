@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QuizGeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'quiz_generator'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,34 +1,22 @@
 # quiz_generator/autism_predictor.py
-import joblib
-import pandas as pd
 from collections import Counter
-import os
-from django.conf import settings
+
+from .inference import difficulty_codes, feature_matrix, predict_levels, session_results
+from .model_registry import get_model_registry
 
 class AutismLevelPredictor:
-    def __init__(self):
-        # Use the same model files as dyslexia for now - can be separated later if needed
-        # For autism, we can either:
-        # 1. Use the same dyslexia model (current approach)
-        # 2. Create separate autism_level_predictor.joblib and autism_difficulty_encoder.joblib files
-        model_path = os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib')
-        encoder_path = os.path.join(settings.BASE_DIR, 'difficulty_encoder.joblib')
-        
-        try:
-            import warnings
-            # Suppress sklearn version warnings
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=UserWarning)
-                self.model = joblib.load(model_path)
-                self.encoder = joblib.load(encoder_path)
-        except FileNotFoundError as e:
-            print(f"Autism model files not found: {e}")
-            self.model = None
-            self.encoder = None
-        except Exception as e:
-            print(f"Error loading autism model: {e}")
-            self.model = None
-            self.encoder = None
+    """
+    Predicts autism level. Uses the registry's 'autism_model', which is the same shared
+    dyslexia model object unless QUIZ_AUTISM_MODEL_PATH points at a separate file.
+    """
+
+    @property
+    def model(self):
+        return get_model_registry().get('autism_model')
+
+    @property
+    def encoder(self):
+        return get_model_registry().get('difficulty_encoder')
 
     def predict_autism_level(self, autism_responses):
         """
@@ -58,7 +46,8 @@ class AutismLevelPredictor:
             }
         
         # Check if model is available
-        if self.model is None or self.encoder is None:
+        model, encoder = self.model, self.encoder
+        if model is None or encoder is None:
             print("Autism model not available, returning default prediction")
             return {
                 'predicted_level': 'low',  # Default fallback
@@ -68,28 +57,15 @@ class AutismLevelPredictor:
             }
         
         try:
-            # Prepare new data from backend (same approach as dyslexia)
-            new_data = pd.DataFrame(autism_responses)
-            
-            # Preprocess the data
-            new_data['is_correct'] = new_data['is_correct'].astype(int)
-            new_data['difficulty_level'] = self.encoder.transform(new_data[['difficulty_level']])
-            
-            # Predict using the same model
-            predictions = self.model.predict(new_data)
-            prediction_probabilities = self.model.predict_proba(new_data)
-            
-            # Map predictions to readable labels (same as dyslexia)
-            prediction_map = {0: 'no', 1: 'low', 2: 'medium', 3: 'high'}
-            my_list = [prediction_map[p] for p in predictions]
+            # Float32 feature matrix with difficulty encoded from a lookup table; one
+            # predict_proba call gives both the per-question levels and the confidence
+            features = feature_matrix(autism_responses, difficulty_codes(encoder))
+            my_list, confidence = predict_levels(model, features)
             
             # Determine final prediction based on most frequent result
             counts = Counter(my_list)
             most_frequent = counts.most_common(1)[0][0]
             
-            # Calculate confidence as the average maximum probability across all predictions
-            confidence = float(prediction_probabilities.max(axis=1).mean())
-            
             print("Autism Predicted Levels:", my_list)
             print("Final autism answer: student is", most_frequent)
             
@@ -109,13 +85,35 @@ class AutismLevelPredictor:
                 'question_count': len(autism_responses)
             }
 
-# Global instance
+    def predict_autism_levels(self, sessions_responses):
+        """
+        Batch version of predict_autism_level: predicts many sessions with one
+        predict_proba call over their stacked responses.
+        
+        Args:
+            sessions_responses: List with one list of response dicts per session, each
+                in the shape predict_autism_level takes.
+        
+        Returns:
+            list: One result dict per session, as predict_autism_level would return it.
+        """
+        model, encoder = self.model, self.encoder
+        if model is not None and encoder is not None:
+            try:
+                return session_results(model, encoder, sessions_responses)
+            except Exception as e:
+                print(f"Error making batch autism prediction: {e}")
+        # Model unavailable or a bad session in the batch: score sessions one by one
+        return [self.predict_autism_level(responses) for responses in sessions_responses]
+
+# Global instance (cheap: the model loads on first prediction or registry warm-up)
 autism_predictor = AutismLevelPredictor()
 
-def run_autism_prediction_async(assessment_session_id):
+def run_autism_prediction(assessment_session_id):
     """
-    Asynchronous function to run autism prediction for a completed assessment.
+    Run autism prediction for a completed assessment.
     Uses the same XGBoost model approach as dyslexia prediction.
+    Runs as a PredictionTask (see prediction_tasks.py); errors propagate so the task can be retried.
     
     Args:
         assessment_session_id: ID of the completed assessment session
@@ -124,39 +122,33 @@ def run_autism_prediction_async(assessment_session_id):
     from profiles.models import StudentProfile
     from django.utils import timezone
     
-    try:
-        # Get the assessment session
-        session = AssessmentSession.objects.get(id=assessment_session_id)
-        
-        # Only run prediction if assessment includes autism questions
-        if session.assessment_type not in ['autism', 'both']:
-            return
-        
-        # Extract autism responses from the session
-        autism_responses = []
-        for response in session.responses.all():
-            if response.question.condition_type == 'autism':
-                autism_responses.append({
-                    'difficulty_level': response.question.difficulty_level,
-                    'response_time': response.response_time or 30.0,  # Default if not recorded
-                    'is_correct': response.is_correct
-                })
+    # Get the assessment session
+    session = AssessmentSession.objects.select_related('user').get(id=assessment_session_id)
+    
+    # Only run prediction if assessment includes autism questions
+    if session.assessment_type not in ['autism', 'both']:
+        return
+    
+    # Extract autism responses from the session
+    autism_responses = []
+    for response in session.responses.select_related('question'):
+        if response.question.condition_type == 'autism':
+            autism_responses.append({
+                'difficulty_level': response.question.difficulty_level,
+                'response_time': response.response_time or 30.0,  # Default if not recorded
+                'is_correct': response.is_correct
+            })
+    
+    if autism_responses:
+        # Run prediction using the same model approach as dyslexia
+        prediction_result = autism_predictor.predict_autism_level(autism_responses)
         
-        if autism_responses:
-            # Run prediction using the same model approach as dyslexia
-            prediction_result = autism_predictor.predict_autism_level(autism_responses)
-            
-            # Update student profile with prediction results
-            student_profile, created = StudentProfile.objects.get_or_create(
-                user=session.user,
-                defaults={'student_id': f'STU{session.user.id:06d}'}
-            )
-            student_profile.autism_prediction_level = prediction_result['predicted_level']
-            student_profile.autism_prediction_confidence = prediction_result['confidence']
-            student_profile.autism_prediction_date = timezone.now()
-            student_profile.save()
-            
-    except Exception as e:
-        # Log error but don't raise to avoid breaking the main flow
-        print(f"Error in autism prediction: {e}")
-        pass
+        # Update student profile with prediction results
+        student_profile, created = StudentProfile.objects.get_or_create(
+            user=session.user,
+            defaults={'student_id': f'STU{session.user.id:06d}'}
+        )
+        student_profile.autism_prediction_level = prediction_result['predicted_level']
+        student_profile.autism_prediction_confidence = prediction_result['confidence']
+        student_profile.autism_prediction_date = timezone.now()
+        student_profile.save()
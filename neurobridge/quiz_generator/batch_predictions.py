@@ -0,0 +1,133 @@
+# quiz_generator/batch_predictions.py
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import AssessmentResponse, AssessmentSession
+
+# Which condition's responses each assessment type is scored on (as the single-session
+# run_*_prediction functions do)
+SCORED_CONDITIONS = {
+    'dyslexia': ('dyslexia',),
+    'autism': ('autism',),
+    'both': ('dyslexia', 'autism'),
+}
+
+
+def latest_assessment_sessions(user_ids):
+    """Each user's most recent AssessmentSession, in one query."""
+    return list(
+        AssessmentSession.objects
+        .filter(user_id__in=user_ids)
+        .annotate(recency=Window(
+            expression=RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .filter(recency=1)
+        .select_related('user')
+    )
+
+
+def load_session_responses(sessions):
+    """
+    Prediction inputs of many sessions from one query.
+
+    Returns:
+        dict: {session.pk: {"dyslexia": [response dicts], "autism": [response dicts]}}
+    """
+    grouped = {session.pk: {'dyslexia': [], 'autism': []} for session in sessions}
+    rows = (
+        AssessmentResponse.objects
+        .filter(session_id__in=list(grouped))
+        .order_by('session_id', 'id')
+        .values_list('session_id', 'question__condition_type', 'question__difficulty_level',
+                     'response_time', 'is_correct')
+    )
+    for session_id, condition_type, difficulty_level, response_time, is_correct in rows:
+        responses = grouped[session_id].get(condition_type)
+        if responses is not None:
+            responses.append({
+                'difficulty_level': difficulty_level,
+                'response_time': response_time or 30.0,  # Default if not recorded
+                'is_correct': is_correct
+            })
+    return grouped
+
+
+def predict_sessions(sessions):
+    """
+    Predict the dyslexia and autism levels of many sessions, with one batched model call
+    per condition instead of one per session.
+
+    Args:
+        sessions (list): AssessmentSession objects.
+
+    Returns:
+        dict: {session.pk: {"dyslexia": result or None, "autism": result or None}}, where a
+              result is the dict the predictors return; None when the session has no
+              scored responses for that condition.
+    """
+    from .autism_predictor import autism_predictor
+    from .dyslexia_predictor import predictor
+
+    responses = load_session_responses(sessions)
+    results = {session.pk: {'dyslexia': None, 'autism': None} for session in sessions}
+    for condition, batch_predict in (
+        ('dyslexia', predictor.predict_dyslexia_levels),
+        ('autism', autism_predictor.predict_autism_levels),
+    ):
+        scored = [
+            session for session in sessions
+            if condition in SCORED_CONDITIONS.get(session.assessment_type, ()) and responses[session.pk][condition]
+        ]
+        if not scored:
+            continue
+        batch = batch_predict([responses[session.pk][condition] for session in scored])
+        for session, result in zip(scored, batch):
+            results[session.pk][condition] = result
+    return results
+
+
+def rescore_sessions(sessions, update_profiles=True):
+    """
+    Re-run the predictions of many sessions (e.g. a classroom after a model update) and
+    store them on the students' profiles with one bulk update.
+
+    Args:
+        sessions (list): AssessmentSession objects, at most one per user.
+        update_profiles (bool): False to only compute the results.
+
+    Returns:
+        dict: Per-session results, as predict_sessions returns them.
+    """
+    from profiles.models import StudentProfile
+
+    results = predict_sessions(sessions)
+    if not update_profiles:
+        return results
+
+    now = timezone.now()
+    profiles = {
+        profile.user_id: profile
+        for profile in StudentProfile.objects.filter(user_id__in=[session.user_id for session in sessions])
+    }
+    updated = []
+    for session in sessions:
+        profile = profiles.get(session.user_id)
+        session_results = results[session.pk]
+        if profile is None or not any(session_results.values()):
+            continue
+        for condition in ('dyslexia', 'autism'):
+            result = session_results[condition]
+            if result is not None:
+                setattr(profile, f'{condition}_prediction_level', result['predicted_level'])
+                setattr(profile, f'{condition}_prediction_confidence', result['confidence'])
+                setattr(profile, f'{condition}_prediction_date', now)
+        updated.append(profile)
+
+    StudentProfile.objects.bulk_update(updated, [
+        'dyslexia_prediction_level', 'dyslexia_prediction_confidence', 'dyslexia_prediction_date',
+        'autism_prediction_level', 'autism_prediction_confidence', 'autism_prediction_date',
+    ])
+    return results
@@ -0,0 +1,116 @@
+# quiz_generator/circuit_breaker.py
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """
+    Stops sending work to a failing or slow dependency and probes it in the background.
+
+    Outcomes of recent calls are kept for window_seconds. A call counts as failed if it
+    errored or took longer than slow_call_seconds. Once at least min_calls outcomes are
+    in the window and the failed share reaches failure_rate_threshold, the breaker opens:
+    allow_request() returns False, so callers use their fallback straight away.
+
+    After open_seconds a single background thread runs probe() (which must return True
+    on success). A successful probe closes the breaker with a clean window; a failed one
+    keeps it open for another open_seconds.
+
+    Args:
+        probe (callable): Cheap end-to-end check of the dependency, returning a bool.
+        window_seconds (float): How long call outcomes are remembered.
+        min_calls (int): Outcomes needed in the window before the breaker can open.
+        failure_rate_threshold (float): Failed share (0-1) that opens the breaker.
+        slow_call_seconds (float): Calls slower than this count as failures.
+        open_seconds (float): How long to wait before each background probe.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, probe, window_seconds=60, min_calls=5, failure_rate_threshold=0.5,
+                 slow_call_seconds=20, open_seconds=30):
+        self.probe = probe
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, failed)
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_thread = None
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def allow_request(self):
+        """Return True if the call should go to the dependency, False to use the fallback."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.rejected += 1
+            if (self.state == self.OPEN and self._probe_thread is None
+                    and time.monotonic() - self.opened_at >= self.open_seconds):
+                self.state = self.HALF_OPEN
+                self._probe_thread = threading.Thread(target=self._run_probe, name='circuit-breaker-probe', daemon=True)
+                self._probe_thread.start()
+            return False
+
+    def record(self, latency, error=False):
+        """Record the outcome of a call made while the breaker was closed."""
+        failed = error or latency > self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self.state != self.CLOSED:
+                return
+            self._outcomes.append((now, failed))
+            self._prune(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, call_failed in self._outcomes if call_failed)
+            if total >= self.min_calls and failures / total >= self.failure_rate_threshold:
+                self._open(now)
+                print(f"Circuit breaker opened: {failures} of {total} recent calls failed or were slow")
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+
+    def _run_probe(self):
+        try:
+            healthy = bool(self.probe())
+        except Exception as e:
+            print(f"Circuit breaker probe failed: {e}")
+            healthy = False
+        with self._lock:
+            self._probe_thread = None
+            if healthy:
+                self.state = self.CLOSED
+                self.opened_at = None
+                self._outcomes.clear()
+                print("Circuit breaker closed after a successful probe")
+            else:
+                self._open(time.monotonic())
+                self.times_opened -= 1  # Still the same outage
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, call_failed in self._outcomes if call_failed)
+            return {
+                'state': self.state,
+                'recent_calls': total,
+                'recent_failures': failures,
+                'open_for_seconds': round(now - self.opened_at, 3) if self.opened_at is not None else None,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected,
+            }
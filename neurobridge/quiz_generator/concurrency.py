@@ -0,0 +1,174 @@
+# quiz_generator/concurrency.py
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _django_setting(name, default):
+    """Read a Django setting, falling back to the default when Django is not configured."""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+class LLMQueueTimeout(RuntimeError):
+    """Raised when a request waited too long for a free LLM call slot."""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers arriving while it
+    is in flight wait for the leader and receive the same result, or the same exception.
+    Progress the function reports reaches the on_progress callback of the leader and of
+    every follower, and a follower that joins late first gets the latest value.
+    Nothing is cached once the call finishes.
+
+    Usage:
+        flight = SingleFlight()
+        result, shared = flight.do(("mixed", 6, 8, 6), lambda report: generate(on_progress=report))
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.exception = None
+            self.waiters = 0
+            self.listeners = []
+            self.progress = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, on_progress=None):
+        """
+        Run fn(report) once for all concurrent callers with the same key.
+
+        Args:
+            key: Hashable identity of the call.
+            fn (callable): Called by the leader with one argument, a report(value) callback
+                           that forwards progress to every caller's on_progress.
+            on_progress (callable, optional): Called with each reported value.
+
+        Returns:
+            tuple: (result, shared) where shared is True for callers that reused the
+                   leader's result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call()
+                leader = True
+            if on_progress is not None:
+                call.listeners.append(on_progress)
+            latest = call.progress
+
+        if not leader:
+            if on_progress is not None and latest is not None:
+                on_progress(latest)
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result, True
+
+        def report(value):
+            with self._lock:
+                call.progress = value
+                listeners = list(call.listeners)
+            for listener in listeners:
+                try:
+                    listener(value)
+                except Exception as e:
+                    # One caller's broken callback must not fail the shared call
+                    print(f"Progress callback failed for {key}: {e}")
+
+        try:
+            call.result = fn(report)
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        """Return {key: number of waiting followers} for calls currently running."""
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
+
+
+class LLMCallLimiter:
+    """
+    Caps the number of LLM calls running at once in this process.
+
+    Callers beyond the cap queue on the semaphore instead of all hitting the provider at
+    the same time; a caller that waits longer than queue_timeout seconds gets
+    LLMQueueTimeout.
+    """
+
+    def __init__(self, max_concurrent_calls, queue_timeout):
+        self.max_concurrent_calls = max_concurrent_calls
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent_calls)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """
+        Hold one call slot for the duration of the with-block; yields the seconds spent queued.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a slot instead of queue_timeout;
+                                       0 takes a slot only if one is free right away.
+        """
+        with self._lock:
+            self.waiting += 1
+        start = time.monotonic()
+        acquired = self._semaphore.acquire(timeout=self.queue_timeout if timeout is None else timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+        if not acquired:
+            raise LLMQueueTimeout(
+                f"No free LLM call slot after {time.monotonic() - start:.1f}s "
+                f"({self.max_concurrent_calls} calls already running)"
+            )
+        try:
+            yield time.monotonic() - start
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._semaphore.release()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+generation_flight = SingleFlight()
+
+
+def get_llm_limiter():
+    """Return the process-wide LLMCallLimiter, sized from settings on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = LLMCallLimiter(
+                    max_concurrent_calls=_django_setting('QUIZ_LLM_MAX_CONCURRENT_CALLS', 8),
+                    queue_timeout=_django_setting('QUIZ_LLM_QUEUE_TIMEOUT', 30)
+                )
+    return _limiter
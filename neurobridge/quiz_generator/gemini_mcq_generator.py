@@ -1,52 +1,56 @@
 import os
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_core.output_parsers import StrOutputParser
-from pprint import pprint  # For debugging, if needed
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from .concurrency import get_llm_limiter
+from .llm_backends import DEFAULT_HEDGED_BACKENDS, create_backend
+from .llm_metrics import llm_metrics
+from .question_stream import QuestionStreamParser, salvage_questions, validate_question
 
-def generate_assessment_questions(
-    condition: str,
-    num_easy: int,
-    num_moderate: int,
-    num_hard: int,
-    google_api_key: str = None
-) -> dict:
+CONDITION_TYPES = ['dyslexia', 'autism']
+DIFFICULTY_LEVELS = ['easy', 'moderate', 'hard']
+
+
+def split_distribution(condition, num_easy, num_moderate, num_hard):
     """
-    Generates assessment questions for a given condition (dyslexia or autism)
-    using the Gemini model via Langchain, with a specific JSON output format.
+    Split a difficulty distribution into (condition, difficulty) partitions.
 
     Args:
-        condition (str): The learning condition, e.g., "dyslexia" or "autism".
-        num_easy (int): Number of easy questions to generate.
-        num_moderate (int): Number of moderate questions to generate.
-        num_hard (int): Number of hard questions to generate.
-        google_api_key (str, optional): Google API key. If None, it tries to read from
-                                       the GOOGLE_API_KEY environment variable.
+        condition (str): "dyslexia", "autism" or "mixed".
+        num_easy (int): Number of easy questions.
+        num_moderate (int): Number of moderate questions.
+        num_hard (int): Number of hard questions.
 
     Returns:
-        dict: A dictionary containing the generated questions in the specified JSON structure,
-              or an error message if generation fails.
+        dict: {(condition_type, difficulty_level): count} for every non-empty partition.
+              For "mixed", each difficulty is split evenly between dyslexia and autism,
+              with odd remainders alternating so the totals stay half and half.
     """
-    # API Key Handling: Prioritize passed key, then environment variable.
-    if google_api_key:
-        os.environ["GOOGLE_API_KEY"] = google_api_key
-    elif not os.getenv("GOOGLE_API_KEY"):
-        return {
-            "error": "GOOGLE_API_KEY not found. Please set it as an environment variable or pass it as an argument."
-        }
+    counts = {'easy': num_easy, 'moderate': num_moderate, 'hard': num_hard}
+    partitions = {}
 
-    try:
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.7)
-    except Exception as e:
-        return {
-            "error": f"Failed to initialize Gemini model: {str(e)}"
-        }
+    if condition in CONDITION_TYPES:
+        for difficulty, count in counts.items():
+            if count > 0:
+                partitions[(condition, difficulty)] = count
+        return partitions
+
+    # Mixed: the prompt gives autism the extra question on odd totals, so do the same
+    extra_goes_to = 'autism'
+    for difficulty, count in counts.items():
+        per_condition = {'dyslexia': count // 2, 'autism': count // 2}
+        if count % 2:
+            per_condition[extra_goes_to] += 1
+            extra_goes_to = 'dyslexia' if extra_goes_to == 'autism' else 'autism'
+        for condition_type, n in per_condition.items():
+            if n > 0:
+                partitions[(condition_type, difficulty)] = n
+    return partitions
 
-    total_questions = num_easy + num_moderate + num_hard
 
-    prompt_template_str = """
+PROMPT_TEMPLATE = """
     You are an AI assistant specialized in creating educational assessment tools.
     Your primary task is to generate a set of Multiple Choice Questions (MCQs) tailored for students with {condition}.
     The questions should cover different difficulty levels: {num_easy} easy, {num_moderate} moderate, and {num_hard} hard.
@@ -153,68 +157,442 @@ def generate_assessment_questions(
     Ensure the entire output is ONLY the JSON object, starting with {{ and ending with }}.
     """
 
-    prompt = PromptTemplate(
-        template=prompt_template_str,
-        input_variables=["condition", "num_easy", 
-                        "num_moderate", "num_hard", "total_questions", "half_dyslexia", "half_autism"]
-    )
+PROMPT_INPUT_VARIABLES = [
+    "condition", "num_easy", "num_moderate", "num_hard",
+    "total_questions", "half_dyslexia", "half_autism"
+]
 
-    chain = LLMChain(llm=llm, prompt=prompt, output_parser=StrOutputParser())
 
-    # Calculate half values for mixed condition
+def _prompt_variables(condition: str, num_easy: int, num_moderate: int, num_hard: int) -> dict:
+    """Build the template variables, including the half/half split for the mixed condition."""
+    total_questions = num_easy + num_moderate + num_hard
     half_dyslexia = total_questions // 2
     half_autism = total_questions - half_dyslexia  # Handle odd numbers
+    return {
+        "condition": condition,
+        "num_easy": num_easy,
+        "num_moderate": num_moderate,
+        "num_hard": num_hard,
+        "total_questions": total_questions,
+        "half_dyslexia": half_dyslexia,
+        "half_autism": half_autism
+    }
 
-    try:
-        response = chain.invoke({
-            "condition": condition,
-            "num_easy": num_easy,
-            "num_moderate": num_moderate,
-            "num_hard": num_hard,
-            "total_questions": total_questions,
-            "half_dyslexia": half_dyslexia,
-            "half_autism": half_autism
-        })
-        
-        # Get the response text
-        response_str = response["text"]
-        cleaned_response_str = response_str.strip()
-        
-        # Clean up potential markdown code block formatting
-        if cleaned_response_str.startswith("```json"):
-            cleaned_response_str = cleaned_response_str[7:]
-        if cleaned_response_str.startswith("```"):
-            cleaned_response_str = cleaned_response_str[3:]
-        if cleaned_response_str.endswith("```"):
-            cleaned_response_str = cleaned_response_str[:-3]
-        
-        cleaned_response_str = cleaned_response_str.strip()
 
-        # Parse the JSON response
-        generated_questions = json.loads(cleaned_response_str)
-        
-        # Validate the response structure
-        if "questions" not in generated_questions:
+class QuestionGenerator:
+    """
+    Process-wide question generator on top of a pluggable LLM backend.
+
+    The backend (see llm_backends) is built once per worker and reused for every
+    request, so the hot path skips client setup and TLS handshakes. Backends must be
+    safe to call from multiple threads, which makes generate() and stream() thread-safe.
+
+    Every backend call holds a slot of the process-wide LLMCallLimiter (a hedged backend
+    takes one per attempt), so at most QUIZ_LLM_MAX_CONCURRENT_CALLS calls are
+    outstanding and the rest queue. Calls and
+    generations are recorded in llm_metrics.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _invoke(self, variables: dict) -> str:
+        # Collected from the stream so the time to first byte can be measured
+        return "".join(self._stream_call(variables))
+
+    def _stream_call(self, variables: dict):
+        """Stream one backend call while holding a limiter slot, and record its metrics."""
+        usage = {}
+        requested_at = time.monotonic()
+        started_at = queue_wait = ttfb = None
+        failed = False
+        # A backend that races several calls takes a slot for each of them itself
+        slot = nullcontext(0.0) if getattr(self.backend, "acquires_llm_slots", False) else get_llm_limiter().slot()
+        try:
+            with slot as queue_wait:
+                started_at = time.monotonic()
+                on_usage = lambda prompt, completion: usage.update(prompt=prompt, completion=completion)
+                for chunk in self.backend.stream(variables, on_usage=on_usage):
+                    if ttfb is None:
+                        ttfb = time.monotonic() - started_at
+                    yield chunk
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished_at = time.monotonic()
+            llm_metrics.observe_call(
+                queue_wait=queue_wait if queue_wait is not None else finished_at - requested_at,
+                ttfb=ttfb,
+                latency=finished_at - started_at if started_at is not None else 0.0,
+                prompt_tokens=usage.get("prompt"),
+                completion_tokens=usage.get("completion"),
+                error=failed
+            )
+
+    def generate(
+        self,
+        condition: str,
+        num_easy: int,
+        num_moderate: int,
+        num_hard: int,
+        max_repair_rounds: int = 2,
+        exact_split: bool = None
+    ) -> dict:
+        """
+        Generate questions in one call, salvaging every valid question from the output.
+
+        If the response is malformed or short, only the missing (condition, difficulty)
+        slots are re-requested, up to max_repair_rounds times.
+
+        For the mixed condition, exact_split (default: the QUIZ_EXACT_MIXED_SPLIT setting)
+        holds the output to the dyslexia/autism split of split_distribution, so a response
+        with another split costs repair calls. With exact_split=False only the number of
+        questions per difficulty has to match and each question keeps its own focus_area.
+
+        Returns:
+            dict: {"condition", "questions", "salvaged", "repair_rounds"} on success, or an
+                  error dict with "missing_slots" if some slots could not be filled.
+        """
+        expected_slots = split_distribution(condition, num_easy, num_moderate, num_hard)
+        if exact_split is None:
+            exact_split = _django_setting("QUIZ_EXACT_MIXED_SPLIT", True)
+        response_str = None
+        started_at = time.monotonic()
+        parse_success = False
+        salvaged = repair_rounds = 0
+        succeeded = False
+        try:
+            response_str = self._invoke(_prompt_variables(condition, num_easy, num_moderate, num_hard))
+            questions, missing = salvage_questions(response_str, condition, expected_slots, exact_split=exact_split)
+            salvaged = len(questions)
+            parse_success = not missing
+
+            repair_rounds = 0
+            while missing and repair_rounds < max_repair_rounds:
+                repair_rounds += 1
+                for condition_type in sorted({c for c, _ in missing}):
+                    slots = {key: n for key, n in missing.items() if key[0] == condition_type}
+                    counts = {d: slots.get((condition_type, d), 0) for d in DIFFICULTY_LEVELS}
+                    repair_str = self._invoke(_prompt_variables(
+                        condition_type, counts['easy'], counts['moderate'], counts['hard']
+                    ))
+                    repaired, _ = salvage_questions(repair_str, condition_type, slots)
+                    for q in repaired:
+                        missing[(q["focus_area"], q["difficulty"])] -= 1
+                    questions.extend(repaired)
+                missing = {key: n for key, n in missing.items() if n > 0}
+
+            if missing:
+                error_message = f"Could not generate {sum(missing.values())} of {sum(expected_slots.values())} questions"
+                return {
+                    "error": error_message,
+                    "missing_slots": [
+                        {"condition": c, "difficulty": d, "count": n}
+                        for (c, d), n in missing.items()
+                    ],
+                    "raw_output": response_str
+                }
+
+            for i, q in enumerate(questions):
+                q["id"] = i + 1
+
+            succeeded = True
             return {
-                "error": "Invalid response format: missing 'questions' key",
-                "raw_output": response_str
+                "condition": condition,
+                "questions": questions,
+                "salvaged": salvaged,
+                "repair_rounds": repair_rounds
             }
-        
-        if "condition" not in generated_questions:
-            generated_questions["condition"] = condition
-            
-        return generated_questions
-        
-    except json.JSONDecodeError as e:
-        error_message = f"Failed to parse JSON response from LLM: {e}"
-        print(f"{error_message}\nLLM Output was:\n{response_str}")
-        return {"error": error_message, "raw_output": response_str}
-    except Exception as e:
-        error_message = f"An unexpected error occurred: {e}"
-        # Ensure response_str is defined for the error message
-        raw_output_for_error = response_str if 'response_str' in locals() else 'N/A'
-        print(f"{error_message}\nLLM Output was:\n{raw_output_for_error}")
-        return {"error": error_message, "raw_output": raw_output_for_error}
+
+        except Exception as e:
+            error_message = f"An unexpected error occurred: {e}"
+            raw_output_for_error = response_str if response_str is not None else 'N/A'
+            print(f"{error_message}\nLLM Output was:\n{raw_output_for_error}")
+            return {"error": error_message, "raw_output": raw_output_for_error}
+
+        finally:
+            llm_metrics.observe_generation(
+                latency=time.monotonic() - started_at,
+                parse_success=parse_success,
+                salvaged=0 if parse_success else salvaged,
+                retries=repair_rounds,
+                error=not succeeded
+            )
+
+    def stream(self, condition: str, num_easy: int, num_moderate: int, num_hard: int):
+        """Yield each question object as soon as its JSON is complete in the streamed output."""
+        parser = QuestionStreamParser()
+        started_at = time.monotonic()
+        expected_total = num_easy + num_moderate + num_hard
+        received = 0
+        failed = False
+        try:
+            for chunk in self._stream_call(_prompt_variables(condition, num_easy, num_moderate, num_hard)):
+                for question in parser.feed(chunk):
+                    received += 1
+                    yield question
+        except Exception:
+            failed = True
+            raise
+        finally:
+            llm_metrics.observe_generation(
+                latency=time.monotonic() - started_at,
+                parse_success=received >= expected_total,
+                salvaged=0,
+                retries=0,
+                error=failed
+            )
+
+
+# One generator per backend configuration and API key, built on first use in each worker process
+_generators = {}
+_generators_lock = threading.Lock()
+_generator_override = None
+
+
+def _django_setting(name: str, default):
+    """A Django setting when Django is configured (the module also runs standalone), else default."""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def _backend_config() -> dict:
+    """Backend settings from Django's QUIZ_LLM_BACKEND when available, else Gemini."""
+    return dict(_django_setting("QUIZ_LLM_BACKEND", None) or {"name": "gemini"})
+
+
+def _uses_gemini(config: dict) -> bool:
+    """Whether a backend config, or any backend nested in a hedged config, is Gemini."""
+    name = config.get("name", "gemini")
+    if name == "gemini":
+        return True
+    default_backends = DEFAULT_HEDGED_BACKENDS if name == "hedged" else []
+    return any(_uses_gemini(backend) for backend in config.get("backends", default_backends))
+
+
+def set_question_generator(generator):
+    """Use this generator for every call in the process (None restores the configured one)."""
+    global _generator_override
+    _generator_override = generator
+
+
+def get_question_generator(google_api_key: str = None) -> QuestionGenerator:
+    """
+    Return the shared QuestionGenerator, building it on first use.
+
+    Args:
+        google_api_key (str, optional): Google API key. If None, it is read from the
+                                       GOOGLE_API_KEY environment variable.
+
+    Raises:
+        RuntimeError: If no API key is available or the backend cannot be initialized.
+    """
+    if _generator_override is not None:
+        return _generator_override
+
+    config = _backend_config()
+    api_key = None
+    if _uses_gemini(config):
+        api_key = google_api_key or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "GOOGLE_API_KEY not found. Please set it as an environment variable or pass it as an argument."
+            )
+
+    cache_key = (json.dumps(config, sort_keys=True), api_key)
+    generator = _generators.get(cache_key)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(cache_key)
+            if generator is None:
+                try:
+                    backend = create_backend(config, PROMPT_TEMPLATE, PROMPT_INPUT_VARIABLES, google_api_key=api_key)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to initialize {config.get('name', 'gemini')} model: {str(e)}")
+                generator = QuestionGenerator(backend)
+                _generators[cache_key] = generator
+    return generator
+
+
+def generate_assessment_questions(
+    condition: str,
+    num_easy: int,
+    num_moderate: int,
+    num_hard: int,
+    google_api_key: str = None
+) -> dict:
+    """
+    Generates assessment questions for a given condition (dyslexia or autism)
+    using the Gemini model via Langchain, with a specific JSON output format.
+
+    Args:
+        condition (str): The learning condition, e.g., "dyslexia" or "autism".
+        num_easy (int): Number of easy questions to generate.
+        num_moderate (int): Number of moderate questions to generate.
+        num_hard (int): Number of hard questions to generate.
+        google_api_key (str, optional): Google API key. If None, it tries to read from
+                                       the GOOGLE_API_KEY environment variable.
+
+    Returns:
+        dict: A dictionary containing the generated questions in the specified JSON structure,
+              or an error message if generation fails.
+    """
+    try:
+        generator = get_question_generator(google_api_key)
+    except RuntimeError as e:
+        return {"error": str(e)}
+
+    return generator.generate(condition, num_easy, num_moderate, num_hard)
+
+
+def stream_assessment_questions(
+    condition: str,
+    num_easy: int,
+    num_moderate: int,
+    num_hard: int,
+    google_api_key: str = None
+):
+    """
+    Streams assessment questions from Gemini, yielding each question as soon as
+    its JSON object is complete instead of waiting for the whole response.
+
+    Args:
+        condition (str): "dyslexia", "autism" or "mixed".
+        num_easy (int): Number of easy questions to generate.
+        num_moderate (int): Number of moderate questions to generate.
+        num_hard (int): Number of hard questions to generate.
+        google_api_key (str, optional): Google API key. If None, it tries to read from
+                                       the GOOGLE_API_KEY environment variable.
+
+    Yields:
+        dict: One question object at a time, in the order the model writes them.
+
+    Raises:
+        RuntimeError: If no API key is available or the model cannot be initialized.
+    """
+    generator = get_question_generator(google_api_key)
+    yield from generator.stream(condition, num_easy, num_moderate, num_hard)
+
+def _validate_shard(result: dict, count: int):
+    """Return an error message if a shard result is unusable, otherwise None."""
+    if "error" in result:
+        return result["error"]
+    questions = result.get("questions", [])
+    if len(questions) != count:
+        return f"expected {count} questions but got {len(questions)}"
+    invalid = [i for i, q in enumerate(questions) if not validate_question(q)]
+    if invalid:
+        return f"invalid questions at positions {invalid}"
+    return None
+
+
+def _generate_shard(condition_type: str, difficulty: str, count: int, google_api_key: str = None) -> dict:
+    counts = {d: (count if d == difficulty else 0) for d in DIFFICULTY_LEVELS}
+    return generate_assessment_questions(
+        condition=condition_type,
+        num_easy=counts['easy'],
+        num_moderate=counts['moderate'],
+        num_hard=counts['hard'],
+        google_api_key=google_api_key
+    )
+
+
+def generate_assessment_questions_parallel(
+    condition: str,
+    num_easy: int,
+    num_moderate: int,
+    num_hard: int,
+    google_api_key: str = None,
+    max_workers: int = 6,
+    max_retries: int = 2,
+    on_progress=None
+) -> dict:
+    """
+    Generates assessment questions by fanning out one prompt per (condition, difficulty)
+    shard and running the shards concurrently on a bounded thread pool.
+
+    Wall-clock latency follows the slowest shard rather than the length of one big
+    response. Every shard is validated on its own, so a bad shard is retried alone.
+
+    Args:
+        condition (str): "dyslexia", "autism" or "mixed".
+        num_easy (int): Number of easy questions to generate.
+        num_moderate (int): Number of moderate questions to generate.
+        num_hard (int): Number of hard questions to generate.
+        google_api_key (str, optional): Google API key, passed through to each shard.
+        max_workers (int): Maximum number of shards generated at the same time.
+        max_retries (int): How many times a failed shard is retried before giving up.
+        on_progress (callable, optional): Called with the number of questions ready so far
+                                          each time a shard completes.
+
+    Returns:
+        dict: The same structure as generate_assessment_questions. Every question
+              carries "difficulty" and "focus_area" from its shard, and IDs are
+              renumbered from 1. On failure, an "error" key and the "failed_shards".
+    """
+    shards = split_distribution(condition, num_easy, num_moderate, num_hard)
+    if not shards:
+        return {"error": "At least one question must be requested"}
+
+    results = {}
+    failures = {}
+    attempts = {key: 0 for key in shards}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(shards)))) as executor:
+        def submit(key):
+            attempts[key] += 1
+            return executor.submit(_generate_shard, key[0], key[1], shards[key], google_api_key)
+
+        pending = {submit(key): key for key in shards}
+        while pending:
+            for future in as_completed(list(pending)):
+                key = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": f"An unexpected error occurred: {e}"}
+
+                problem = _validate_shard(result, shards[key])
+                if problem is None:
+                    results[key] = result["questions"]
+                    failures.pop(key, None)
+                    if on_progress is not None:
+                        on_progress(sum(len(shard) for shard in results.values()))
+                elif attempts[key] <= max_retries:
+                    print(f"Retrying shard {key[0]}/{key[1]} after failure: {problem}")
+                    llm_metrics.increment("shard_retries_total")
+                    failures[key] = problem
+                    pending[submit(key)] = key
+                else:
+                    failures[key] = problem
+                break  # Re-enter as_completed with the updated pending set
+
+    if failures:
+        return {
+            "error": f"{len(failures)} of {len(shards)} question shards failed",
+            "failed_shards": [
+                {"condition": c, "difficulty": d, "reason": reason}
+                for (c, d), reason in failures.items()
+            ]
+        }
+
+    # Merge shards in a stable order and renumber
+    questions = []
+    for key in shards:
+        condition_type, difficulty = key
+        for q in results[key]:
+            q["difficulty"] = difficulty
+            q["focus_area"] = condition_type
+            q["id"] = len(questions) + 1
+            questions.append(q)
+
+    return {"condition": condition, "questions": questions}
 
 
 if __name__ == "__main__":
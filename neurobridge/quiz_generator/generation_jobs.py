@@ -0,0 +1,108 @@
+# quiz_generator/generation_jobs.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import QuizGenerationJob
+from .quiz_builder import build_quiz_payload, generate_quiz_questions
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor():
+    """Return the process-wide worker pool for generation jobs, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'QUIZ_GENERATION_JOB_WORKERS', 4),
+                    thread_name_prefix='quiz-generation-job'
+                )
+    return _executor
+
+
+def enqueue_generation_job(job):
+    """Hand a saved job to the worker pool once the transaction that created it commits."""
+    transaction.on_commit(lambda: get_job_executor().submit(run_generation_job, job.pk))
+
+
+def run_generation_job(job_pk):
+    """
+    Generate the questions for one job and store the generate_quiz_view response on it.
+
+    Runs on a worker thread. The job row is the only state shared with the HTTP
+    workers, so any process can answer status requests for it.
+    """
+    try:
+        claimed = QuizGenerationJob.objects.filter(pk=job_pk, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = QuizGenerationJob.objects.select_related('user').get(pk=job_pk)
+
+        def report_progress(questions_ready):
+            QuizGenerationJob.objects.filter(pk=job_pk).update(questions_ready=questions_ready)
+
+        saved_questions, error = generate_quiz_questions(
+            job.assessment_type, job.num_easy, job.num_moderate, job.num_hard,
+            on_progress=report_progress
+        )
+        result = None
+        if error is None:
+            result, error = build_quiz_payload(
+                saved_questions,
+                assessment_type=job.assessment_type,
+                distribution={'easy': job.num_easy, 'moderate': job.num_moderate, 'hard': job.num_hard},
+                validated_data=job.request_data,
+                use_visual_assessment=job.use_visual_assessment,
+                user_id=job.user_id
+            )
+
+        if error is not None:
+            _finish_job(job_pk, status='failed', error=error)
+        else:
+            _finish_job(job_pk, status='completed', result=result, questions_ready=result['total_questions'])
+    except Exception as e:
+        print(f"An unexpected error occurred in quiz generation job {job_pk}: {e}")
+        _finish_job(job_pk, status='failed', error={
+            'error': 'An unexpected server error occurred',
+            'details': str(e)
+        })
+    finally:
+        close_old_connections()
+
+
+def _finish_job(job_pk, **fields):
+    QuizGenerationJob.objects.filter(pk=job_pk).update(completed_at=timezone.now(), **fields)
+
+
+def expire_stale_job(job):
+    """
+    Fail a job that has been pending or running for longer than QUIZ_GENERATION_JOB_TIMEOUT
+    seconds, e.g. because the process running it was restarted.
+
+    Returns:
+        bool: True if the job was expired.
+    """
+    if job.status not in ('pending', 'running'):
+        return False
+    timeout = getattr(settings, 'QUIZ_GENERATION_JOB_TIMEOUT', 300)
+    if job.created_at > timezone.now() - timedelta(seconds=timeout):
+        return False
+    error = {
+        'error': 'Failed to generate questions',
+        'details': f'Generation job did not finish within {timeout} seconds'
+    }
+    expired = QuizGenerationJob.objects.filter(pk=job.pk, status=job.status).update(
+        status='failed', error=error, completed_at=timezone.now()
+    )
+    if expired:
+        job.status = 'failed'
+        job.error = error
+    return bool(expired)
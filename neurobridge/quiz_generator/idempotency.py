@@ -0,0 +1,55 @@
+# quiz_generator/idempotency.py
+import hashlib
+import uuid
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import AssessmentSession
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def submission_key(request, endpoint, *session_ids):
+    """
+    Idempotency key for one assessment submission, or None if the request has none.
+
+    The client's Idempotency-Key header wins; otherwise the quiz session id(s) returned by
+    generate_quiz_view are used, but only if every one of them is a UUID so placeholder
+    ids cannot collide. The key is hashed together with the endpoint name.
+
+    Args:
+        request: The DRF request.
+        endpoint (str): Name of the submit endpoint, so keys never match across endpoints.
+        *session_ids: Quiz session ids sent in the request body.
+
+    Returns:
+        str: 64-character hex digest, or None.
+    """
+    raw_key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+    if not raw_key:
+        try:
+            raw_key = ':'.join(str(uuid.UUID(str(session_id))) for session_id in session_ids)
+        except ValueError:
+            return None
+    if not raw_key:
+        return None
+    return hashlib.sha256(f"{endpoint}\n{raw_key}".encode('utf-8')).hexdigest()
+
+
+def find_replay(user, key):
+    """Stored response of an earlier submission by this user with the same key, or None."""
+    if key is None:
+        return None
+    return (
+        AssessmentSession.objects
+        .filter(user=user, idempotency_key=key, response_payload__isnull=False)
+        .values_list('response_payload', flat=True)
+        .first()
+    )
+
+
+def replay_response(payload):
+    """Response for a replayed submission: the original payload, flagged with a header."""
+    return Response(payload, status=status.HTTP_200_OK, headers={REPLAY_HEADER: 'true'})
@@ -0,0 +1,199 @@
+# quiz_generator/inference.py
+import numpy as np
+
+# Model feature order (as trained): difficulty_level, response_time, is_correct
+FEATURE_NAMES = ('difficulty_level', 'response_time', 'is_correct')
+LEVEL_LABELS = {0: 'no', 1: 'low', 2: 'medium', 3: 'high'}
+
+# Marks a joblib artifact holding a difficulty encoder's categories rather than the pickled encoder
+DIFFICULTY_CATEGORIES_FORMAT = 'neurobridge.difficulty_categories'
+DIFFICULTY_CATEGORIES_VERSION = 1
+
+_difficulty_tables = {}  # id(encoder) -> (encoder, {difficulty: code})
+
+
+def export_difficulty_categories(encoder):
+    """
+    The categories of a fitted difficulty OrdinalEncoder as plain string arrays, which
+    load without sklearn (and the pandas it imports) and give the same codes.
+    """
+    return {
+        'format': DIFFICULTY_CATEGORIES_FORMAT,
+        'version': DIFFICULTY_CATEGORIES_VERSION,
+        'categories': [np.asarray(categories, dtype=str) for categories in encoder.categories_],
+    }
+
+
+def save_difficulty_categories(encoder, path):
+    """Export an encoder's categories (see export_difficulty_categories) to a joblib file."""
+    import joblib
+    joblib.dump(export_difficulty_categories(encoder), path)
+    return path
+
+
+def is_difficulty_categories(artifact):
+    """True for a loaded artifact produced by save_difficulty_categories."""
+    return isinstance(artifact, dict) and artifact.get('format') == DIFFICULTY_CATEGORIES_FORMAT
+
+
+class DifficultyCategories:
+    """Exported encoder categories, standing in for the OrdinalEncoder in difficulty_codes()."""
+
+    def __init__(self, artifact):
+        if artifact.get('version') != DIFFICULTY_CATEGORIES_VERSION:
+            raise ValueError(f"Unsupported difficulty categories version {artifact.get('version')}")
+        self.categories_ = [np.asarray(categories) for categories in artifact['categories']]
+
+
+def difficulty_codes(encoder):
+    """
+    Lookup table equivalent to encoder.transform for the difficulty column, built once per
+    encoder object, e.g. {'easy': 0.0, 'moderate': 1.0, 'hard': 2.0}.
+    """
+    entry = _difficulty_tables.get(id(encoder))
+    if entry is None or entry[0] is not encoder:
+        table = {str(category): float(code) for code, category in enumerate(encoder.categories_[0])}
+        entry = _difficulty_tables[id(encoder)] = (encoder, table)
+    return entry[1]
+
+
+def feature_matrix(responses, codes):
+    """
+    Build the model input as a contiguous float32 (n, 3) array.
+
+    Args:
+        responses (list): Dicts with "difficulty_level", "response_time" and "is_correct".
+        codes (dict): Difficulty lookup table from difficulty_codes().
+
+    Raises:
+        KeyError: For a difficulty the encoder does not know (as encoder.transform would).
+    """
+    return np.array(
+        [(codes[response['difficulty_level']], response['response_time'], response['is_correct'])
+         for response in responses],
+        dtype=np.float32
+    )
+
+
+def sample_feature_rows(rows, seed=0):
+    """
+    Random model inputs for equivalence checks: difficulty codes, response times (half of
+    them whole seconds, as the split thresholds are) across and beyond the usual range, and
+    correctness.
+    """
+    rng = np.random.default_rng(seed)
+    response_times = rng.uniform(0, 120, rows)
+    return np.column_stack([
+        rng.integers(0, 3, rows),
+        np.where(rng.random(rows) < 0.5, np.round(response_times), response_times),
+        rng.integers(0, 2, rows),
+    ]).astype(np.float32)
+
+
+def predict_levels(model, features):
+    """
+    Per-row level labels and overall confidence from a single predict_proba call.
+
+    Labels are the argmax of the class probabilities (what model.predict returns), and
+    confidence is the mean of each row's highest probability.
+
+    Returns:
+        tuple: (labels, confidence), e.g. (['no', 'low', ...], 0.71).
+    """
+    probabilities = model.predict_proba(features)
+    classes = model.classes_[probabilities.argmax(axis=1)]
+    labels = [LEVEL_LABELS[int(predicted_class)] for predicted_class in classes]
+    return labels, float(probabilities.max(axis=1).mean())
+
+
+def predict_levels_batch(model, features, group_ids, n_groups):
+    """
+    Predict many sessions at once: one predict_proba over the stacked rows of every
+    session, then a grouped reduction per session.
+
+    Each session gets the same result predict_levels would give it on its own rows: the
+    majority label (ties go to the label seen first, like Counter.most_common) and the
+    mean of the rows' highest probabilities.
+
+    Args:
+        model: Fitted classifier with predict_proba and classes_.
+        features (np.ndarray): Stacked (n_rows, 3) feature matrix.
+        group_ids (np.ndarray): Session index (0..n_groups-1) of each row.
+        n_groups (int): Number of sessions; sessions without rows get (None, None, []).
+
+    Returns:
+        list[tuple]: (majority_label, confidence, labels) per session, in group order.
+    """
+    results = [(None, None, []) for _ in range(n_groups)]
+    if not len(features):
+        return results
+
+    probabilities = model.predict_proba(features)
+    class_index = probabilities.argmax(axis=1)
+    n_classes = probabilities.shape[1]
+    row_confidence = probabilities.max(axis=1)
+
+    # votes[g, c] = rows of session g predicted as class c; first_seen[g, c] = first such row
+    votes = np.bincount(group_ids * n_classes + class_index, minlength=n_groups * n_classes).reshape(n_groups, n_classes)
+    first_seen = np.full((n_groups, n_classes), len(features), dtype=np.int64)
+    np.minimum.at(first_seen, (group_ids, class_index), np.arange(len(features)))
+    tied = votes == votes.max(axis=1, keepdims=True)
+    majority = np.where(tied, first_seen, len(features)).argmin(axis=1)
+
+    row_counts = np.bincount(group_ids, minlength=n_groups)
+    confidence = np.bincount(group_ids, weights=row_confidence, minlength=n_groups) / np.maximum(row_counts, 1)
+
+    labels = [LEVEL_LABELS[int(predicted_class)] for predicted_class in model.classes_[class_index]]
+    per_group = [[] for _ in range(n_groups)]
+    for group, label in zip(group_ids.tolist(), labels):
+        per_group[group].append(label)
+
+    for group in np.flatnonzero(row_counts).tolist():
+        results[group] = (
+            LEVEL_LABELS[int(model.classes_[majority[group]])],
+            float(confidence[group]),
+            per_group[group]
+        )
+    return results
+
+
+def stack_sessions(sessions_responses, codes):
+    """
+    Stack several sessions' responses into one feature matrix.
+
+    Returns:
+        tuple: (features, group_ids) where group_ids[i] is the session index of row i.
+    """
+    rows = [response for responses in sessions_responses for response in responses]
+    group_ids = np.repeat(np.arange(len(sessions_responses)), [len(responses) for responses in sessions_responses])
+    return feature_matrix(rows, codes).reshape(len(rows), len(FEATURE_NAMES)), group_ids
+
+
+def session_results(model, encoder, sessions_responses):
+    """
+    Result dicts (as returned by the predictors' single-session methods) for many
+    sessions, from one stacked predict_proba call.
+
+    Args:
+        model: Fitted classifier.
+        encoder: Fitted difficulty OrdinalEncoder, or its DifficultyCategories.
+        sessions_responses (list): One list of response dicts per session.
+
+    Returns:
+        list[dict]: {"predicted_level", "confidence", "confidence_scores", "question_count"}
+                    per session, in input order.
+    """
+    features, group_ids = stack_sessions(sessions_responses, difficulty_codes(encoder))
+    batch = predict_levels_batch(model, features, group_ids, len(sessions_responses))
+    results = []
+    for responses, (level, confidence, labels) in zip(sessions_responses, batch):
+        if not responses:
+            results.append({'predicted_level': 'no', 'confidence': 0.0, 'confidence_scores': [], 'question_count': 0})
+        else:
+            results.append({
+                'predicted_level': level,
+                'confidence': confidence,
+                'confidence_scores': labels,
+                'question_count': len(responses)
+            })
+    return results
@@ -0,0 +1,370 @@
+# quiz_generator/llm_backends.py
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.prompts import PromptTemplate
+
+from .concurrency import get_llm_limiter
+from .llm_metrics import llm_metrics
+from .question_stream import QuestionStreamParser, validate_question
+
+
+class GeminiBackend:
+    """
+    Google Gemini through LangChain.
+
+    The chat model (and with it the underlying HTTP/2 channel to Google) and the
+    compiled prompt chain are built once and reused for every call. LangChain runnables
+    hold no per-call state, so invoke() and stream() are safe to call from many threads.
+
+    on_usage, if given, is called with (prompt_tokens, completion_tokens) from the
+    usage metadata Gemini returns.
+    """
+    name = "gemini"
+
+    def __init__(self, google_api_key: str, prompt_template: str, input_variables: list,
+                 model: str = "gemini-1.5-flash", temperature: float = 0.7):
+        self.model = model
+        self.llm = ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            google_api_key=google_api_key
+        )
+        self.prompt = PromptTemplate(
+            template=prompt_template,
+            input_variables=input_variables
+        )
+        # No output parser: the message chunks carry the token usage
+        self.chain = self.prompt | self.llm
+
+    @staticmethod
+    def _text(message) -> str:
+        return message.content if isinstance(message.content, str) else "".join(
+            part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content
+        )
+
+    def invoke(self, variables: dict, on_usage=None) -> str:
+        message = self.chain.invoke(variables)
+        if on_usage is not None and message.usage_metadata:
+            on_usage(message.usage_metadata.get("input_tokens"), message.usage_metadata.get("output_tokens"))
+        return self._text(message)
+
+    def stream(self, variables: dict, on_usage=None):
+        prompt_tokens = completion_tokens = 0
+        reported = False
+        for chunk in self.chain.stream(variables):
+            # Usage on message chunks is additive, like the chunks themselves
+            if chunk.usage_metadata:
+                reported = True
+                prompt_tokens += chunk.usage_metadata.get("input_tokens", 0)
+                completion_tokens += chunk.usage_metadata.get("output_tokens", 0)
+            text = self._text(chunk)
+            if text:
+                yield text
+        if on_usage is not None and reported:
+            on_usage(prompt_tokens, completion_tokens)
+
+
+class FakeBackendError(RuntimeError):
+    """Error injected by FakeBackend."""
+
+
+class FakeBackend:
+    """
+    Deterministic offline stand-in for Gemini, for load tests and benchmarks.
+
+    Answers the same prompt variables with well-formed question JSON in the format the
+    real prompt asks for. Each call gets a sequence number that is part of the question
+    text, so repeated calls produce new questions in the same order on every run.
+
+    Args:
+        latency (float): Seconds before the first chunk (time to first byte).
+        tokens_per_second (float): Output rate after the first chunk; None means instant.
+        error_rate (float): Probability (0-1) that a call raises FakeBackendError.
+        malformed_rate (float): Probability (0-1) that a call returns truncated JSON.
+        seed (int): Seed for the error/malformed draws and question content.
+        chars_per_token (int): Characters per simulated token.
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = None, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, seed: int = 0, chars_per_token: int = 4):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self.chars_per_token = chars_per_token
+        self._calls = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_call(self):
+        with self._lock:
+            call_number = next(self._calls)
+        rng = random.Random(f"{self.seed}:{call_number}")
+        return call_number, rng
+
+    def render(self, variables: dict, call_number: int = 0) -> str:
+        """Build the JSON text a well-behaved model would return for these variables."""
+        condition = variables["condition"]
+        counts = [
+            ("easy", variables["num_easy"]),
+            ("moderate", variables["num_moderate"]),
+            ("hard", variables["num_hard"]),
+        ]
+        questions = []
+        extra_goes_to = "autism"
+        for difficulty, count in counts:
+            if condition == "mixed":
+                # Half and half per difficulty, odd remainders alternating like the prompt asks
+                focus_areas = ["dyslexia"] * (count // 2) + ["autism"] * (count // 2)
+                if count % 2:
+                    focus_areas.append(extra_goes_to)
+                    extra_goes_to = "dyslexia" if extra_goes_to == "autism" else "autism"
+            else:
+                focus_areas = [condition] * count
+            for focus_area in focus_areas:
+                index = len(questions)
+                options = [f"Option {letter} ({call_number}.{index})" for letter in "ABCD"]
+                questions.append({
+                    "id": index + 1,
+                    "difficulty": difficulty,
+                    "question": f"[{self.seed}:{call_number}.{index}] Sample {focus_area} question ({difficulty})",
+                    "options": options,
+                    "correct_answer": options[(call_number + index) % 4],
+                    "explanation": "Generated by the offline fake backend.",
+                    "focus_area": focus_area,
+                })
+        return json.dumps({"condition": condition, "questions": questions}, indent=2)
+
+    def _respond(self, variables: dict):
+        call_number, rng = self._next_call()
+        if rng.random() < self.error_rate:
+            time.sleep(self.latency)
+            raise FakeBackendError(f"Injected fake backend error on call {call_number}")
+        text = self.render(variables, call_number)
+        if rng.random() < self.malformed_rate:
+            text = text[:int(len(text) * rng.uniform(0.5, 0.95))]
+        return text
+
+    def _chunks(self, text: str):
+        chunk_size = self.chars_per_token * 8
+        for start in range(0, len(text), chunk_size):
+            yield text[start:start + chunk_size]
+
+    def _report_usage(self, variables: dict, text: str, on_usage):
+        if on_usage is not None:
+            on_usage(len(json.dumps(variables)) // self.chars_per_token, len(text) // self.chars_per_token)
+
+    def invoke(self, variables: dict, on_usage=None) -> str:
+        text = self._respond(variables)
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += len(text) / self.chars_per_token / self.tokens_per_second
+        time.sleep(delay)
+        self._report_usage(variables, text, on_usage)
+        return text
+
+    def stream(self, variables: dict, on_usage=None):
+        text = self._respond(variables)
+        time.sleep(self.latency)
+        for chunk in self._chunks(text):
+            if self.tokens_per_second:
+                time.sleep(len(chunk) / self.chars_per_token / self.tokens_per_second)
+            yield chunk
+        self._report_usage(variables, text, on_usage)
+
+
+class HedgedBackend:
+    """
+    Races several backends to cut tail latency.
+
+    The first backend is the primary. If it has not returned a valid response after the
+    hedge delay, the next backend is started as well, and so on; the first valid response
+    wins and the other attempts are cancelled by closing their streams. The hedge delay is
+    the hedge_percentile of the primary's recent successful latencies (initial_delay until
+    min_samples are available), so only the slowest few percent of calls are hedged. A
+    backend that fails or returns an invalid response triggers the next one immediately.
+
+    A response is valid when it holds at least as many valid question objects as the
+    prompt's total_questions. If no response is valid, the first complete one is returned.
+    Streaming callers receive the winning response once it is complete.
+
+    Every attempt holds its own LLMCallLimiter slot. The primary, and an attempt started
+    because all earlier ones failed, queue for one like any other call; a hedge next to a
+    running attempt only starts if a slot is free right away, so hedging never adds load
+    while the process is already at its call limit.
+
+    Args:
+        backends (list): Backends in priority order; the first one is the primary.
+        hedge_percentile (float): Percentile (0-100) of primary latency used as the delay.
+        initial_delay (float): Delay in seconds while there are fewer than min_samples.
+        min_delay (float): Lower bound for the delay in seconds.
+        min_samples (int): Primary latencies needed before the percentile is used.
+        window (int): Number of recent primary latencies kept.
+    """
+    name = "hedged"
+    # Attempts take their own limiter slots, so QuestionGenerator must not take one for the race
+    acquires_llm_slots = True
+
+    def __init__(self, backends: list, hedge_percentile: float = 95, initial_delay: float = 10.0,
+                 min_delay: float = 0.5, min_samples: int = 20, window: int = 200):
+        if not backends:
+            raise ValueError("HedgedBackend needs at least one backend")
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for an attempt before starting the next backend."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        index = min(int(len(samples) * self.hedge_percentile / 100), len(samples) - 1)
+        return max(samples[index], self.min_delay)
+
+    @staticmethod
+    def is_valid(text: str, variables: dict) -> bool:
+        expected = variables.get("total_questions") or 1
+        parsed = QuestionStreamParser().feed(text)
+        return sum(1 for question in parsed if validate_question(question)) >= expected
+
+    @staticmethod
+    def _attempt(backend, variables, cancelled, results, index, slot_timeout):
+        started_at = time.monotonic()
+        usage = {}
+        chunks = []
+        try:
+            with get_llm_limiter().slot(timeout=slot_timeout):
+                started_at = time.monotonic()
+                stream = backend.stream(variables, on_usage=lambda prompt, completion: usage.update(
+                    prompt=prompt, completion=completion
+                ))
+                for chunk in stream:
+                    if cancelled.is_set():
+                        stream.close()  # Drops the loser's connection instead of reading it to the end
+                        return
+                    chunks.append(chunk)
+        except Exception as e:
+            results.put((index, None, usage, time.monotonic() - started_at, e))
+            return
+        results.put((index, "".join(chunks), usage, time.monotonic() - started_at, None))
+
+    def _race(self, variables: dict):
+        results = queue.Queue()
+        cancel_events = []
+
+        def launch(index, queue_for_slot):
+            cancelled = threading.Event()
+            cancel_events.append(cancelled)
+            threading.Thread(
+                target=self._attempt,
+                args=(self.backends[index], variables, cancelled, results, index, None if queue_for_slot else 0),
+                name=f"llm-hedge-{index}",
+                daemon=True
+            ).start()
+            if index > 0:
+                llm_metrics.increment("hedges_total")
+
+        delay = self.hedge_delay()
+        race_started_at = time.monotonic()
+        launch(0, queue_for_slot=True)
+        launched = 1
+        finished = 0
+        next_hedge_at = time.monotonic() + delay
+        fallback = None
+        last_error = None
+
+        while finished < launched or launched < len(self.backends):
+            if finished == launched:
+                # Everything started so far failed or was invalid: hedge right away (this
+                # attempt replaces them rather than adding load, so it may queue for a slot)
+                launch(launched, queue_for_slot=True)
+                launched += 1
+                next_hedge_at = time.monotonic() + delay
+                continue
+            timeout = max(next_hedge_at - time.monotonic(), 0) if launched < len(self.backends) else None
+            try:
+                index, text, usage, latency, error = results.get(timeout=timeout)
+            except queue.Empty:
+                launch(launched, queue_for_slot=False)
+                launched += 1
+                next_hedge_at = time.monotonic() + delay
+                continue
+
+            finished += 1
+            if error is not None:
+                last_error = error
+                continue
+            if index == 0:
+                with self._lock:
+                    self._latencies.append(latency)
+            if self.is_valid(text, variables):
+                for cancelled in cancel_events:
+                    cancelled.set()
+                if index > 0:
+                    llm_metrics.increment("hedge_wins_total")
+                    # The primary was at least this slow; leaving it out would bias the delay low
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - race_started_at)
+                return text, usage
+            if fallback is None:
+                fallback = (text, usage)
+
+        if fallback is not None:
+            return fallback
+        raise last_error
+
+    def invoke(self, variables: dict, on_usage=None) -> str:
+        text, usage = self._race(variables)
+        if on_usage is not None and usage:
+            on_usage(usage.get("prompt"), usage.get("completion"))
+        return text
+
+    def stream(self, variables: dict, on_usage=None):
+        """
+        Yield the winning response as a single chunk once it is complete.
+
+        The winner is only known when a response is complete and valid, so nothing is
+        streamed before that: with this backend the streaming endpoint sends every
+        question at the end instead of as each one is written.
+        """
+        yield self.invoke(variables, on_usage=on_usage)
+
+
+# Used when a hedged config names no backends: a second request to the same model
+# already cuts the tail, since slow responses are mostly independent of each other
+DEFAULT_HEDGED_BACKENDS = [{"name": "gemini"}, {"name": "gemini"}]
+
+
+def create_backend(config: dict, prompt_template: str, input_variables: list, google_api_key: str = None):
+    """
+    Build a backend from a config dict such as {"name": "gemini", "model": "gemini-1.5-flash"},
+    {"name": "fake", "latency": 2.0, "tokens_per_second": 80, "error_rate": 0.05} or
+    {"name": "hedged", "backends": [{"name": "gemini"}, {"name": "gemini", "model": "gemini-1.5-flash-8b"}],
+     "hedge_percentile": 95}. A hedged config without "backends" races DEFAULT_HEDGED_BACKENDS.
+    """
+    options = dict(config)
+    name = options.pop("name", "gemini")
+    if name == "hedged":
+        backends = [
+            create_backend(backend_config, prompt_template, input_variables, google_api_key=google_api_key)
+            for backend_config in options.pop("backends", DEFAULT_HEDGED_BACKENDS)
+        ]
+        return HedgedBackend(backends, **options)
+    if name == "gemini":
+        return GeminiBackend(google_api_key, prompt_template, input_variables, **options)
+    if name == "fake":
+        return FakeBackend(**options)
+    raise ValueError(f"Unknown LLM backend: {name}")
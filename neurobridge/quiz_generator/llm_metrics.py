@@ -0,0 +1,159 @@
+# quiz_generator/llm_metrics.py
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120]
+TOKEN_BUCKETS = [50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000]
+COUNT_BUCKETS = [0, 1, 2, 3, 5, 10, 20]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Each bucket counts observations <= its upper bound; values
+    above the last bound go to an overflow bucket. Quantiles are estimated by linear
+    interpolation inside the bucket that holds them.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0-1), or None if nothing was observed."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = self.buckets[i - 1] if i > 0 else 0
+                    upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                    lower = min(lower, upper)
+                    return lower + (upper - lower) * (rank - seen) / bucket_count
+                seen += bucket_count
+            return self.max
+
+    def snapshot(self):
+        bounds = [str(b) for b in self.buckets] + ['+Inf']
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bucket_count in self.counts:
+                running += bucket_count
+                cumulative.append(running)
+            summary = {
+                'count': self.count,
+                'sum': round(self.sum, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else None,
+                'max': self.max,
+                'buckets': dict(zip(bounds, cumulative)),
+            }
+        summary.update({
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        })
+        return summary
+
+
+class LLMMetrics:
+    """
+    Process-wide aggregates for LLM calls and question generations.
+
+    Call metrics are recorded once per backend request; generation metrics once per
+    QuestionGenerator.generate() / stream(), which may issue several calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.histograms = {
+                'queue_wait_seconds': Histogram(LATENCY_BUCKETS),
+                'time_to_first_byte_seconds': Histogram(LATENCY_BUCKETS),
+                'call_latency_seconds': Histogram(LATENCY_BUCKETS),
+                'prompt_tokens': Histogram(TOKEN_BUCKETS),
+                'completion_tokens': Histogram(TOKEN_BUCKETS),
+                'generation_latency_seconds': Histogram(LATENCY_BUCKETS),
+                'salvaged_questions': Histogram(COUNT_BUCKETS),
+                'retries': Histogram(COUNT_BUCKETS),
+            }
+            self.counters = {
+                'calls_total': 0,
+                'call_errors_total': 0,
+                'generations_total': 0,
+                'generation_errors_total': 0,
+                'parse_success_total': 0,
+                'parse_failure_total': 0,
+                'shard_retries_total': 0,
+                'hedges_total': 0,
+                'hedge_wins_total': 0,
+            }
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe_call(self, queue_wait, ttfb, latency, prompt_tokens=None, completion_tokens=None, error=False):
+        """Record one backend request. ttfb is None if no output arrived."""
+        self.increment('calls_total')
+        if error:
+            self.increment('call_errors_total')
+        self.histograms['queue_wait_seconds'].observe(queue_wait)
+        if ttfb is not None:
+            self.histograms['time_to_first_byte_seconds'].observe(ttfb)
+        self.histograms['call_latency_seconds'].observe(latency)
+        if prompt_tokens is not None:
+            self.histograms['prompt_tokens'].observe(prompt_tokens)
+        if completion_tokens is not None:
+            self.histograms['completion_tokens'].observe(completion_tokens)
+
+    def observe_generation(self, latency, parse_success, salvaged, retries, error=False):
+        """
+        Record one generation.
+
+        Args:
+            latency (float): Seconds for the whole generation, including repair calls.
+            parse_success (bool): Whether the first response held every requested question.
+            salvaged (int): Valid questions kept from a first response that was incomplete.
+            retries (int): Repair requests issued after the first response.
+            error (bool): Whether the generation failed.
+        """
+        self.increment('generations_total')
+        if error:
+            self.increment('generation_errors_total')
+        self.increment('parse_success_total' if parse_success else 'parse_failure_total')
+        self.histograms['generation_latency_seconds'].observe(latency)
+        self.histograms['salvaged_questions'].observe(salvaged)
+        self.histograms['retries'].observe(retries)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+            started_at = self.started_at
+        return {
+            'since': started_at,
+            'uptime_seconds': round(time.time() - started_at, 3),
+            'counters': counters,
+            'histograms': {name: histogram.snapshot() for name, histogram in histograms.items()},
+        }
+
+
+llm_metrics = LLMMetrics()
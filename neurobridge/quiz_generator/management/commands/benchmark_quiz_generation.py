@@ -0,0 +1,154 @@
+import contextlib
+import io
+import json
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from quiz_generator import question_bank
+from quiz_generator.gemini_mcq_generator import QuestionGenerator, set_question_generator
+from quiz_generator.llm_backends import FakeBackend
+from quiz_generator.models import AssessmentQuestion
+from quiz_generator.views import generate_quiz_view
+
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class RecordingFakeBackend(FakeBackend):
+    """FakeBackend that remembers the text of every question it writes, to find its rows afterwards."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.question_texts = set()
+
+    def render(self, variables, call_number=0):
+        text = super().render(variables, call_number)
+        with self._lock:
+            self.question_texts.update(question['question'] for question in json.loads(text)['questions'])
+        return text
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark generate_quiz_view end to end against the offline fake LLM backend. '
+        'Reports throughput and p50/p95/p99 latency for each concurrency level. '
+        'Questions the benchmark created are deleted afterwards unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='Comma-separated concurrency levels (default: 1,4,16)')
+        parser.add_argument('--requests', type=int, default=32,
+                            help='Requests per concurrency level (default: 32)')
+        parser.add_argument('--assessment-type', default='both', choices=['dyslexia', 'autism', 'both'])
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='Fake backend time to first byte in seconds (default: 0.5)')
+        parser.add_argument('--tokens-per-second', type=float, default=200.0,
+                            help='Fake backend output rate; 0 for instant (default: 200)')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Probability that a fake backend call fails (default: 0)')
+        parser.add_argument('--malformed-rate', type=float, default=0.0,
+                            help='Probability that a fake backend call returns truncated JSON (default: 0)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--use-bank', action='store_true',
+                            help='Leave the question bank enabled instead of always generating')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the questions created during the benchmark')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',') if level.strip()]
+        backend = RecordingFakeBackend(
+            latency=options['latency'],
+            tokens_per_second=options['tokens_per_second'] or None,
+            error_rate=options['error_rate'],
+            malformed_rate=options['malformed_rate'],
+            seed=options['seed']
+        )
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex[:12]}@example.invalid',
+            username=f'benchmark-{uuid.uuid4().hex[:12]}',
+            password=None,
+            first_name='Benchmark',
+            last_name='Student',
+            user_type='student'
+        )
+        # Rows above this id with a question text from the fake backend are the benchmark's own
+        last_existing_id = AssessmentQuestion.objects.aggregate(last=Max('id'))['last'] or 0
+
+        set_question_generator(QuestionGenerator(backend))
+        try:
+            with override_settings(QUESTION_BANK_ENABLED=options['use_bank']):
+                self.run_levels(levels, user, options)
+                # A refill started by the run also writes fake questions
+                refill_thread = question_bank._refill_thread
+                if refill_thread is not None:
+                    refill_thread.join()
+        finally:
+            set_question_generator(None)
+            if not options['keep']:
+                self.remove_benchmark_questions(backend.question_texts, last_existing_id)
+            user.delete()
+
+    def run_levels(self, levels, user, options):
+        factory = APIRequestFactory()
+
+        def one_request(_):
+            request = factory.post('/api/quiz/generate/', {'assessment_type': options['assessment_type']}, format='json')
+            force_authenticate(request, user=user)
+            start = time.perf_counter()
+            error = None
+            try:
+                response = generate_quiz_view(request)
+                if response.status_code != 200:
+                    data = response.data if isinstance(response.data, dict) else {}
+                    error = f"{response.status_code}: {data.get('details') or data.get('error', '')}"
+            except Exception as e:
+                error = f"exception: {e}"
+            finally:
+                connection.close()
+            return time.perf_counter() - start, error
+
+        self.stdout.write(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for level in levels:
+            # The view prints diagnostics for every request; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                wall_start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=level) as executor:
+                    results = list(executor.map(one_request, range(options['requests'])))
+                wall_time = time.perf_counter() - wall_start
+
+            latencies = sorted(duration * 1000 for duration, _ in results)
+            errors = Counter(error for _, error in results if error)
+            self.stdout.write(
+                f"{level:>11} {len(results):>8} {sum(errors.values()):>6} {len(results) / wall_time:>8.2f} "
+                f"{_percentile(latencies, 50):>8.1f} {_percentile(latencies, 95):>8.1f} "
+                f"{_percentile(latencies, 99):>8.1f} {latencies[-1]:>8.1f}"
+            )
+            for error, count in errors.most_common():
+                self.stdout.write(f"{'':>11} {count:>3} x {error}")
+
+    def remove_benchmark_questions(self, question_texts, last_existing_id):
+        """Delete the rows inserted from fake backend output, leaving every other question alone."""
+        question_texts = list(question_texts)
+        deleted = 0
+        for start in range(0, len(question_texts), 500):
+            count, _ = AssessmentQuestion.objects.filter(
+                id__gt=last_existing_id, question_text__in=question_texts[start:start + 500]
+            ).delete()
+            deleted += count
+        self.stdout.write(f'Removed {deleted} benchmark rows')
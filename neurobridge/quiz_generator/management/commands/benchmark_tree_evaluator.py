@@ -0,0 +1,115 @@
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz_generator.autism_predictor import autism_predictor
+from quiz_generator.dyslexia_predictor import predictor
+from quiz_generator.inference import sample_feature_rows
+from quiz_generator.model_registry import load_joblib
+from quiz_generator.tree_ensemble import TreeEnsembleClassifier, export_tree_arrays, split_thresholds
+
+
+def _median_ms(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the NumPy tree evaluators (threshold grid and tree walk) against the XGBoost '
+        'model they were exported from, and compare their predict_proba latency per batch size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib'),
+                            help='Pickled XGBClassifier to compare against')
+        parser.add_argument('--rows', type=int, default=20000,
+                            help='Random feature rows for the equivalence check (default: 20000)')
+        parser.add_argument('--batch-sizes', default='1,10,100,1000',
+                            help='Comma-separated predict_proba batch sizes to time (default: 1,10,100,1000)')
+        parser.add_argument('--repeats', type=int, default=50,
+                            help='Timed calls per evaluator and batch size (default: 50)')
+        parser.add_argument('--tolerance', type=float, default=1e-5,
+                            help='Largest allowed probability difference from XGBoost (default: 1e-5)')
+
+    def handle(self, *args, **options):
+        model = load_joblib(options['model'])
+        arrays = export_tree_arrays(model)
+        evaluators = {
+            'xgboost': model,
+            'grid': TreeEnsembleClassifier(arrays),
+            'walk': TreeEnsembleClassifier(arrays, compile=False),
+        }
+        if evaluators['grid'].grid is None:
+            del evaluators['grid']
+            self.stdout.write(self.style.WARNING('Too many split thresholds to tabulate; timing the tree walk only'))
+
+        # Random rows, rows exactly on each split threshold, and rows with missing values
+        features = sample_feature_rows(options['rows'])
+        on_threshold = np.repeat(features[:1], sum(len(values) for values in split_thresholds(arrays)), axis=0)
+        row = 0
+        for feature, values in enumerate(split_thresholds(arrays)):
+            on_threshold[row:row + len(values), feature] = values
+            row += len(values)
+        missing = features[:300].copy()
+        missing[np.arange(300), np.arange(300) % features.shape[1]] = np.nan
+        features = np.concatenate([features, on_threshold, missing])
+
+        expected_probabilities = model.predict_proba(features)
+        expected_labels = model.predict(features)
+        failed = False
+        self.stdout.write(f'Equivalence with XGBoost on {len(features)} rows:')
+        for name, evaluator in evaluators.items():
+            if name == 'xgboost':
+                continue
+            difference = float(np.abs(evaluator.predict_proba(features) - expected_probabilities).max())
+            mismatched = int((evaluator.predict(features) != expected_labels).sum())
+            ok = difference <= options['tolerance'] and not mismatched
+            failed = failed or not ok
+            self.stdout.write(
+                f'  {name:<8} max probability difference {difference:.2e}, {mismatched} different labels '
+                + (self.style.SUCCESS('OK') if ok else self.style.ERROR('MISMATCH'))
+            )
+
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size.strip()]
+        self.stdout.write('\npredict_proba latency (median ms):')
+        self.stdout.write(f"{'batch':>7} " + ' '.join(f'{name:>9}' for name in evaluators) + f" {'speedup':>8}")
+        fastest = 'grid' if 'grid' in evaluators else 'walk'
+        for size in batch_sizes:
+            batch = np.resize(features[:options['rows']], (size, features.shape[1]))
+            timings = {
+                name: _median_ms(lambda evaluator=evaluator: evaluator.predict_proba(batch), options['repeats'])
+                for name, evaluator in evaluators.items()
+            }
+            self.stdout.write(
+                f'{size:>7} ' + ' '.join(f'{timings[name]:>9.3f}' for name in evaluators)
+                + f" {timings['xgboost'] / timings[fastest]:>7.1f}x"
+            )
+
+        # What the predictors run with under the current settings
+        session = [
+            {'difficulty_level': difficulty, 'response_time': 4.5 + index, 'is_correct': index % 3 != 0}
+            for index, difficulty in enumerate(['easy', 'moderate', 'hard'] * 4)
+        ]
+        self.stdout.write('\nPredictors (12-question session, median ms):')
+        for name, predict, level_model in (
+            ('dyslexia', predictor.predict_dyslexia_level, predictor.model),
+            ('autism', autism_predictor.predict_autism_level, autism_predictor.model),
+        ):
+            # The predictors print every prediction; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = _median_ms(lambda predict=predict: predict(session), options['repeats'])
+            evaluator = getattr(level_model, 'evaluator', type(level_model).__name__)
+            self.stdout.write(f'  {name:<8} {evaluator:<14} {elapsed:.3f}')
+
+        if failed:
+            raise CommandError('A NumPy evaluator does not match the XGBoost model')
@@ -0,0 +1,107 @@
+import os
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from quiz_generator.inference import difficulty_codes, sample_feature_rows, save_difficulty_categories
+from quiz_generator.model_registry import load_joblib, load_model_artifact
+from quiz_generator.tree_ensemble import save_tree_ensemble
+
+
+class Command(BaseCommand):
+    help = (
+        'Export a trained XGBoost model to memory-mappable tree arrays and check that it predicts the same; '
+        'also export the difficulty encoder\'s categories so neither needs its library to load'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            default=os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib'),
+            help='Pickled XGBClassifier to export'
+        )
+        parser.add_argument(
+            '--output',
+            help='Exported artifact path (default: <model>.trees.joblib)'
+        )
+        parser.add_argument(
+            '--encoder',
+            default=os.path.join(settings.BASE_DIR, 'difficulty_encoder.joblib'),
+            help='Pickled difficulty OrdinalEncoder to export (pass an empty value to skip)'
+        )
+        parser.add_argument(
+            '--encoder-output',
+            help='Exported encoder categories path (default: <encoder>.categories.joblib)'
+        )
+        parser.add_argument(
+            '--check-rows',
+            type=int,
+            default=5000,
+            help='Random feature rows on which the export must match the model'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=1e-5,
+            help='Largest allowed difference between the two models\' class probabilities'
+        )
+
+    def handle(self, *args, **options):
+        model_path = options['model']
+        output_path = options['output'] or os.path.splitext(model_path)[0] + '.trees.joblib'
+        if os.path.abspath(output_path) == os.path.abspath(model_path):
+            raise CommandError('The output path must differ from the model path')
+
+        model = load_joblib(model_path)
+        try:
+            save_tree_ensemble(model, output_path)
+        except (AttributeError, ValueError) as e:
+            raise CommandError(f'Cannot export {model_path}: {e}')
+        exported = load_model_artifact(output_path, mmap_mode='r')
+
+        rows = options['check_rows']
+        features = sample_feature_rows(rows)
+        difference = float(np.abs(model.predict_proba(features) - exported.predict_proba(features)).max())
+        mismatched = int((model.predict(features) != exported.predict(features)).sum())
+        if difference > options['tolerance'] or mismatched:
+            os.remove(output_path)
+            raise CommandError(
+                f'Exported model does not match: max probability difference {difference:.2e}, '
+                f'{mismatched} different labels out of {rows}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(exported.arrays["roots"])} trees ({len(exported.arrays["feature"])} nodes, '
+            f'depth {exported.max_depth}) to {output_path} ({os.path.getsize(output_path)} bytes)'
+        ))
+        self.stdout.write(f'  Max probability difference on {rows} rows: {difference:.2e}')
+        if exported.grid is not None:
+            self.stdout.write(f'  Threshold grid: {len(exported.grid["margins"])} cells, stored in the artifact')
+        else:
+            self.stdout.write('  Too many split thresholds to tabulate; predictions walk the trees')
+
+        if options['encoder']:
+            self.export_encoder(options['encoder'], options['encoder_output'])
+
+    def export_encoder(self, encoder_path, output_path):
+        output_path = output_path or os.path.splitext(encoder_path)[0] + '.categories.joblib'
+        if os.path.abspath(output_path) == os.path.abspath(encoder_path):
+            raise CommandError('The encoder output path must differ from the encoder path')
+
+        encoder = load_joblib(encoder_path)
+        save_difficulty_categories(encoder, output_path)
+        exported = difficulty_codes(load_model_artifact(output_path, mmap_mode='r'))
+        categories = encoder.categories_[0]
+        with warnings.catch_warnings():
+            # The encoder was fitted on a DataFrame; plain rows are fine for this check
+            warnings.filterwarnings('ignore', category=UserWarning)
+            codes = encoder.transform([[category] for category in categories])[:, 0]
+        expected = {str(category): float(code) for category, code in zip(categories, codes)}
+        if exported != expected:
+            os.remove(output_path)
+            raise CommandError(f'Exported encoder categories do not match: {exported} != {expected}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported difficulty categories {list(exported)} to {output_path}'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from quiz_generator.question_bank import get_bank_levels, get_low_water_mark, refill_bank
+
+
+class Command(BaseCommand):
+    help = 'Top up the pre-generated quiz question bank to its low-water mark'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--low-water-mark',
+            type=int,
+            default=None,
+            help='Questions to keep per condition/difficulty partition (defaults to QUESTION_BANK_LOW_WATER_MARK)'
+        )
+
+    def handle(self, *args, **options):
+        low_water_mark = options['low_water_mark'] or get_low_water_mark()
+        self.stdout.write(f'Refilling question bank to {low_water_mark} questions per partition...')
+
+        added = refill_bank(low_water_mark=low_water_mark)
+
+        for (condition_type, difficulty), count in get_bank_levels().items():
+            self.stdout.write(f'  {condition_type}/{difficulty}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Added {added} questions to the bank'))
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from quiz_generator.model_registry import get_model_registry
+from quiz_generator.prediction_tasks import due_task_ids, requeue_stale_tasks, run_prediction_task
+
+
+class Command(BaseCommand):
+    help = 'Run queued post-submission ML predictions (PredictionTask rows), retrying failed attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the tasks that are due now, then exit (e.g. from cron)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when no task is due'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Prediction worker started' + (' (single pass)' if options['once'] else ''))
+        for name, stats in get_model_registry().warm_up().items():
+            if stats['loaded']:
+                self.stdout.write(f"  Loaded {name} in {stats['load_seconds'] * 1000:.1f}ms")
+            else:
+                self.stdout.write(self.style.WARNING(f"  Could not load {name}: {stats['error']}"))
+        completed = 0
+        while True:
+            requeued = requeue_stale_tasks()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale prediction tasks')
+
+            task_ids = due_task_ids()
+            for task_pk in task_ids:
+                retry_delay = run_prediction_task(task_pk)
+                if retry_delay is None:
+                    completed += 1
+                else:
+                    self.stdout.write(f'  Task {task_pk} failed, retrying in {retry_delay:.0f}s')
+
+            if options['once']:
+                break
+            if not task_ids:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {completed} prediction tasks'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0006_assessmentsession_customization_reason_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentquestion',
+            name='explanation',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='assessmentquestion',
+            name='in_bank',
+            field=models.BooleanField(default=False, help_text='Whether the question is waiting unused in the pre-generated question bank'),
+        ),
+        migrations.AddIndex(
+            model_name='assessmentquestion',
+            index=models.Index(fields=['in_bank', 'condition_type', 'difficulty_level'], name='quiz_question_bank_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:07
+
+import hashlib
+import json
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize_text(value):
+    return " ".join(unicodedata.normalize("NFKC", str(value)).casefold().split())
+
+
+def compute_content_hash(question_text, options, correct_answer, condition_type):
+    """The content hash as of this migration (frozen copy; 0013 adds the difficulty)."""
+    payload = json.dumps([
+        _normalize_text(question_text),
+        [_normalize_text(option) for option in options or []],
+        _normalize_text(correct_answer),
+        condition_type,
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def backfill_content_hashes(apps, schema_editor):
+    """Hash existing questions; later copies of an already-hashed question keep a NULL hash."""
+    AssessmentQuestion = apps.get_model('quiz_generator', 'AssessmentQuestion')
+    seen = set()
+    to_update = []
+    for question in AssessmentQuestion.objects.order_by('id').iterator():
+        content_hash = compute_content_hash(
+            question.question_text, question.options, question.correct_answer, question.condition_type
+        )
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        question.content_hash = content_hash
+        to_update.append(question)
+    AssessmentQuestion.objects.bulk_update(to_update, ['content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0007_assessmentquestion_explanation_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentquestion',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Normalized content hash; textually identical questions share one row', max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_content_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:12
+
+import django.core.serializers.json
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0008_assessmentquestion_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('assessment_type', models.CharField(choices=[('dyslexia', 'Dyslexia Only'), ('autism', 'Autism Only'), ('both', 'Both Assessments')], default='both', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('request_data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('num_easy', models.IntegerField()),
+                ('num_moderate', models.IntegerField()),
+                ('num_hard', models.IntegerField()),
+                ('use_visual_assessment', models.BooleanField(default=False)),
+                ('questions_ready', models.IntegerField(default=0, help_text='Questions generated so far')),
+                ('result', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='generate_quiz_view response once completed', null=True)),
+                ('error', models.JSONField(blank=True, help_text='Error details if the job failed', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_generation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:24
+
+import django.core.serializers.json
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0009_quizgenerationjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assessmentsession',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text="SHA-256 of the submit endpoint and the client's idempotency key or quiz session id", max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='assessmentsession',
+            name='response_payload',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Response returned for the original submission', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='assessmentsession',
+            constraint=models.UniqueConstraint(fields=('user', 'idempotency_key'), name='unique_assessment_submission'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:26
+
+import django.core.serializers.json
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0010_assessmentsession_idempotency'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('assessment_type', models.CharField(choices=[('dyslexia', 'Dyslexia Only'), ('autism', 'Autism Only'), ('both', 'Both Assessments')], default='both', max_length=20)),
+                ('question_ids', models.JSONField(default=list, help_text='question_id of each question, in the order presented')),
+                ('difficulty_distribution', models.JSONField(default=dict)),
+                ('pre_assessment_data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Pre-assessment snapshot, in the shape submit views read from pre_assessment_data')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
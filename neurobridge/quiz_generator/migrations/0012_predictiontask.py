@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0011_quizsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('both', 'Dyslexia and Autism'), ('dyslexia', 'Dyslexia Only'), ('autism', 'Autism Only')], default='both', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time the next attempt may start')),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prediction_tasks', to='quiz_generator.assessmentsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='quiz_genera_status_877460_idx')],
+            },
+        ),
+    ]
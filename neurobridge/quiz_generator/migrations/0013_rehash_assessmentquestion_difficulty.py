@@ -0,0 +1,62 @@
+# Generated by Django 5.2.2 on 2026-10-17 03:10
+
+import hashlib
+import json
+import unicodedata
+
+from django.db import migrations
+
+
+def _normalize_text(value):
+    return " ".join(unicodedata.normalize("NFKC", str(value)).casefold().split())
+
+
+def compute_content_hash(question_text, options, correct_answer, condition_type, difficulty_level=None):
+    """The content hash as of this migration (frozen copy); without a difficulty, the 0008 hash."""
+    fields = [
+        _normalize_text(question_text),
+        [_normalize_text(option) for option in options or []],
+        _normalize_text(correct_answer),
+        condition_type,
+    ]
+    if difficulty_level is not None:
+        fields.append(difficulty_level)
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _rehash(apps, with_difficulty):
+    """Re-hash every question; later copies of an already-hashed question keep a NULL hash."""
+    AssessmentQuestion = apps.get_model('quiz_generator', 'AssessmentQuestion')
+    seen = set()
+    to_update = []
+    for question in AssessmentQuestion.objects.order_by('id').iterator():
+        content_hash = compute_content_hash(
+            question.question_text, question.options, question.correct_answer, question.condition_type,
+            question.difficulty_level if with_difficulty else None
+        )
+        question.content_hash = None if content_hash in seen else content_hash
+        seen.add(content_hash)
+        to_update.append(question)
+    # Clear first so no batch collides with a hash another row still holds
+    AssessmentQuestion.objects.update(content_hash=None)
+    AssessmentQuestion.objects.bulk_update(to_update, ['content_hash'], batch_size=500)
+
+
+def add_difficulty_to_hashes(apps, schema_editor):
+    _rehash(apps, with_difficulty=True)
+
+
+def remove_difficulty_from_hashes(apps, schema_editor):
+    _rehash(apps, with_difficulty=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_generator', '0012_predictiontask'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_difficulty_to_hashes, remove_difficulty_from_hashes),
+    ]
@@ -0,0 +1,171 @@
+# quiz_generator/model_registry.py
+import os
+import threading
+import time
+from functools import partial
+
+from .inference import DifficultyCategories, is_difficulty_categories
+from .tree_ensemble import TreeEnsembleClassifier, export_tree_arrays, is_tree_ensemble
+
+
+def load_joblib(path, mmap_mode=None):
+    """Load a joblib artifact, silencing sklearn version warnings."""
+    import joblib
+    import warnings
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning)
+        return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def load_model_artifact(path, mmap_mode='r', convert_xgboost=False):
+    """
+    Load a model artifact: either a pickled model or encoder, or the arrays exported by
+    the export_model_arrays command. Exported arrays are memory-mapped (with mmap_mode) and
+    wrapped in a TreeEnsembleClassifier (trees) or DifficultyCategories (encoder
+    categories), so worker processes share one copy of them and need neither XGBoost nor
+    sklearn to load them.
+
+    With convert_xgboost, a pickled XGBoost model is flattened into a TreeEnsembleClassifier
+    as well (held in this process's memory) unless it uses features the evaluator lacks.
+    """
+    artifact = load_joblib(path, mmap_mode=mmap_mode)
+    if is_tree_ensemble(artifact):
+        return TreeEnsembleClassifier(artifact)
+    if is_difficulty_categories(artifact):
+        return DifficultyCategories(artifact)
+    if convert_xgboost and hasattr(artifact, 'get_booster'):
+        try:
+            return TreeEnsembleClassifier(export_tree_arrays(artifact))
+        except ValueError as e:
+            print(f"Keeping XGBoost evaluation for {path}: {e}")
+    return artifact
+
+
+def _rss_bytes():
+    """Resident memory of this process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Loads each model artifact once per process and shares it between predictors.
+
+    Artifacts are registered by name and cached by file path, so names that point at
+    the same file share one loaded object. An artifact is loaded on its first get() or
+    by warm_up(); a failed load is remembered (get() then returns None) so requests do
+    not retry it over and over.
+
+    Usage:
+        registry = ModelRegistry()
+        registry.register('dyslexia_model', '/srv/models/dyslexia_level_predictor.joblib')
+        model = registry.get('dyslexia_model')
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # One load at a time keeps the RSS deltas apart
+        self._entries = {}  # name -> (path, loader)
+        self._artifacts = {}  # path -> {"value", "error", load statistics}
+
+    def register(self, name, path, loader=load_joblib):
+        """Register an artifact file under a name; loader(path) returns the loaded object."""
+        with self._lock:
+            self._entries[name] = (os.path.abspath(path), loader)
+
+    def get(self, name):
+        """Return the loaded artifact, loading it on first use; None if it failed to load."""
+        path, loader = self._entries[name]
+        artifact = self._artifacts.get(path)
+        if artifact is None:
+            with self._load_lock:
+                artifact = self._artifacts.get(path)
+                if artifact is None:
+                    artifact = self._artifacts[path] = self._load(name, path, loader)
+        return artifact['value']
+
+    def _load(self, name, path, loader):
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        value = None
+        error = None
+        try:
+            value = loader(path)
+        except Exception as e:
+            error = str(e)
+            print(f"Error loading model artifact '{name}' from {path}: {e}")
+        load_seconds = time.perf_counter() - started
+        rss_after = _rss_bytes()
+        return {
+            'value': value,
+            'error': error,
+            'load_seconds': round(load_seconds, 6),
+            'file_bytes': os.path.getsize(path) if os.path.exists(path) else None,
+            # Growth of resident memory during the load; the first load also counts the
+            # libraries it imports (e.g. xgboost)
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'loaded_at': time.time(),
+        }
+
+    def warm_up(self, names=None):
+        """Load the given (default: all registered) artifacts now; returns stats()."""
+        for name in names or list(self._entries):
+            self.get(name)
+        return self.stats()
+
+    def stats(self):
+        """Per-name load status, time and memory footprint; shared artifacts list each other."""
+        with self._lock:
+            entries = dict(self._entries)
+        names_by_path = {}
+        for name, (path, _) in entries.items():
+            names_by_path.setdefault(path, []).append(name)
+
+        stats = {}
+        for name, (path, _) in entries.items():
+            artifact = self._artifacts.get(path)
+            summary = {
+                'path': path,
+                'loaded': artifact is not None and artifact['error'] is None,
+                'shared_with': [other for other in names_by_path[path] if other != name],
+            }
+            if artifact is not None:
+                summary.update({key: value for key, value in artifact.items() if key != 'value'})
+            stats[name] = summary
+        return stats
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """Return the process-wide ModelRegistry with the predictor artifacts from settings registered."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from django.conf import settings
+                registry = ModelRegistry()
+                load_model = partial(
+                    load_model_artifact,
+                    mmap_mode=getattr(settings, 'QUIZ_MODEL_MMAP_MODE', 'r'),
+                    convert_xgboost=getattr(settings, 'QUIZ_CONVERT_XGBOOST_MODELS', True)
+                )
+                dyslexia_model_path = getattr(
+                    settings, 'QUIZ_DYSLEXIA_MODEL_PATH',
+                    os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib')
+                )
+                registry.register('dyslexia_model', dyslexia_model_path, loader=load_model)
+                # Autism reuses the dyslexia model unless a separate one is configured
+                registry.register('autism_model', getattr(settings, 'QUIZ_AUTISM_MODEL_PATH', dyslexia_model_path),
+                                  loader=load_model)
+                registry.register('difficulty_encoder', getattr(
+                    settings, 'QUIZ_DIFFICULTY_ENCODER_PATH',
+                    os.path.join(settings.BASE_DIR, 'difficulty_encoder.joblib')
+                ), loader=load_model)
+                _registry = registry
+    return _registry
@@ -1,7 +1,30 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+import hashlib
+import json
+import unicodedata
 import uuid
 
+
+def _normalize_text(value):
+    """Case-fold and collapse whitespace so trivially different copies compare equal."""
+    return " ".join(unicodedata.normalize("NFKC", str(value)).casefold().split())
+
+
+def compute_content_hash(question_text, options, correct_answer, condition_type, difficulty_level):
+    """SHA-256 of a question's normalized text, options (in order), answer, condition and difficulty."""
+    payload = json.dumps([
+        _normalize_text(question_text),
+        [_normalize_text(option) for option in options or []],
+        _normalize_text(correct_answer),
+        condition_type,
+        difficulty_level,
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class AssessmentQuestion(models.Model):
     """Model to store generated questions with their metadata"""
     CONDITION_CHOICES = [
@@ -21,8 +44,33 @@ class AssessmentQuestion(models.Model):
     correct_answer = models.CharField(max_length=1)  # A, B, C, or D
     condition_type = models.CharField(max_length=20, choices=CONDITION_CHOICES)
     difficulty_level = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default='moderate')
+    explanation = models.TextField(blank=True, default='')
+    content_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False,
+                                    help_text="Normalized content hash; textually identical questions share one row")
+    in_bank = models.BooleanField(default=False, help_text="Whether the question is waiting unused in the pre-generated question bank")
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['in_bank', 'condition_type', 'difficulty_level'], name='quiz_question_bank_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        content_hash = self.compute_hash()
+        if content_hash != self.content_hash:
+            # A copy of a question another row already holds keeps a NULL hash (as the
+            # content_hash backfill left older duplicates) instead of failing the unique constraint
+            duplicate = AssessmentQuestion.objects.filter(content_hash=content_hash).exclude(pk=self.pk).exists()
+            self.content_hash = None if duplicate else content_hash
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'content_hash'}
+        super().save(*args, **kwargs)
+    
+    def compute_hash(self):
+        return compute_content_hash(
+            self.question_text, self.options, self.correct_answer, self.condition_type, self.difficulty_level
+        )
+    
     def __str__(self):
         return f"{self.condition_type} - {self.question_text[:50]}..."
 
@@ -77,8 +125,18 @@ class AssessmentSession(models.Model):
     predicted_dyslexic_type = models.CharField(max_length=30, choices=DYSLEXIC_TYPE_CHOICES, null=True, blank=True)
     predicted_severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, null=True, blank=True)
     
+    # Idempotent submission: retries with the same key replay the stored response
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                       help_text="SHA-256 of the submit endpoint and the client's idempotency key or quiz session id")
+    response_payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, help_text="Response returned for the original submission")
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_assessment_submission'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - {self.assessment_type} - {self.accuracy_percentage}% ({self.created_at})"
 
@@ -113,3 +171,92 @@ class QuestionTiming(models.Model):
     
     def __str__(self):
         return f"{self.session.user.username} - Q{self.question.question_id} - {self.response_time}s"
+
+class QuizGenerationJob(models.Model):
+    """Model to track a quiz generation request that runs in the background"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_generation_jobs')
+    assessment_type = models.CharField(max_length=20, choices=AssessmentSession.ASSESSMENT_TYPE_CHOICES, default='both')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Request snapshot: validated pre-assessment data and the customized distribution
+    request_data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    num_easy = models.IntegerField()
+    num_moderate = models.IntegerField()
+    num_hard = models.IntegerField()
+    use_visual_assessment = models.BooleanField(default=False)
+
+    questions_ready = models.IntegerField(default=0, help_text="Questions generated so far")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, help_text="generate_quiz_view response once completed")
+    error = models.JSONField(null=True, blank=True, help_text="Error details if the job failed")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def total_questions(self):
+        return self.num_easy + self.num_moderate + self.num_hard
+
+    def __str__(self):
+        return f"{self.user.username} - {self.assessment_type} - {self.status} ({self.created_at})"
+
+class QuizSession(models.Model):
+    """Model to store a served quiz under the session_id returned to the client, so submissions can be graded against it"""
+    session_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_sessions')
+    assessment_type = models.CharField(max_length=20, choices=AssessmentSession.ASSESSMENT_TYPE_CHOICES, default='both')
+    question_ids = models.JSONField(default=list, help_text="question_id of each question, in the order presented")
+    difficulty_distribution = models.JSONField(default=dict)
+    pre_assessment_data = models.JSONField(default=dict, encoder=DjangoJSONEncoder,
+                                           help_text="Pre-assessment snapshot, in the shape submit views read from pre_assessment_data")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.assessment_type} - {self.total_questions} questions ({self.created_at})"
+
+class PredictionTask(models.Model):
+    """Model to queue the ML predictions for a submitted assessment so they run outside the request"""
+    KIND_CHOICES = [
+        ('both', 'Dyslexia and Autism'),
+        ('dyslexia', 'Dyslexia Only'),
+        ('autism', 'Autism Only'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    session = models.ForeignKey(AssessmentSession, on_delete=models.CASCADE, related_name='prediction_tasks')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='both')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Earliest time the next attempt may start")
+    last_error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} prediction for session {self.session_id} - {self.status} ({self.attempts}/{self.max_attempts})"
@@ -0,0 +1,118 @@
+# quiz_generator/persistence.py
+from django.db import IntegrityError, transaction
+
+from .models import AssessmentQuestion
+from .question_stream import validate_question
+
+VALID_CONDITIONS = {choice for choice, _ in AssessmentQuestion.CONDITION_CHOICES}
+VALID_DIFFICULTIES = {choice for choice, _ in AssessmentQuestion.DIFFICULTY_CHOICES}
+
+
+def resolve_condition_type(assessment_type, question_data, index):
+    """Determine a generated question's condition from the assessment type and Gemini's output."""
+    if assessment_type in VALID_CONDITIONS:
+        return assessment_type
+    # For 'both' assessment type, use focus_area field from Gemini
+    if question_data.get('focus_area') in VALID_CONDITIONS:
+        return question_data['focus_area']
+    # Fallback: alternate between dyslexia and autism to ensure mix
+    return 'dyslexia' if index % 2 == 0 else 'autism'
+
+
+def is_storable_question(question_data, condition_type):
+    """Whether a generated question is valid and has a known condition and difficulty."""
+    return (
+        validate_question(question_data)
+        and condition_type in VALID_CONDITIONS
+        and question_data.get('difficulty', 'moderate') in VALID_DIFFICULTIES
+    )
+
+
+def build_question(question_data, condition_type, in_bank=False):
+    """Build an unsaved AssessmentQuestion (with its question_id already assigned) from generated data."""
+    return AssessmentQuestion(
+        question_text=question_data['question'],
+        options=question_data['options'],
+        correct_answer=question_data['correct_answer'],
+        condition_type=condition_type,
+        difficulty_level=question_data.get('difficulty', 'moderate'),
+        explanation=question_data.get('explanation', ''),
+        in_bank=in_bank
+    )
+
+
+def save_question(question):
+    """Save one built question, or return the existing row if an identical question is already stored."""
+    question.content_hash = question.compute_hash()
+    existing = AssessmentQuestion.objects.filter(content_hash=question.content_hash).first()
+    if existing is not None:
+        return existing
+    try:
+        with transaction.atomic():
+            question.save()
+    except IntegrityError:
+        # Inserted by a concurrent request between the lookup and the save
+        return AssessmentQuestion.objects.get(content_hash=question.content_hash)
+    return question
+
+
+def save_generated_questions(questions, assessment_type, in_bank=False):
+    """
+    Validate every generated question, then write them all with a single bulk_create
+    inside one transaction (one INSERT and one commit instead of one per question).
+
+    Questions whose normalized content hash is already stored resolve to the existing
+    row instead of adding a duplicate, and questions repeated within the batch are
+    returned once, so the result can be shorter than the input.
+
+    Args:
+        questions (list): Question dicts as returned by the generator.
+        assessment_type (str): "dyslexia", "autism" or "both"; decides each row's condition.
+        in_bank (bool): Whether newly inserted rows go into the pre-generated question bank.
+
+    Returns:
+        list[AssessmentQuestion]: One saved (or existing) row per distinct question, in input
+        order, with their question_id UUIDs. Each row's `created` is True if this call
+        inserted it and False if it was already stored (existing rows keep their in_bank).
+
+    Raises:
+        ValueError: If any question is invalid; nothing is written in that case.
+    """
+    rows = []
+    invalid = []
+    for i, q in enumerate(questions):
+        condition_type = resolve_condition_type(assessment_type, q, i)
+        if not is_storable_question(q, condition_type):
+            invalid.append(i + 1)
+            continue
+        row = build_question(q, condition_type, in_bank=in_bank)
+        # bulk_create skips save(), so hash here
+        row.content_hash = row.compute_hash()
+        rows.append(row)
+
+    if invalid:
+        raise ValueError(f"Invalid generated questions at positions {invalid}")
+
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(row.content_hash, row)
+
+    with transaction.atomic():
+        stored = {
+            question.content_hash: question
+            for question in AssessmentQuestion.objects.filter(content_hash__in=list(unique_rows))
+        }
+        for question in stored.values():
+            question.created = False
+        new_rows = [row for content_hash, row in unique_rows.items() if content_hash not in stored]
+        if new_rows:
+            # ignore_conflicts covers rows a concurrent request inserted first; it also
+            # leaves primary keys unset, so read the inserted rows back by hash. A row
+            # that lost such a race has another question_id than the one built here.
+            AssessmentQuestion.objects.bulk_create(new_rows, ignore_conflicts=True)
+            built = {row.content_hash: row.question_id for row in new_rows}
+            for question in AssessmentQuestion.objects.filter(content_hash__in=list(built)):
+                question.created = question.question_id == built[question.content_hash]
+                stored[question.content_hash] = question
+
+    return [stored[content_hash] for content_hash in unique_rows]
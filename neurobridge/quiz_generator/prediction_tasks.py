@@ -0,0 +1,182 @@
+# quiz_generator/prediction_tasks.py
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PredictionTask
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _prediction_function(kind):
+    """The function that runs one kind of prediction for a session id; raises on failure."""
+    if kind == 'autism':
+        from .autism_predictor import run_autism_prediction
+        return run_autism_prediction
+    from .dyslexia_predictor import run_both_predictions, run_dyslexia_prediction
+    return run_both_predictions if kind == 'both' else run_dyslexia_prediction
+
+
+def _init_worker_process():
+    import django
+    django.setup()
+    if getattr(settings, 'QUIZ_WARM_UP_MODELS', False):
+        from .model_registry import get_model_registry
+        get_model_registry().warm_up()
+
+
+def get_prediction_executor():
+    """
+    Return the process-wide pool for prediction tasks, creating it on first use.
+
+    QUIZ_PREDICTION_EXECUTOR selects a thread pool ('thread'), a pool of spawned worker
+    processes ('process', keeps model inference off the web workers' GIL), or None
+    ('worker': tasks only run in the run_prediction_worker command).
+    """
+    global _executor
+    mode = getattr(settings, 'QUIZ_PREDICTION_EXECUTOR', 'thread')
+    if mode == 'worker':
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'QUIZ_PREDICTION_WORKERS', 2)
+                if mode == 'process':
+                    _executor = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker_process
+                    )
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prediction')
+    return _executor
+
+
+def enqueue_prediction(session, kind):
+    """
+    Queue the predictions for a saved assessment session.
+
+    Call this inside the transaction that saves the session: the task row commits (or
+    rolls back) with it, and is handed to the in-process pool once the commit is done.
+    Rows survive restarts, so run_prediction_worker can pick up anything left behind.
+
+    Args:
+        session (AssessmentSession): The saved session.
+        kind (str): "both", "dyslexia" or "autism".
+
+    Returns:
+        PredictionTask: The queued task.
+    """
+    task = PredictionTask.objects.create(
+        session=session,
+        kind=kind,
+        max_attempts=getattr(settings, 'QUIZ_PREDICTION_MAX_ATTEMPTS', 3)
+    )
+    transaction.on_commit(lambda: dispatch_task(task.pk))
+    return task
+
+
+def dispatch_task(task_pk, delay=0):
+    """Run a task on the in-process pool, after delay seconds; a no-op in 'worker' mode."""
+    executor = get_prediction_executor()
+    if executor is None:
+        return
+    if delay:
+        timer = threading.Timer(delay, dispatch_task, args=[task_pk])
+        timer.daemon = True
+        timer.start()
+        return
+    future = executor.submit(run_prediction_task, task_pk)
+    future.add_done_callback(lambda done: _schedule_retry(task_pk, done))
+
+
+def _schedule_retry(task_pk, future):
+    # Retries are scheduled from the submitting process, which owns the pool
+    if future.exception() is not None:
+        print(f"Prediction task {task_pk} crashed its worker: {future.exception()}")
+        return
+    retry_delay = future.result()
+    if retry_delay is not None:
+        dispatch_task(task_pk, delay=retry_delay)
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt: QUIZ_PREDICTION_RETRY_DELAY, doubled per failure."""
+    return getattr(settings, 'QUIZ_PREDICTION_RETRY_DELAY', 5) * 2 ** (attempts - 1)
+
+
+def run_prediction_task(task_pk):
+    """
+    Claim one due task, run its predictions and record the outcome.
+
+    A failed attempt is put back as pending with an exponential backoff until
+    max_attempts is reached, after which the task is marked failed.
+
+    Returns:
+        float: Seconds until the retry is due if the attempt failed and will be retried,
+               otherwise None (also when the task was not due or already claimed).
+    """
+    try:
+        now = timezone.now()
+        claimed = PredictionTask.objects.filter(pk=task_pk, status='pending', run_after__lte=now).update(
+            status='running', started_at=now, attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return None
+        task = PredictionTask.objects.get(pk=task_pk)
+
+        try:
+            _prediction_function(task.kind)(task.session_id)
+        except Exception as e:
+            print(f"Prediction task {task_pk} failed (attempt {task.attempts}/{task.max_attempts}): {e}")
+            if task.attempts >= task.max_attempts:
+                _finish_task(task_pk, status='failed', last_error=str(e))
+                return None
+            delay = retry_delay(task.attempts)
+            PredictionTask.objects.filter(pk=task_pk).update(
+                status='pending', run_after=timezone.now() + timedelta(seconds=delay), last_error=str(e)
+            )
+            return delay
+
+        _finish_task(task_pk, status='completed', last_error='')
+        return None
+    finally:
+        close_old_connections()
+
+
+def _finish_task(task_pk, **fields):
+    PredictionTask.objects.filter(pk=task_pk).update(completed_at=timezone.now(), **fields)
+
+
+def due_task_ids(limit=100):
+    """Ids of pending tasks whose next attempt is due, oldest first."""
+    return list(
+        PredictionTask.objects
+        .filter(status='pending', run_after__lte=timezone.now())
+        .order_by('run_after')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+def requeue_stale_tasks():
+    """
+    Put tasks that have been running for longer than QUIZ_PREDICTION_TASK_TIMEOUT seconds
+    back in the queue (or fail them if they are out of attempts), e.g. after the process
+    running them was restarted.
+
+    Returns:
+        int: Number of tasks requeued or failed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'QUIZ_PREDICTION_TASK_TIMEOUT', 300))
+    stale = PredictionTask.objects.filter(status='running', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', completed_at=timezone.now(), last_error='Timed out while running'
+    )
+    requeued = stale.update(status='pending', run_after=timezone.now(), last_error='Timed out while running')
+    return failed + requeued
@@ -0,0 +1,268 @@
+# quiz_generator/question_bank.py
+import threading
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Count, F, Window
+from django.db.models.functions import Random, RowNumber
+
+from .models import AssessmentQuestion
+from .persistence import save_generated_questions
+from .question_stream import validate_question
+from .gemini_mcq_generator import (
+    CONDITION_TYPES, DIFFICULTY_LEVELS, generate_assessment_questions, split_distribution
+)
+
+_refill_lock = threading.Lock()
+_refill_thread = None
+
+
+def get_low_water_mark():
+    """Minimum number of unused questions to keep in each (condition, difficulty) partition."""
+    return getattr(settings, 'QUESTION_BANK_LOW_WATER_MARK', 20)
+
+
+def draw_questions(condition, num_easy, num_moderate, num_hard):
+    """
+    Take unused questions out of the bank for one quiz.
+
+    Candidates for every requested partition are read in a single windowed query, in
+    random order so concurrent quiz starts (e.g. a whole classroom) mostly pick different
+    rows, and then claimed atomically, so two requests never receive the same rows. A
+    request that loses part of its claim to another one draws again, up to
+    QUESTION_BANK_CLAIM_ATTEMPTS times.
+
+    Returns:
+        list[AssessmentQuestion] | None: The claimed questions, or None if any partition
+        does not hold enough questions or every claim attempt lost (the caller should
+        generate them instead).
+    """
+    partitions = split_distribution(condition, num_easy, num_moderate, num_hard)
+    if not partitions:
+        return None
+
+    attempts = max(getattr(settings, 'QUESTION_BANK_CLAIM_ATTEMPTS', 3), 1)
+    for _ in range(attempts):
+        selected = _pick_bank_candidates(partitions)
+        if selected is None:
+            return None
+
+        with transaction.atomic():
+            claimed = AssessmentQuestion.objects.filter(
+                id__in=[q.id for q in selected], in_bank=True
+            ).update(in_bank=False)
+            if claimed != len(selected):
+                # Another request claimed some of these rows first
+                transaction.set_rollback(True)
+                continue
+
+        for question in selected:
+            question.in_bank = False
+        return selected
+
+    print(f"Question bank claim lost {attempts} times for {condition}; generating instead")
+    return None
+
+
+def _pick_bank_candidates(partitions):
+    """Random unused bank rows for each partition, or None if some partition is short."""
+    candidates = (
+        AssessmentQuestion.objects
+        .filter(
+            in_bank=True,
+            condition_type__in={c for c, _ in partitions},
+            difficulty_level__in={d for _, d in partitions},
+        )
+        .annotate(bank_position=Window(
+            expression=RowNumber(),
+            partition_by=[F('condition_type'), F('difficulty_level')],
+            order_by=Random(),
+        ))
+        .filter(bank_position__lte=max(partitions.values()))
+    )
+
+    available = {key: [] for key in partitions}
+    for question in candidates:
+        key = (question.condition_type, question.difficulty_level)
+        if key in available and len(available[key]) < partitions[key]:
+            available[key].append(question)
+
+    selected = []
+    for key, count in partitions.items():
+        if len(available[key]) < count:
+            return None
+        selected.extend(available[key])
+    return selected
+
+
+def fallback_questions(condition, num_easy, num_moderate, num_hard):
+    """
+    Pick random stored questions for a quiz without generating anything.
+
+    Used while the generator is unavailable. Any stored question with the right
+    condition and difficulty qualifies, so students may see questions that were used
+    before; bank rows are not claimed.
+
+    Returns:
+        list[AssessmentQuestion] | None: The questions, or None if some partition does not
+        have enough stored questions.
+    """
+    partitions = split_distribution(condition, num_easy, num_moderate, num_hard)
+    if not partitions:
+        return None
+
+    candidates = (
+        AssessmentQuestion.objects
+        .filter(
+            condition_type__in={c for c, _ in partitions},
+            difficulty_level__in={d for _, d in partitions},
+        )
+        .annotate(draw_position=Window(
+            expression=RowNumber(),
+            partition_by=[F('condition_type'), F('difficulty_level')],
+            order_by=Random(),
+        ))
+        .filter(draw_position__lte=max(partitions.values()))
+    )
+
+    available = {key: [] for key in partitions}
+    for question in candidates:
+        key = (question.condition_type, question.difficulty_level)
+        if key in available and len(available[key]) < partitions[key]:
+            available[key].append(question)
+
+    selected = []
+    for key, count in partitions.items():
+        if len(available[key]) < count:
+            return None
+        selected.extend(available[key])
+    return selected
+
+
+def get_bank_levels():
+    """Return {(condition_type, difficulty_level): unused question count} for every partition."""
+    levels = {(c, d): 0 for c in CONDITION_TYPES for d in DIFFICULTY_LEVELS}
+    rows = (
+        AssessmentQuestion.objects
+        .filter(in_bank=True)
+        .values('condition_type', 'difficulty_level')
+        .annotate(count=Count('id'))
+    )
+    for row in rows:
+        key = (row['condition_type'], row['difficulty_level'])
+        if key in levels:
+            levels[key] = row['count']
+    return levels
+
+
+def refill_bank(low_water_mark=None):
+    """
+    Top every bank partition back up to the low-water mark.
+
+    Generation is done per condition, asking for each difficulty's deficit in batches of
+    at most QUESTION_BANK_REFILL_BATCH_SIZE questions.
+
+    Returns:
+        int: Number of questions added to the bank (generated questions that were already
+             stored do not count).
+    """
+    if low_water_mark is None:
+        low_water_mark = get_low_water_mark()
+    batch_size = getattr(settings, 'QUESTION_BANK_REFILL_BATCH_SIZE', 10)
+
+    levels = get_bank_levels()
+    added = 0
+
+    for condition_type in CONDITION_TYPES:
+        deficits = {
+            d: max(low_water_mark - levels[(condition_type, d)], 0)
+            for d in DIFFICULTY_LEVELS
+        }
+
+        while sum(deficits.values()) > 0:
+            # Fill this batch from the difficulties with the largest deficit first
+            batch = {d: 0 for d in DIFFICULTY_LEVELS}
+            room = batch_size
+            for difficulty in sorted(deficits, key=deficits.get, reverse=True):
+                take = min(deficits[difficulty], room)
+                batch[difficulty] = take
+                room -= take
+
+            questions_data = generate_assessment_questions(
+                condition=condition_type,
+                num_easy=batch['easy'],
+                num_moderate=batch['moderate'],
+                num_hard=batch['hard']
+            )
+            if "error" in questions_data:
+                print(f"Question bank refill failed for {condition_type}: {questions_data['error']}")
+                break
+
+            new_questions = []
+            for q in questions_data.get("questions", []):
+                difficulty = q.get('difficulty')
+                if difficulty not in DIFFICULTY_LEVELS or deficits[difficulty] <= 0 or not validate_question(q):
+                    continue
+                deficits[difficulty] -= 1
+                new_questions.append(q)
+
+            if not new_questions:
+                break
+            saved = save_generated_questions(new_questions, condition_type, in_bank=True)
+            # Questions that were already stored are not put (back) into the bank
+            created = sum(question.created for question in saved)
+            if created < len(new_questions):
+                print(f"Question bank refill for {condition_type}: only {created} of "
+                      f"{len(new_questions)} generated questions were new")
+            added += created
+
+    return added
+
+
+def bank_needs_refill(low_water_mark=None):
+    """True if some bank partition holds fewer unused questions than the low-water mark."""
+    if low_water_mark is None:
+        low_water_mark = get_low_water_mark()
+    return any(count < low_water_mark for count in get_bank_levels().values())
+
+
+def _generator_available():
+    # Imported here: quiz_builder imports this module
+    from .quiz_builder import get_generation_breaker
+    return get_generation_breaker().allow_request()
+
+
+def _run_refill():
+    global _refill_thread
+    try:
+        added = refill_bank()
+        if added:
+            print(f"Question bank refilled with {added} questions")
+    except Exception as e:
+        print(f"Question bank refill error: {e}")
+    finally:
+        close_old_connections()
+        with _refill_lock:
+            _refill_thread = None
+
+
+def schedule_refill():
+    """
+    Start a background refill if the bank is below its low-water mark, unless one is
+    already running or the generation circuit breaker is open (the refill would only
+    add load to a failing backend).
+
+    Returns:
+        bool: Whether a refill was started.
+    """
+    global _refill_thread
+    with _refill_lock:
+        if _refill_thread is not None:
+            return False
+    if not bank_needs_refill() or not _generator_available():
+        return False
+    with _refill_lock:
+        if _refill_thread is not None:
+            return False
+        _refill_thread = threading.Thread(target=_run_refill, name='question-bank-refill', daemon=True)
+        _refill_thread.start()
+    return True
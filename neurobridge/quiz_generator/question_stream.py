@@ -0,0 +1,175 @@
+# quiz_generator/question_stream.py
+import json
+import re
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+CONDITIONS = ("dyslexia", "autism")
+
+
+def _loads_lenient(raw_object: str):
+    """Parse one JSON object, tolerating raw control characters and trailing commas."""
+    try:
+        return json.loads(raw_object, strict=False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA.sub(r"\1", raw_object), strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+def validate_question(question: dict) -> bool:
+    """Check that a generated question has a text, 4 distinct options and a correct answer among them."""
+    if not isinstance(question, dict):
+        return False
+    options = question.get("options")
+    return (
+        isinstance(question.get("question"), str) and question["question"].strip() != ""
+        and isinstance(options, list) and len(options) == 4
+        and len(set(map(str, options))) == 4
+        and question.get("correct_answer") in options
+    )
+
+
+class QuestionStreamParser:
+    """
+    Incrementally extracts question objects from streamed LLM JSON output.
+
+    The model is asked for {"condition": ..., "questions": [{...}, {...}]}. Text is fed
+    in arbitrary chunks and every object that is a direct element of an array (the
+    "questions" array, or a bare top-level array) is returned as soon as its closing
+    brace arrives. Markdown code fences and any text before the first brace are ignored.
+
+    Usage:
+        parser = QuestionStreamParser()
+        for chunk in llm_stream:
+            for question in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+
+    def feed(self, chunk: str) -> list:
+        """Add a chunk of text and return the question objects completed by it."""
+        self.buffer += chunk
+        completed = []
+
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                if self.stack:
+                    self.in_string = True
+            elif char in "{[":
+                if char == "{" and self.stack and self.stack[-1] == "[" and self.object_start is None:
+                    # An element of the questions array begins here
+                    self.object_start = self.position
+                self.stack.append(char)
+            elif char in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if char == "}" and self.object_start is not None and self.stack and self.stack[-1] == "[":
+                    raw_object = self.buffer[self.object_start:self.position + 1]
+                    self.object_start = None
+                    parsed = _loads_lenient(raw_object)
+                    if isinstance(parsed, dict):
+                        completed.append(parsed)
+
+            self.position += 1
+
+        # Drop text that can no longer be part of a pending object
+        keep_from = self.position if self.object_start is None else self.object_start
+        self.buffer = self.buffer[keep_from:]
+        self.position -= keep_from
+        if self.object_start is not None:
+            self.object_start -= keep_from
+
+        return completed
+
+
+def _match_slot(question: dict, condition: str, remaining: dict, exact_split: bool = True):
+    """Pick the (condition_type, difficulty) slot a salvaged question fills, or None."""
+    known_conditions = {key[0] for key in remaining}
+    known_difficulties = {key[1] for key in remaining}
+
+    condition_type = condition if condition != "mixed" else str(question.get("focus_area", "")).lower()
+    if condition_type not in known_conditions:
+        condition_type = None
+    difficulty = str(question.get("difficulty", "")).lower()
+    if difficulty not in known_difficulties:
+        # Unknown or mislabelled difficulty: let it fill any open slot for its condition
+        difficulty = None
+
+    candidates = [
+        key for key, count in remaining.items()
+        if count > 0
+        and (condition_type is None or key[0] == condition_type)
+        and (difficulty is None or key[1] == difficulty)
+    ]
+    if not candidates and not exact_split:
+        # Only the count per difficulty has to match: take an open slot of another condition
+        candidates = [
+            key for key, count in remaining.items()
+            if count > 0 and (difficulty is None or key[1] == difficulty)
+        ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda key: remaining[key])
+
+
+def salvage_questions(text: str, condition: str, expected_slots: dict, exact_split: bool = True):
+    """
+    Keep every valid question object from (possibly malformed) LLM output.
+
+    Args:
+        text (str): Raw model output.
+        condition (str): "dyslexia", "autism" or "mixed".
+        expected_slots (dict): {(condition_type, difficulty): count} the output should fill,
+                               as returned by split_distribution.
+        exact_split (bool): False to let a mixed question fill a slot of the other condition
+                            when its own are full; it then keeps its own "focus_area".
+
+    Returns:
+        tuple: (questions, missing_slots). Each kept question has "focus_area" and
+               "difficulty" set to the slot it fills; extra and repeated questions are dropped.
+               missing_slots maps every unfilled slot to the number still needed.
+    """
+    remaining = dict(expected_slots)
+    questions = []
+    seen_texts = set()
+
+    for question in QuestionStreamParser().feed(text):
+        if not validate_question(question):
+            continue
+        # A repeated question would resolve to the same stored row, so treat it as missing
+        normalized_text = " ".join(question["question"].casefold().split())
+        if normalized_text in seen_texts:
+            continue
+        seen_texts.add(normalized_text)
+        slot = _match_slot(question, condition, remaining, exact_split)
+        if slot is None:
+            continue
+        remaining[slot] -= 1
+        own_condition = str(question.get("focus_area", "")).lower()
+        question["difficulty"] = slot[1]
+        question["focus_area"] = (
+            own_condition if not exact_split and condition == "mixed" and own_condition in CONDITIONS else slot[0]
+        )
+        questions.append(question)
+
+    missing = {slot: count for slot, count in remaining.items() if count > 0}
+    return questions, missing
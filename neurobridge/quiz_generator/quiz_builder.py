@@ -0,0 +1,344 @@
+# quiz_generator/quiz_builder.py
+import random
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.utils import timezone
+
+from .answer_key_cache import get_answer_key_cache
+from .circuit_breaker import CircuitBreaker
+from .concurrency import generation_flight
+from .gemini_mcq_generator import generate_assessment_questions, generate_assessment_questions_parallel
+from .models import QuizSession
+from .persistence import save_generated_questions
+from .question_bank import draw_questions, fallback_questions, schedule_refill
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_condition(assessment_type):
+    """Map an assessment type ("dyslexia", "autism" or "both") to a generator condition."""
+    return assessment_type if assessment_type in ['dyslexia', 'autism'] else 'mixed'
+
+
+def _probe_generation():
+    """Background health check for the circuit breaker: generate a single question."""
+    return "error" not in generate_assessment_questions(condition='dyslexia', num_easy=1, num_moderate=0, num_hard=0)
+
+
+def get_generation_breaker():
+    """Return the process-wide circuit breaker around question generation."""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    probe=_probe_generation,
+                    window_seconds=getattr(settings, 'QUIZ_BREAKER_WINDOW_SECONDS', 60),
+                    min_calls=getattr(settings, 'QUIZ_BREAKER_MIN_CALLS', 5),
+                    failure_rate_threshold=getattr(settings, 'QUIZ_BREAKER_FAILURE_RATE', 0.5),
+                    slow_call_seconds=getattr(settings, 'QUIZ_BREAKER_SLOW_CALL_SECONDS', 20),
+                    open_seconds=getattr(settings, 'QUIZ_BREAKER_OPEN_SECONDS', 30)
+                )
+    return _breaker
+
+
+def generate_quiz_questions(assessment_type, num_easy, num_moderate, num_hard, on_progress=None):
+    """
+    Get the saved questions for one quiz, from the question bank or freshly generated.
+
+    While the generation circuit breaker is open, or if generation fails, the quiz is
+    served from stored questions with matching condition and difficulty instead. The
+    answer keys of the returned questions are cached so the submission can be scored
+    without querying them again.
+
+    Args:
+        assessment_type (str): "dyslexia", "autism" or "both".
+        num_easy (int): Number of easy questions.
+        num_moderate (int): Number of moderate questions.
+        num_hard (int): Number of hard questions.
+        on_progress (callable, optional): Called with the number of questions ready so far.
+
+    Returns:
+        tuple: (saved_questions, None) on success, or (None, {"error", "details"}).
+    """
+    saved_questions, error = _get_quiz_questions(assessment_type, num_easy, num_moderate, num_hard, on_progress)
+    if saved_questions is not None:
+        get_answer_key_cache().put_many(saved_questions)
+    return saved_questions, error
+
+
+def _get_quiz_questions(assessment_type, num_easy, num_moderate, num_hard, on_progress=None):
+    condition = get_condition(assessment_type)
+
+    # Serve from the pre-generated bank when every partition has enough questions
+    if getattr(settings, 'QUESTION_BANK_ENABLED', True):
+        saved_questions = draw_questions(condition, num_easy, num_moderate, num_hard)
+        schedule_refill()
+        if saved_questions is not None:
+            return saved_questions, None
+
+    if not get_generation_breaker().allow_request():
+        saved_questions = fallback_questions(condition, num_easy, num_moderate, num_hard)
+        if saved_questions is None:
+            return None, {
+                'error': 'Failed to generate questions',
+                'details': 'Question generation is temporarily unavailable and not enough stored questions match'
+            }
+        print("Question generator unavailable; serving stored questions")
+        return saved_questions, None
+
+    if not getattr(settings, 'QUIZ_GENERATION_COALESCE', True):
+        saved_questions, error = _generate_and_save(assessment_type, num_easy, num_moderate, num_hard, on_progress)
+    else:
+        # Identical in-flight requests (e.g. a whole classroom starting at once) share one
+        # generation, and its progress; each student's payload is shuffled separately in
+        # build_quiz_payload
+        key = (condition, num_easy, num_moderate, num_hard)
+        (saved_questions, error), shared = generation_flight.do(
+            key,
+            lambda report: _generate_and_save(assessment_type, num_easy, num_moderate, num_hard, report),
+            on_progress=on_progress
+        )
+        if shared:
+            print(f"Reused in-flight question generation for {key}")
+
+    if error is not None:
+        fallback = fallback_questions(condition, num_easy, num_moderate, num_hard)
+        if fallback is not None:
+            print(f"Question generation failed ({error['details']}); serving stored questions")
+            return fallback, None
+    return saved_questions, error
+
+
+def _generate_and_save(assessment_type, num_easy, num_moderate, num_hard, on_progress=None):
+    """Generate questions with the configured strategy and save them; see generate_quiz_questions."""
+    condition = get_condition(assessment_type)
+    started_at = time.monotonic()
+    if getattr(settings, 'QUIZ_GENERATION_FAN_OUT', True):
+        # One concurrent prompt per (condition, difficulty) shard
+        questions_data = generate_assessment_questions_parallel(
+            condition=condition,
+            num_easy=num_easy,
+            num_moderate=num_moderate,
+            num_hard=num_hard,
+            max_workers=getattr(settings, 'QUIZ_GENERATION_MAX_WORKERS', 6),
+            max_retries=getattr(settings, 'QUIZ_GENERATION_SHARD_RETRIES', 2),
+            on_progress=on_progress
+        )
+    else:
+        questions_data = generate_assessment_questions(
+            condition=condition,
+            num_easy=num_easy,
+            num_moderate=num_moderate,
+            num_hard=num_hard
+        )
+    get_generation_breaker().record(time.monotonic() - started_at, error="error" in questions_data)
+
+    if "error" in questions_data:
+        return None, {
+            'error': 'Failed to generate questions',
+            'details': questions_data.get('error')
+        }
+
+    questions = questions_data.get("questions", [])
+    expected_total = num_easy + num_moderate + num_hard
+    if len(questions) != expected_total:
+        return None, {
+            'error': f'Expected {expected_total} questions but got {len(questions)}',
+            'details': 'Question generation did not produce the expected count'
+        }
+
+    # Validate and save all questions in one bulk insert
+    try:
+        saved_questions = save_generated_questions(questions, assessment_type)
+    except ValueError as e:
+        return None, {
+            'error': 'Failed to generate questions',
+            'details': str(e)
+        }
+    if len(saved_questions) != expected_total:
+        return None, {
+            'error': f'Expected {expected_total} questions but got {len(saved_questions)} distinct ones',
+            'details': 'Question generation repeated some questions'
+        }
+    return saved_questions, None
+
+
+def build_quiz_payload(saved_questions, assessment_type, distribution, validated_data,
+                       use_visual_assessment, user_id):
+    """
+    Build the generate_quiz_view response body for a set of saved questions, and store the
+    quiz as a QuizSession under the returned session_id.
+
+    Args:
+        saved_questions (list[AssessmentQuestion]): The quiz questions.
+        assessment_type (str): "dyslexia", "autism" or "both".
+        distribution (dict): {"easy", "moderate", "hard"} counts used for the quiz.
+        validated_data (dict): Validated QuizGenerationRequestSerializer data.
+        use_visual_assessment (bool): Whether visual assessment is recommended.
+        user_id (int): The requesting user's id.
+
+    Returns:
+        tuple: (payload, None) on success, or (None, {"error", "details"}) if the question
+               set does not match the assessment type.
+    """
+    # Format questions for response
+    all_questions = [format_question(i, question) for i, question in enumerate(saved_questions)]
+    dyslexia_count = sum(1 for question in saved_questions if question.condition_type == 'dyslexia')
+    autism_count = len(saved_questions) - dyslexia_count
+
+    # Shuffle questions for randomized order
+    random.shuffle(all_questions)
+
+    # Validate question counts based on assessment type
+    expected_total = 10 if assessment_type in ['dyslexia', 'autism'] else 20
+    if len(all_questions) != expected_total:
+        return None, {
+            'error': f'Expected {expected_total} questions but got {len(all_questions)}',
+            'details': f'Question generation failed for assessment type: {assessment_type}'
+        }
+
+    # For 'both' assessment type, ensure we have questions from both conditions
+    if assessment_type == 'both':
+        if dyslexia_count == 0 or autism_count == 0:
+            return None, {
+                'error': 'Both assessment types must have questions',
+                'details': f'Generated {dyslexia_count} dyslexia and {autism_count} autism questions'
+            }
+
+    pre_assessment_data = get_pre_assessment_data(validated_data)
+    customization_reason = get_customization_reason(validated_data)
+    quiz_session = save_quiz_session(
+        user_id=user_id,
+        assessment_type=assessment_type,
+        question_ids=[question['question_id'] for question in all_questions],
+        distribution=distribution,
+        pre_assessment_data=pre_assessment_data,
+        customization_reason=customization_reason,
+        use_visual_assessment=use_visual_assessment
+    )
+
+    return {
+        'session_id': str(quiz_session.session_id),
+        'questions': all_questions,
+        'total_questions': len(all_questions),
+        'condition': get_condition(assessment_type),
+        'assessment_type': assessment_type,
+        'dyslexia_questions': dyslexia_count,
+        'autism_questions': autism_count,
+        'difficulty_distribution': {
+            'easy': distribution['easy'],
+            'moderate': distribution['moderate'],
+            'hard': distribution['hard']
+        },
+        'pre_assessment_data': pre_assessment_data,
+        'recommendations': {
+            'use_visual_assessment': use_visual_assessment,
+            'difficulty_customized': True,
+            'customization_reason': customization_reason
+        },
+        'generated_at': timezone.now(),
+        'generated_by': user_id,
+        'message': f'Generated {len(all_questions)} questions for {assessment_type} assessment (customized based on pre-assessment data)'
+    }, None
+
+
+def get_pre_assessment_data(validated_data):
+    """Pre-assessment fields from validated QuizGenerationRequestSerializer data."""
+    return {
+        'age': validated_data.get('age'),
+        'grade': validated_data.get('grade'),
+        'reading_level': validated_data.get('reading_level'),
+        'primary_language': validated_data.get('primary_language'),
+        'has_reading_difficulty': validated_data.get('has_reading_difficulty', False),
+        'needs_assistance': validated_data.get('needs_assistance', False),
+        'previous_assessment': validated_data.get('previous_assessment', False)
+    }
+
+
+def save_quiz_session(user_id, assessment_type, question_ids, distribution, pre_assessment_data,
+                      customization_reason, use_visual_assessment, session_id=None):
+    """
+    Store a served quiz so its submission can be graded against the stored question set.
+
+    Args:
+        user_id (int): The student's user id.
+        assessment_type (str): "dyslexia", "autism" or "both".
+        question_ids (list[str]): question_id of each question, in the order presented.
+        distribution (dict): {"easy", "moderate", "hard"} counts used for the quiz.
+        pre_assessment_data (dict): The pre-assessment data returned with the quiz.
+        customization_reason (str): Why the difficulty distribution was customized.
+        use_visual_assessment (bool): Whether visual assessment is recommended.
+        session_id (str, optional): Id already announced to the client; a new one otherwise.
+
+    Returns:
+        QuizSession: The saved quiz session.
+    """
+    return QuizSession.objects.create(
+        session_id=session_id or uuid.uuid4(),
+        user_id=user_id,
+        assessment_type=assessment_type,
+        question_ids=list(question_ids),
+        difficulty_distribution={
+            'easy': distribution['easy'],
+            'moderate': distribution['moderate'],
+            'hard': distribution['hard']
+        },
+        # Keys match what the submit views read from a client-sent pre_assessment_data
+        pre_assessment_data={
+            **pre_assessment_data,
+            'difficulty_customized': True,
+            'customization_reason': customization_reason,
+            'visual_assessment_recommended': use_visual_assessment
+        }
+    )
+
+
+def format_question(index, question):
+    """Format a saved AssessmentQuestion for the quiz generation response."""
+    return {
+        'id': index + 1,
+        'question_id': str(question.question_id),
+        'question': question.question_text,
+        'options': question.options,
+        'correct_answer': question.correct_answer,
+        'difficulty': question.difficulty_level,
+        'condition': question.condition_type,
+        'question_type': question.condition_type,  # Added for frontend clarity
+        'explanation': question.explanation
+    }
+
+
+def get_customization_reason(validated_data, user=None):
+    """Helper function to explain why difficulty was customized."""
+    # Get data from user profile if available
+    age = 10
+    reading_level = ''
+    has_reading_difficulty = False
+
+    if user and hasattr(user, 'student_profile'):
+        try:
+            profile = user.student_profile
+            if profile.pre_assessment_completed:
+                age = profile.age or 10
+                reading_level = profile.reading_level or ''
+                has_reading_difficulty = profile.has_reading_difficulty
+        except Exception:
+            pass
+
+    # Fallback to request data if profile data not available
+    age = validated_data.get('age', age)
+    reading_level = validated_data.get('reading_level', reading_level)
+    has_reading_difficulty = validated_data.get('has_reading_difficulty', has_reading_difficulty)
+
+    if age < 7 or reading_level in ['Cannot read yet', 'Beginning reader (simple words)']:
+        return "Adjusted for young age or beginning reading level"
+    elif age < 12 or reading_level == 'Early reader (simple sentences)':
+        return "Adjusted for younger student or early reading level"
+    elif has_reading_difficulty:
+        return "Adjusted for reported reading difficulties"
+    else:
+        return "Standard distribution for typical student profile"
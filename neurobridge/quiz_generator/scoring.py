@@ -0,0 +1,268 @@
+# quiz_generator/scoring.py
+import uuid
+
+from .answer_key_cache import ANSWER_KEY_FIELDS, get_answer_key_cache
+from .models import AssessmentQuestion, AssessmentResponse, QuizSession
+
+ANSWER_LETTERS = 'ABCD'
+UNANSWERED = '-'
+
+
+def canonical_question_id(question_id):
+    """Normalize a client-supplied question id to str(UUID), or None if it is not a UUID."""
+    try:
+        return str(uuid.UUID(str(question_id)))
+    except ValueError:
+        return None
+
+
+def load_questions(question_ids):
+    """
+    Get the answer keys for the referenced questions, keyed by str(question_id).
+
+    Keys come from the in-process answer-key cache; only cache misses are fetched, with
+    one query. Malformed ids are skipped.
+
+    Returns:
+        dict: {str(question_id): AnswerKey}
+    """
+    valid_ids = {canonical_question_id(question_id) for question_id in question_ids} - {None}
+    cache = get_answer_key_cache()
+    found, missing = cache.get_many(valid_ids)
+    if missing:
+        fetched = AssessmentQuestion.objects.filter(question_id__in=missing).only(*ANSWER_KEY_FIELDS)
+        found.update({key.question_id: key for key in cache.put_many(fetched)})
+    return found
+
+
+def load_quiz_session(user, session_id):
+    """The user's stored QuizSession for a submitted session id, or None if there is none."""
+    try:
+        session_uuid = uuid.UUID(str(session_id))
+    except ValueError:
+        return None
+    return QuizSession.objects.filter(user=user, session_id=session_uuid).first()
+
+
+def resolve_positions(items, quiz_session):
+    """
+    Fill in question_id for answers or timings that reference a question by its 0-based
+    "position" in a stored quiz instead of by id.
+
+    Args:
+        items (list): Answer or timing dicts from a submission.
+        quiz_session (QuizSession): The stored quiz, or None to return items unchanged.
+
+    Returns:
+        list: The items, with question_id set wherever a valid position was given.
+    """
+    if quiz_session is None:
+        return items
+    question_ids = quiz_session.question_ids
+    resolved = []
+    for item in items:
+        position = item.get('position')
+        if item.get('question_id') is None and isinstance(position, int) and 0 <= position < len(question_ids):
+            item = {**item, 'question_id': question_ids[position]}
+        resolved.append(item)
+    return resolved
+
+
+def decode_compact_answers(compact, quiz_session=None):
+    """
+    Expand a compact columnar submission into answer and timing dicts.
+
+    Format:
+        {
+            "answers": "AC-B",                     # One letter per question in quiz order, "-" if unanswered
+            "response_times": [5.2, 3.1, 0, 4.0],  # Seconds, aligned with "answers" (optional)
+            "start_times": [...],                  # Milliseconds, aligned with "answers" (optional)
+            "end_times": [...],                    # Milliseconds, aligned with "answers" (optional)
+            "question_ids": [...]                  # Only needed if the quiz is not stored server-side
+        }
+
+    Args:
+        compact (dict): The compact submission.
+        quiz_session (QuizSession, optional): The stored quiz, which gives the question order.
+
+    Returns:
+        tuple: (answers, timings) in the verbose submission shape; timings are only
+               produced when both start_times and end_times are sent.
+
+    Raises:
+        ValueError: If the submission is malformed.
+    """
+    if not isinstance(compact, dict):
+        raise ValueError("compact answers must be an object")
+    question_ids = compact.get('question_ids') or (quiz_session.question_ids if quiz_session is not None else None)
+    if not question_ids:
+        raise ValueError("question_ids are required when the quiz is not stored")
+    letters = compact.get('answers')
+    if not isinstance(letters, str) or len(letters) > len(question_ids):
+        raise ValueError(f"answers must be a string of at most {len(question_ids)} letters")
+
+    def column(name, cast):
+        values = compact.get(name)
+        if values is None:
+            return None
+        if not isinstance(values, list) or len(values) != len(letters):
+            raise ValueError(f"{name} must have one value per answer")
+        try:
+            return [cast(value) for value in values]
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must contain numbers")
+
+    response_times = column('response_times', float)
+    start_times = column('start_times', int)
+    end_times = column('end_times', int)
+    with_timings = start_times is not None and end_times is not None
+
+    answers = []
+    timings = []
+    for position, letter in enumerate(letters):
+        if letter == UNANSWERED:
+            continue
+        if letter not in ANSWER_LETTERS:
+            raise ValueError(f"invalid answer {letter!r} at position {position}")
+        response_time = response_times[position] if response_times is not None else 0
+        answers.append({
+            'question_id': question_ids[position],
+            'selected_answer': letter,
+            'response_time': response_time
+        })
+        if with_timings:
+            timings.append({
+                'question_id': question_ids[position],
+                'start_time': start_times[position],
+                'end_time': end_times[position],
+                'response_time': response_time
+            })
+    return answers, timings
+
+
+def quiz_question_ids(quiz_session, items):
+    """Question ids a submission is scored against: the stored quiz's, else those the items reference."""
+    if quiz_session is not None:
+        return list(quiz_session.question_ids)
+    return [item.get('question_id') for item in items]
+
+
+def score_answers(answers, questions, trust_client=False):
+    """
+    Score a batch of answers against preloaded questions.
+
+    This is a plain loop over the answers; the saving over the old per-answer scoring
+    comes from load_questions fetching every answer key up front, not from the loop.
+
+    An answer is correct when its letter selects the question's correct option. When the
+    letter cannot be checked (not A-D, or past the question's options), the answer is
+    incorrect, or with trust_client=True takes the client's "is_correct" as
+    submit_assessment_view always has; "correct" counts checked answers only, while the
+    tallies and wrong_questions follow each answer's is_correct.
+
+    An answer may carry "condition_type" to be tallied and reported under that condition
+    instead of its question's (the combined views score each submitted list as the
+    condition it was submitted for). Answers to unknown questions are reported as missing
+    and counted nowhere. A repeated answer to the same question is ignored: only one
+    response per question can be stored, so the old views failed such submissions.
+
+    Args:
+        answers (list): Answer dicts with "question_id", "selected_answer" (A-D) and
+                        "response_time", and optionally "is_correct" and "condition_type".
+        questions (dict): {str(question_id): AnswerKey}, as returned by load_questions.
+        trust_client (bool): Fall back to the client's is_correct for unverifiable answers.
+
+    Returns:
+        dict: {
+            "results": [{"question", "question_id", "user_answer", "is_correct", "response_time"}],
+            "missing": [question ids that were not found],
+            "correct": int, "total": int,
+            "by_condition": {condition_type: {"correct", "total"}},
+            "by_difficulty": {difficulty_level: {"correct", "total"}},
+            "wrong_questions": [{"question_id", "condition_type", "difficulty", "user_answer", "correct_answer"}]
+        }
+    """
+    results = []
+    missing = []
+    wrong_questions = []
+    by_condition = {}
+    by_difficulty = {}
+    correct = 0
+    answered = set()
+
+    for answer in answers:
+        question_id = answer.get('question_id')
+        question = questions.get(canonical_question_id(question_id))
+        if question is None:
+            missing.append(question_id)
+            continue
+        if question.pk in answered:
+            continue
+        answered.add(question.pk)
+
+        user_answer = answer.get('selected_answer')
+        option_index = list(ANSWER_LETTERS).index(user_answer) if user_answer in list(ANSWER_LETTERS) else None
+        if option_index is not None and option_index < len(question.options):
+            is_correct = question.options[option_index] == question.correct_answer
+            if is_correct:
+                correct += 1
+        else:
+            is_correct = bool(answer.get('is_correct', False)) if trust_client else False
+        condition_type = answer.get('condition_type') or question.condition_type
+
+        results.append({
+            'question': question,
+            'question_id': question_id,
+            'user_answer': user_answer,
+            'is_correct': is_correct,
+            'response_time': answer.get('response_time', 0)
+        })
+        condition_tally = by_condition.setdefault(condition_type, {'correct': 0, 'total': 0})
+        difficulty_tally = by_difficulty.setdefault(question.difficulty_level, {'correct': 0, 'total': 0})
+        condition_tally['total'] += 1
+        difficulty_tally['total'] += 1
+        if is_correct:
+            condition_tally['correct'] += 1
+            difficulty_tally['correct'] += 1
+        else:
+            wrong_questions.append({
+                'question_id': str(question_id),
+                'condition_type': condition_type,
+                'difficulty': question.difficulty_level,
+                'user_answer': user_answer,
+                'correct_answer': question.correct_answer
+            })
+
+    return {
+        'results': results,
+        'missing': missing,
+        'correct': correct,
+        'total': len(results),
+        'by_condition': by_condition,
+        'by_difficulty': by_difficulty,
+        'wrong_questions': wrong_questions,
+    }
+
+
+def tally_percentage(tallies, key):
+    """Percentage correct for one condition or difficulty, or None if it had no answers."""
+    tally = tallies.get(key)
+    if not tally or not tally['total']:
+        return None
+    return tally['correct'] / tally['total'] * 100
+
+
+def build_responses(session, results):
+    """Unsaved AssessmentResponse rows for scored results, ready for bulk_create."""
+    return [
+        AssessmentResponse(
+            session=session,
+            question_id=result['question'].pk,
+            user_answer=result['user_answer'],
+            is_correct=result['is_correct'],
+            response_time=result['response_time'],
+            difficulty_level=result['question'].difficulty_level,
+            condition_type=result['question'].condition_type
+        )
+        for result in results
+    ]
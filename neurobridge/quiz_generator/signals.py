@@ -0,0 +1,16 @@
+# quiz_generator/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .answer_key_cache import invalidate_answer_keys
+from .models import AssessmentQuestion
+
+
+@receiver(post_save, sender=AssessmentQuestion)
+@receiver(post_delete, sender=AssessmentQuestion)
+def invalidate_answer_key(sender, instance, **kwargs):
+    """Drop an edited or deleted question's answer key in every worker."""
+    if kwargs.get('created'):
+        # A new question has no cached key yet; a new stamp would only empty every cache
+        return
+    invalidate_answer_keys([instance.question_id])
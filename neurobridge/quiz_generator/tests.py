@@ -1,3 +1,1739 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from classroom import views as classroom_views
+from classroom.models import Classroom, ClassroomMembership
+from profiles.models import StudentProfile, TeacherProfile
+
+from . import (
+    autism_predictor, dyslexia_predictor, generation_jobs, llm_backends, prediction_tasks, question_bank, quiz_builder,
+    views
+)
+from .answer_key_cache import AnswerKeyCache, current_answer_key_version, invalidate_answer_keys
+from .batch_predictions import latest_assessment_sessions, load_session_responses, predict_sessions
+from .circuit_breaker import CircuitBreaker
+from .concurrency import LLMCallLimiter, LLMQueueTimeout, SingleFlight
+from . import gemini_mcq_generator
+from .gemini_mcq_generator import (
+    QuestionGenerator, generate_assessment_questions_parallel, get_question_generator, set_question_generator,
+    split_distribution
+)
+from .inference import (
+    LEVEL_LABELS, DifficultyCategories, difficulty_codes, feature_matrix, predict_levels, sample_feature_rows,
+    session_results
+)
+from .llm_backends import FakeBackend, HedgedBackend, create_backend
+from .llm_metrics import Histogram, LLMMetrics
+from .model_registry import ModelRegistry, get_model_registry, load_joblib, load_model_artifact
+from .models import (
+    AssessmentQuestion, AssessmentResponse, AssessmentSession, PredictionTask, QuizGenerationJob, QuizSession
+)
+from .persistence import build_question, save_generated_questions, save_question
+from .question_stream import QuestionStreamParser, salvage_questions
+from .scoring import decode_compact_answers, load_questions
+from .tree_ensemble import TreeEnsembleClassifier, export_tree_arrays, save_tree_ensemble, split_thresholds
+
+
+def make_question(number, condition_type='dyslexia', difficulty_level='easy', in_bank=False, correct_answer='A'):
+    return AssessmentQuestion.objects.create(
+        question_text=f'Question {number} ({condition_type}, {difficulty_level})?',
+        options=[f'A) first {number}', f'B) second {number}', f'C) third {number}', f'D) fourth {number}'],
+        correct_answer=correct_answer,
+        condition_type=condition_type,
+        difficulty_level=difficulty_level,
+        in_bank=in_bank
+    )
+
+
+def make_user(email='student@example.com', user_type='student', **extra):
+    return get_user_model().objects.create_user(
+        email=email, username=email.split('@')[0], password='password',
+        first_name='Test', last_name='User', user_type=user_type, **extra
+    )
+
+
+def post(view, path, data, user):
+    request = APIRequestFactory().post(path, data, format='json')
+    force_authenticate(request, user=user)
+    return view(request)
+
+
+def get(view, path, user, **kwargs):
+    request = APIRequestFactory().get(path)
+    force_authenticate(request, user=user)
+    return view(request, **kwargs)
+
+
+def sse_events(response):
+    """Decode a text/event-stream response into (event, data) pairs."""
+    body = b''.join(response.streaming_content).decode()
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class FailingFirstCallsBackend(FakeBackend):
+    """FakeBackend whose first `failures` calls for the given condition raise."""
+
+    def __init__(self, failures, condition=None, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.condition = condition
+        self.calls = []
+
+    def stream(self, variables, on_usage=None):
+        with self._lock:
+            self.calls.append(dict(variables))
+            fail = self.condition in (None, variables['condition']) and self.failures > 0
+            if fail:
+                self.failures -= 1
+        if fail:
+            raise RuntimeError('backend unavailable')
+        yield from super().stream(variables, on_usage=on_usage)
+
+
+class ScriptedBackend:
+    """Backend that answers successive calls with the given texts."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def stream(self, variables, on_usage=None):
+        self.calls.append(dict(variables))
+        yield self.responses.pop(0)
+
+
+def generated_questions(questions):
+    """Generator output dicts for (focus_area, difficulty, text) triples."""
+    return [
+        {'question': text, 'options': [f'{text} {letter}' for letter in 'ABCD'], 'correct_answer': f'{text} A',
+         'difficulty': difficulty, 'focus_area': focus_area}
+        for focus_area, difficulty, text in questions
+    ]
+
+
+def question_json(condition, questions):
+    """Model output for (focus_area, difficulty, text) triples."""
+    return json.dumps({'condition': condition, 'questions': generated_questions(questions)})
+
+
+class FakeGeneratorMixin:
+    """Route every generation in the test through an offline backend."""
+    backend = None
+
+    def use_backend(self, backend):
+        self.backend = backend
+        set_question_generator(QuestionGenerator(backend))
+        self.addCleanup(set_question_generator, None)
+        return backend
+
+
+def closed_breaker(test):
+    """Give the test its own healthy generation circuit breaker."""
+    patcher = mock.patch.object(quiz_builder, '_breaker', CircuitBreaker(probe=lambda: True))
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def open_breaker():
+    breaker = CircuitBreaker(probe=lambda: False, open_seconds=3600)
+    breaker._open(time.monotonic())
+    return breaker
+
+
+class QuestionBankTests(TestCase):
+
+    def fill_bank(self, per_partition, condition_type='dyslexia'):
+        return [
+            make_question(f'{difficulty}-{i}', condition_type, difficulty, in_bank=True)
+            for difficulty in ('easy', 'moderate', 'hard')
+            for i in range(per_partition)
+        ]
+
+    def test_draw_claims_requested_distribution(self):
+        self.fill_bank(4)
+        questions = question_bank.draw_questions('dyslexia', 2, 1, 1)
+
+        self.assertEqual(len(questions), 4)
+        self.assertEqual(
+            sorted(q.difficulty_level for q in questions), ['easy', 'easy', 'hard', 'moderate']
+        )
+        self.assertFalse(AssessmentQuestion.objects.filter(id__in=[q.id for q in questions], in_bank=True).exists())
+        self.assertEqual(AssessmentQuestion.objects.filter(in_bank=True).count(), 8)
+
+    def test_draw_returns_none_when_a_partition_is_short(self):
+        self.fill_bank(1)
+        self.assertIsNone(question_bank.draw_questions('dyslexia', 2, 1, 1))
+        self.assertEqual(AssessmentQuestion.objects.filter(in_bank=True).count(), 3)
+
+    def test_consecutive_draws_never_share_rows(self):
+        self.fill_bank(6)
+        first = question_bank.draw_questions('dyslexia', 2, 2, 2)
+        second = question_bank.draw_questions('dyslexia', 2, 2, 2)
+        third = question_bank.draw_questions('dyslexia', 2, 2, 2)
+
+        ids = [q.id for q in first + second + third]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertIsNone(question_bank.draw_questions('dyslexia', 1, 0, 0))
+
+    def test_lost_claim_draws_again(self):
+        self.fill_bank(3)
+        taken = list(AssessmentQuestion.objects.filter(difficulty_level='easy'))
+        AssessmentQuestion.objects.filter(id=taken[0].id).update(in_bank=False)
+        pick = question_bank._pick_bank_candidates
+        # The first draw returns a row a concurrent request already claimed
+        with mock.patch.object(question_bank, '_pick_bank_candidates',
+                               side_effect=[[taken[0]], pick({('dyslexia', 'easy'): 1})]):
+            questions = question_bank.draw_questions('dyslexia', 1, 0, 0)
+
+        self.assertEqual(len(questions), 1)
+        self.assertNotEqual(questions[0].id, taken[0].id)
+
+    @override_settings(QUESTION_BANK_CLAIM_ATTEMPTS=2)
+    def test_claim_attempts_are_bounded(self):
+        question = self.fill_bank(1)[0]
+        AssessmentQuestion.objects.filter(id=question.id).update(in_bank=False)
+        with mock.patch.object(question_bank, '_pick_bank_candidates', return_value=[question]) as pick:
+            self.assertIsNone(question_bank.draw_questions('dyslexia', 1, 0, 0))
+        self.assertEqual(pick.call_count, 2)
+
+    @override_settings(QUESTION_BANK_LOW_WATER_MARK=2)
+    def test_refill_is_skipped_while_bank_is_full(self):
+        self.fill_bank(2, 'dyslexia')
+        self.fill_bank(2, 'autism')
+        with mock.patch.object(question_bank, '_run_refill') as run_refill:
+            self.assertFalse(question_bank.schedule_refill())
+        run_refill.assert_not_called()
+
+    @override_settings(QUESTION_BANK_LOW_WATER_MARK=2)
+    def test_refill_is_skipped_while_breaker_is_open(self):
+        with mock.patch.object(quiz_builder, '_breaker', open_breaker()), \
+                mock.patch.object(question_bank, 'refill_bank') as refill_bank:
+            self.assertFalse(question_bank.schedule_refill())
+        refill_bank.assert_not_called()
+
+    @override_settings(QUESTION_BANK_LOW_WATER_MARK=2)
+    def test_refill_starts_when_bank_is_low(self):
+        with mock.patch.object(quiz_builder, '_breaker', CircuitBreaker(probe=lambda: True)), \
+                mock.patch.object(question_bank, 'refill_bank', return_value=0) as refill_bank:
+            self.assertTrue(question_bank.schedule_refill())
+            for _ in range(100):
+                if question_bank._refill_thread is None:
+                    break
+                time.sleep(0.01)
+        refill_bank.assert_called_once_with()
+
+
+class FanOutGenerationTests(FakeGeneratorMixin, TestCase):
+
+    def test_mixed_split_alternates_odd_remainders(self):
+        self.assertEqual(split_distribution('mixed', 3, 2, 1), {
+            ('dyslexia', 'easy'): 1, ('autism', 'easy'): 2,
+            ('dyslexia', 'moderate'): 1, ('autism', 'moderate'): 1,
+            ('dyslexia', 'hard'): 1,
+        })
+        self.assertEqual(split_distribution('autism', 2, 0, 1), {('autism', 'easy'): 2, ('autism', 'hard'): 1})
+
+    def test_one_prompt_per_shard(self):
+        backend = self.use_backend(FailingFirstCallsBackend(failures=0))
+        progress = []
+        result = generate_assessment_questions_parallel('mixed', 2, 2, 2, on_progress=progress.append)
+
+        self.assertNotIn('error', result)
+        self.assertEqual(len(backend.calls), 6)
+        self.assertEqual([q['id'] for q in result['questions']], list(range(1, 7)))
+        self.assertEqual(
+            sorted((q['focus_area'], q['difficulty']) for q in result['questions']),
+            sorted((c, d) for c in ('dyslexia', 'autism') for d in ('easy', 'moderate', 'hard'))
+        )
+        self.assertEqual(progress[-1], 6)
+        self.assertEqual(sorted(progress), progress)
+
+    def test_failed_shard_is_retried_alone(self):
+        backend = self.use_backend(FailingFirstCallsBackend(failures=1, condition='autism'))
+        result = generate_assessment_questions_parallel('mixed', 2, 0, 0, max_retries=1)
+
+        self.assertNotIn('error', result)
+        self.assertEqual(len(result['questions']), 2)
+        self.assertEqual([call['condition'] for call in backend.calls].count('autism'), 2)
+        self.assertEqual([call['condition'] for call in backend.calls].count('dyslexia'), 1)
+
+    def test_shard_failing_every_retry_reports_failure(self):
+        self.use_backend(FailingFirstCallsBackend(failures=10, condition='dyslexia'))
+        result = generate_assessment_questions_parallel('dyslexia', 1, 1, 0, max_retries=1)
+
+        self.assertIn('error', result)
+        self.assertEqual(
+            sorted(shard['difficulty'] for shard in result['failed_shards']), ['easy', 'moderate']
+        )
+
+
+class QuestionStreamParserTests(TestCase):
+    text = json.dumps({'condition': 'dyslexia', 'questions': [
+        {'id': 1, 'question': 'Which {word} is "spelled" right?', 'options': ['a', 'b', 'c', 'd'], 'correct_answer': 'a'},
+        {'id': 2, 'question': 'Back\\slash [and] brackets}', 'options': ['e', 'f', 'g', 'h'], 'correct_answer': 'f'},
+    ]})
+
+    def test_objects_are_returned_as_they_complete(self):
+        parser = QuestionStreamParser()
+        first_end = self.text.index('}, {') + 1
+        self.assertEqual([q['id'] for q in parser.feed(self.text[:first_end])], [1])
+        self.assertEqual([q['id'] for q in parser.feed(self.text[first_end:])], [2])
+
+    def test_any_chunking_gives_the_same_questions(self):
+        expected = json.loads(self.text)['questions']
+        for size in (1, 2, 7, 64):
+            parser = QuestionStreamParser()
+            questions = []
+            for start in range(0, len(self.text), size):
+                questions.extend(parser.feed(self.text[start:start + size]))
+            self.assertEqual(questions, expected, f'chunk size {size}')
+
+    def test_fences_trailing_commas_and_truncation(self):
+        text = '```json\n{"questions": [{"id": 1, "options": ["a",],}, {"id": 2, "question": "cut'
+        self.assertEqual(QuestionStreamParser().feed(text), [{'id': 1, 'options': ['a']}])
+
+
+@override_settings(QUESTION_BANK_ENABLED=False)
+class StreamViewTests(FakeGeneratorMixin, TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        closed_breaker(self)
+
+    def stream(self, **data):
+        return post(views.generate_quiz_stream_view, '/api/quiz/generate/stream/', data, self.user)
+
+    def test_streams_start_questions_and_done(self):
+        self.use_backend(FakeBackend())
+        # A single-condition quiz for a 10-year-old is 4 easy, 4 moderate and 2 hard questions
+        response = self.stream(assessment_type='dyslexia', age=10)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(response)
+        self.assertEqual([name for name, _ in events], ['start'] + ['question'] * 10 + ['done'])
+        start, done = events[0][1], events[-1][1]
+        self.assertEqual(start['difficulty_distribution'], {'easy': 4, 'moderate': 4, 'hard': 2})
+        self.assertEqual(done['session_id'], start['session_id'])
+        self.assertEqual(done['dyslexia_questions'], 10)
+        quiz = QuizSession.objects.get(session_id=start['session_id'])
+        self.assertEqual(quiz.question_ids, [question['question_id'] for name, question in events if name == 'question'])
+
+    def test_truncated_generation_ends_with_error(self):
+        self.use_backend(FakeBackend(malformed_rate=1.0))
+        events = sse_events(self.stream(assessment_type='dyslexia'))
+
+        self.assertEqual(events[0][0], 'start')
+        self.assertEqual(events[-1][0], 'error')
+        self.assertFalse(QuizSession.objects.exists())
+
+    def test_backend_failure_ends_with_error(self):
+        self.use_backend(FailingFirstCallsBackend(failures=10))
+        events = sse_events(self.stream(assessment_type='autism'))
+
+        self.assertEqual([name for name, _ in events], ['start', 'error'])
+
+    def test_streamed_questions_are_validated_like_bulk_saves(self):
+        valid, bad_difficulty = generated_questions([('autism', 'hard', 'Kept'), ('autism', 'extreme', 'Dropped')])
+
+        saved = views._save_streamed_question(valid, 'both', 0)
+        self.assertEqual((saved.condition_type, saved.difficulty_level), ('autism', 'hard'))
+        self.assertIsNone(views._save_streamed_question(bad_difficulty, 'both', 1))
+        self.assertIsNone(views._save_streamed_question(dict(valid, options=['x', 'x', 'y', 'z']), 'both', 2))
+        with self.assertRaisesMessage(ValueError, 'positions [1]'):
+            save_generated_questions([bad_difficulty], 'both')
+        self.assertEqual(list(AssessmentQuestion.objects.values_list('question_text', flat=True)), ['Kept'])
+
+
+class QuestionGeneratorTests(FakeGeneratorMixin, TestCase):
+    # Two easy dyslexia questions where the mixed split asks for one of each condition
+    lopsided = question_json('mixed', [('dyslexia', 'easy', 'Q1'), ('dyslexia', 'easy', 'Q2')])
+    autism_repair = question_json('autism', [('autism', 'easy', 'Q3')])
+
+    @override_settings(QUIZ_LLM_BACKEND={'name': 'fake'})
+    def test_generator_is_built_once_per_configuration(self):
+        with mock.patch.dict(gemini_mcq_generator._generators, clear=True):
+            generator = get_question_generator()
+            self.assertIs(get_question_generator(), generator)
+            self.assertIsInstance(generator.backend, FakeBackend)
+            with override_settings(QUIZ_LLM_BACKEND={'name': 'fake', 'seed': 1}):
+                self.assertIsNot(get_question_generator(), generator)
+
+    @override_settings(QUIZ_LLM_BACKEND={'name': 'gemini'})
+    def test_missing_api_key_is_reported(self):
+        with mock.patch.dict('os.environ', clear=True):
+            result = gemini_mcq_generator.generate_assessment_questions('dyslexia', 1, 0, 0)
+        self.assertIn('GOOGLE_API_KEY', result['error'])
+
+    @override_settings(QUIZ_EXACT_MIXED_SPLIT=True)
+    def test_exact_split_re_requests_the_short_condition(self):
+        backend = ScriptedBackend(self.lopsided, self.autism_repair)
+        result = QuestionGenerator(backend).generate('mixed', 2, 0, 0)
+
+        self.assertEqual(len(backend.calls), 2)
+        self.assertEqual(result['repair_rounds'], 1)
+        self.assertEqual([q['focus_area'] for q in result['questions']], ['dyslexia', 'autism'])
+
+    @override_settings(QUIZ_EXACT_MIXED_SPLIT=False)
+    def test_any_split_is_accepted_when_not_exact(self):
+        backend = ScriptedBackend(self.lopsided)
+        result = QuestionGenerator(backend).generate('mixed', 2, 0, 0)
+
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(result['repair_rounds'], 0)
+        self.assertEqual([q['focus_area'] for q in result['questions']], ['dyslexia', 'dyslexia'])
+
+
+class SalvageTests(TestCase):
+    slots = {('dyslexia', 'easy'): 1, ('dyslexia', 'hard'): 2}
+
+    def test_truncated_output_keeps_complete_questions(self):
+        text = question_json('dyslexia', [('dyslexia', 'easy', 'Q1'), ('dyslexia', 'hard', 'Q2'), ('dyslexia', 'hard', 'Q3')])
+        questions, missing = salvage_questions(text[:text.index('"Q3"')], 'dyslexia', self.slots)
+
+        self.assertEqual([q['question'] for q in questions], ['Q1', 'Q2'])
+        self.assertEqual(missing, {('dyslexia', 'hard'): 1})
+
+    def test_invalid_repeated_and_extra_questions_are_dropped(self):
+        text = question_json('dyslexia', [
+            ('dyslexia', 'easy', 'Q1'), ('dyslexia', 'easy', ' q1 '), ('dyslexia', 'easy', 'Q2'),
+            ('dyslexia', 'hard', 'Q3'),
+        ])
+        data = json.loads(text)
+        data['questions'][3]['correct_answer'] = 'not an option'
+        questions, missing = salvage_questions(json.dumps(data), 'dyslexia', self.slots)
+
+        # Q2 is a surplus easy question: it does not fill an open hard slot
+        self.assertEqual([q['question'] for q in questions], ['Q1'])
+        self.assertEqual(missing, {('dyslexia', 'hard'): 2})
+
+    def test_unknown_difficulty_fills_any_open_slot(self):
+        text = question_json('dyslexia', [('dyslexia', 'easy', 'Q1'), ('dyslexia', 'impossible', 'Q2')])
+        questions, missing = salvage_questions(text, 'dyslexia', self.slots)
+
+        self.assertEqual([q['difficulty'] for q in questions], ['easy', 'hard'])
+        self.assertEqual(missing, {('dyslexia', 'hard'): 1})
+
+
+class RepairTests(TestCase):
+
+    def test_only_missing_slots_are_re_requested(self):
+        first = question_json('dyslexia', [('dyslexia', 'easy', 'Q1'), ('dyslexia', 'hard', 'Q2')])
+        repair = question_json('dyslexia', [('dyslexia', 'moderate', 'Q3')])
+        # Cut off inside the third question
+        backend = ScriptedBackend(first[:-2] + ', {"question": "Q3 is cut', repair)
+        result = QuestionGenerator(backend).generate('dyslexia', 1, 1, 1)
+
+        self.assertEqual(
+            [(c['num_easy'], c['num_moderate'], c['num_hard']) for c in backend.calls], [(1, 1, 1), (0, 1, 0)]
+        )
+        self.assertEqual([q['question'] for q in result['questions']], ['Q1', 'Q2', 'Q3'])
+        self.assertEqual([q['id'] for q in result['questions']], [1, 2, 3])
+        self.assertEqual(result['salvaged'], 2)
+
+    def test_slots_still_missing_after_repairs_are_reported(self):
+        empty = question_json('dyslexia', [])
+        backend = ScriptedBackend(empty, empty, empty)
+        result = QuestionGenerator(backend).generate('dyslexia', 0, 0, 2, max_repair_rounds=2)
+
+        self.assertEqual(len(backend.calls), 3)
+        self.assertEqual(result['missing_slots'], [{'condition': 'dyslexia', 'difficulty': 'hard', 'count': 2}])
+
+
+class BulkSaveTests(TestCase):
+
+    def test_questions_are_saved_in_input_order(self):
+        questions = generated_questions([('autism', 'hard', 'Q1'), ('dyslexia', 'easy', 'Q2'), ('autism', 'moderate', 'Q3')])
+        with self.assertNumQueries(5):  # Savepoint, lookup, insert, read back, release
+            saved = save_generated_questions(questions, 'both', in_bank=True)
+
+        self.assertEqual([q.question_text for q in saved], ['Q1', 'Q2', 'Q3'])
+        self.assertEqual([q.condition_type for q in saved], ['autism', 'dyslexia', 'autism'])
+        self.assertTrue(all(q.pk and q.in_bank for q in saved))
+        self.assertEqual(AssessmentQuestion.objects.count(), 3)
+
+    def test_single_condition_overrides_focus_area(self):
+        saved = save_generated_questions(generated_questions([('autism', 'easy', 'Q1')]), 'dyslexia')
+        self.assertEqual(saved[0].condition_type, 'dyslexia')
+
+    def test_one_invalid_question_writes_nothing(self):
+        questions = generated_questions([('dyslexia', 'easy', 'Q1'), ('dyslexia', 'extreme', 'Q2')])
+        with self.assertRaisesMessage(ValueError, 'positions [2]'):
+            save_generated_questions(questions, 'dyslexia')
+        self.assertFalse(AssessmentQuestion.objects.exists())
+
+
+class ContentHashTests(TestCase):
+
+    def test_hash_ignores_case_and_whitespace_but_not_difficulty(self):
+        question = make_question(1)
+        copy = AssessmentQuestion(
+            question_text=f'  {question.question_text.upper()} ', options=[f' {o} ' for o in question.options],
+            correct_answer='a', condition_type='dyslexia', difficulty_level='easy'
+        )
+        self.assertEqual(copy.compute_hash(), question.content_hash)
+        copy.difficulty_level = 'hard'
+        self.assertNotEqual(copy.compute_hash(), question.content_hash)
+
+    def test_save_question_reuses_a_row_of_the_same_difficulty_only(self):
+        data = generated_questions([('dyslexia', 'easy', 'Q1')])[0]
+        first = save_question(build_question(data, 'dyslexia'))
+
+        self.assertEqual(save_question(build_question(data, 'dyslexia')).pk, first.pk)
+        harder = save_question(build_question(dict(data, difficulty='hard'), 'dyslexia'))
+        self.assertNotEqual(harder.pk, first.pk)
+        self.assertEqual(harder.difficulty_level, 'hard')
+
+    def test_unhashed_duplicate_can_still_be_edited(self):
+        original = make_question(1)
+        duplicate = make_question(1)
+        self.assertIsNone(duplicate.content_hash)
+
+        duplicate.in_bank = True
+        duplicate.save()
+        duplicate.question_text = 'Now a different question?'
+        duplicate.save(update_fields=['question_text'])
+
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.content_hash, duplicate.compute_hash())
+        self.assertNotEqual(duplicate.content_hash, original.content_hash)
+
+    def test_repeated_questions_are_returned_once(self):
+        existing = save_generated_questions(generated_questions([('dyslexia', 'easy', 'Q1')]), 'dyslexia')[0]
+        questions = generated_questions([('dyslexia', 'easy', 'Q1'), ('dyslexia', 'easy', 'Q2'), ('dyslexia', 'easy', 'q2')])
+        saved = save_generated_questions(questions, 'dyslexia')
+
+        self.assertEqual([q.question_text for q in saved], ['Q1', 'Q2'])
+        self.assertEqual(saved[0].pk, existing.pk)
+        self.assertEqual([q.created for q in saved], [False, True])
+
+    @override_settings(QUESTION_BANK_REFILL_BATCH_SIZE=10)
+    def test_refill_counts_only_new_questions(self):
+        save_generated_questions(generated_questions([('dyslexia', 'easy', 'Q1')]), 'dyslexia')
+        generated = {'questions': generated_questions([('dyslexia', 'easy', 'Q1'), ('dyslexia', 'easy', 'Q2')])}
+        responses = {'dyslexia': generated, 'autism': {'error': 'skipped'}}
+        with mock.patch.object(question_bank, 'generate_assessment_questions',
+                               side_effect=lambda condition, **counts: responses[condition]):
+            added = question_bank.refill_bank(low_water_mark=2)
+
+        self.assertEqual(added, 1)
+        self.assertEqual(list(AssessmentQuestion.objects.filter(in_bank=True).values_list('question_text', flat=True)), ['Q2'])
+
+    def test_repeated_generated_questions_are_a_shortfall(self):
+        repeated = {'questions': generated_questions([('dyslexia', 'easy', 'Q1'), ('dyslexia', 'easy', 'Q1')])}
+        with override_settings(QUIZ_GENERATION_FAN_OUT=False), \
+                mock.patch.object(quiz_builder, '_breaker', CircuitBreaker(probe=lambda: True)), \
+                mock.patch.object(quiz_builder, 'generate_assessment_questions', return_value=repeated):
+            saved, error = quiz_builder._generate_and_save('dyslexia', 2, 0, 0)
+
+        self.assertIsNone(saved)
+        self.assertIn('distinct', error['error'])
+
+    def test_migration_rehashes_with_difficulty(self):
+        migration = importlib.import_module('quiz_generator.migrations.0013_rehash_assessmentquestion_difficulty')
+        first, duplicate = make_question(1), make_question(1)
+        harder = make_question(1, difficulty_level='hard')
+        AssessmentQuestion.objects.update(content_hash=None)
+
+        migration.add_difficulty_to_hashes(apps, None)
+
+        hashes = dict(AssessmentQuestion.objects.values_list('pk', 'content_hash'))
+        self.assertEqual(hashes[first.pk], first.compute_hash())
+        self.assertIsNone(hashes[duplicate.pk])
+        self.assertEqual(hashes[harder.pk], harder.compute_hash())
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+
+    def benchmark(self, *args, concurrency='2'):
+        call_command(
+            'benchmark_quiz_generation', '--concurrency', concurrency, '--requests', '2', '--latency', '0',
+            '--tokens-per-second', '0', '--assessment-type', 'dyslexia', *args, stdout=io.StringIO()
+        )
+
+    def test_removes_only_its_own_questions(self):
+        existing = make_question(1)
+        with mock.patch.object(quiz_builder, '_breaker', CircuitBreaker(probe=lambda: True)):
+            self.benchmark()
+
+        self.assertEqual(list(AssessmentQuestion.objects.values_list('pk', flat=True)), [existing.pk])
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertTrue(settings.QUESTION_BANK_ENABLED)
+
+    def test_keep_leaves_generated_questions(self):
+        with mock.patch.object(quiz_builder, '_breaker', CircuitBreaker(probe=lambda: True)):
+            self.benchmark('--keep', concurrency='1')
+        # Two 10-question quizzes (4 easy, 4 moderate, 2 hard), generated one after the other
+        self.assertEqual(AssessmentQuestion.objects.count(), 20)
+
+
+@override_settings(QUESTION_BANK_ENABLED=False)
+class GenerationJobTests(FakeGeneratorMixin, TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        closed_breaker(self)
+        self.use_backend(FakeBackend())
+
+    def start_job(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = post(views.create_generation_job_view, '/api/quiz/jobs/', {'assessment_type': 'autism'}, self.user)
+        return response, callbacks
+
+    def job_status(self, job_id, user=None):
+        return get(views.generation_job_status_view, f'/api/quiz/jobs/{job_id}/', user or self.user, job_id=job_id)
+
+    def test_job_is_queued_after_commit_and_completes(self):
+        with mock.patch.object(generation_jobs, 'get_job_executor') as get_job_executor:
+            response, callbacks = self.start_job()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['status'], 'pending')
+            get_job_executor.assert_not_called()
+            callbacks[0]()
+        job = QuizGenerationJob.objects.get(job_id=response.data['job_id'])
+        get_job_executor.return_value.submit.assert_called_once_with(generation_jobs.run_generation_job, job.pk)
+
+        generation_jobs.run_generation_job(job.pk)
+
+        data = self.job_status(job.job_id).data
+        self.assertEqual(data['status'], 'completed')
+        self.assertEqual(data['questions_ready'], 10)
+        self.assertEqual(len(data['quiz']['questions']), 10)
+        self.assertTrue(QuizSession.objects.filter(session_id=data['quiz']['session_id']).exists())
+
+    def test_job_runs_once(self):
+        with mock.patch.object(generation_jobs, 'get_job_executor'):
+            response, _ = self.start_job()
+        job = QuizGenerationJob.objects.get(job_id=response.data['job_id'])
+        with mock.patch.object(generation_jobs, 'generate_quiz_questions', return_value=(None, {'error': 'x'})) as generate:
+            generation_jobs.run_generation_job(job.pk)
+            generation_jobs.run_generation_job(job.pk)
+        generate.assert_called_once()
+        self.assertEqual(self.job_status(job.job_id).data['error'], {'error': 'x'})
+
+    def test_other_users_cannot_see_a_job(self):
+        with mock.patch.object(generation_jobs, 'get_job_executor'):
+            response, _ = self.start_job()
+        other = make_user('other@example.com')
+        self.assertEqual(self.job_status(response.data['job_id'], user=other).status_code, 404)
+
+    @override_settings(QUIZ_GENERATION_JOB_TIMEOUT=60)
+    def test_stale_job_is_reported_failed(self):
+        with mock.patch.object(generation_jobs, 'get_job_executor'):
+            response, _ = self.start_job()
+        QuizGenerationJob.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+
+        data = self.job_status(response.data['job_id']).data
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn('60 seconds', data['error']['details'])
+
+
+def run_in_threads(count, target):
+    """Start count threads running target(index) and return them."""
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.005)
+
+
+class SingleFlightTests(TestCase):
+
+    def test_concurrent_callers_share_one_call_and_its_progress(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = {}
+        progress = {index: [] for index in range(3)}
+
+        def leader_work(report):
+            calls.append(1)
+            report(1)
+            release.wait(5)
+            report(2)
+            return 'quiz'
+
+        def caller(index):
+            results[index] = flight.do('key', leader_work, on_progress=progress[index].append)
+
+        threads = run_in_threads(1, caller)
+        wait_until(lambda: progress[0] == [1])
+        # Late followers start from the latest reported value
+        threads += [threading.Thread(target=caller, args=(index,)) for index in (1, 2)]
+        for thread in threads[1:]:
+            thread.start()
+        wait_until(lambda: flight.in_flight() == {'key': 2})
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results.values()), [('quiz', False), ('quiz', True), ('quiz', True)])
+        self.assertEqual(progress, {0: [1, 2], 1: [1, 2], 2: [1, 2]})
+        self.assertEqual(flight.in_flight(), {})
+
+    def test_followers_receive_the_leaders_exception(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def failing(report):
+            release.wait(5)
+            raise RuntimeError('generation failed')
+
+        def caller(index):
+            try:
+                flight.do('key', failing)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        threads = run_in_threads(1, caller)
+        wait_until(lambda: 'key' in flight.in_flight())
+        threads += run_in_threads(1, caller)
+        wait_until(lambda: flight.in_flight() == {'key': 1})
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, ['generation failed'] * 2)
+
+    def test_broken_progress_callback_does_not_fail_the_call(self):
+        def broken(value):
+            raise ValueError('closed')
+
+        self.assertEqual(SingleFlight().do('key', lambda report: report(1) or 'ok', on_progress=broken), ('ok', False))
+
+
+class LLMCallLimiterTests(TestCase):
+
+    def test_calls_beyond_the_cap_queue(self):
+        limiter = LLMCallLimiter(max_concurrent_calls=2, queue_timeout=5)
+        release = threading.Event()
+        peak = []
+
+        def call(index):
+            with limiter.slot():
+                peak.append(limiter.active)
+                release.wait(5)
+
+        threads = run_in_threads(3, call)
+        wait_until(lambda: limiter.active == 2 and limiter.waiting == 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual((limiter.active, limiter.waiting), (0, 0))
+
+    def test_queue_timeout(self):
+        limiter = LLMCallLimiter(max_concurrent_calls=1, queue_timeout=0.01)
+        with limiter.slot():
+            with self.assertRaises(LLMQueueTimeout):
+                with limiter.slot():
+                    pass
+        self.assertEqual((limiter.active, limiter.waiting), (0, 0))
+
+
+@override_settings(QUESTION_BANK_ENABLED=False, QUIZ_GENERATION_COALESCE=True)
+class CoalescedGenerationTests(TestCase):
+
+    def test_identical_requests_share_one_generation_and_its_progress(self):
+        closed_breaker(self)
+        release = threading.Event()
+        saved = [make_question(1)]
+
+        def generate(assessment_type, num_easy, num_moderate, num_hard, on_progress=None):
+            on_progress(1)
+            release.wait(5)
+            return saved, None
+
+        progress = {0: [], 1: []}
+        results = {}
+
+        def request(index):
+            results[index] = quiz_builder._get_quiz_questions('dyslexia', 1, 0, 0, progress[index].append)
+
+        with mock.patch.object(quiz_builder, '_generate_and_save', side_effect=generate) as generate_and_save:
+            threads = run_in_threads(1, request)
+            wait_until(lambda: progress[0] == [1])
+            threads += [threading.Thread(target=request, args=(1,))]
+            threads[1].start()
+            wait_until(lambda: progress[1] == [1])
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        generate_and_save.assert_called_once()
+        self.assertEqual(results, {0: (saved, None), 1: (saved, None)})
+
+
+class LLMMetricsTests(TestCase):
+
+    def setUp(self):
+        self.metrics = LLMMetrics()
+        for module in (gemini_mcq_generator, views):
+            patcher = mock.patch.object(module, 'llm_metrics', self.metrics)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_histogram_buckets_and_quantiles(self):
+        histogram = Histogram([1, 2, 4])
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+
+        self.assertEqual(snapshot['buckets'], {'1': 2, '2': 3, '4': 4, '+Inf': 5})
+        self.assertEqual((snapshot['count'], snapshot['max'], snapshot['mean']), (5, 10, 3.2))
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(1), 10)
+        self.assertIsNone(Histogram([1]).quantile(0.5))
+
+    def test_generation_records_calls_tokens_and_repairs(self):
+        text = question_json('dyslexia', [('dyslexia', 'easy', 'Q1')])
+        QuestionGenerator(ScriptedBackend(text[:-2], question_json('dyslexia', [('dyslexia', 'hard', 'Q2')]))).generate(
+            'dyslexia', 1, 0, 1
+        )
+        QuestionGenerator(FakeBackend()).generate('autism', 1, 0, 0)
+        snapshot = self.metrics.snapshot()
+
+        self.assertEqual(snapshot['counters']['calls_total'], 3)
+        self.assertEqual(snapshot['counters']['generations_total'], 2)
+        self.assertEqual(snapshot['counters']['parse_failure_total'], 1)
+        self.assertEqual(snapshot['histograms']['retries']['max'], 1)
+        self.assertEqual(snapshot['histograms']['salvaged_questions']['max'], 1)
+        # Only the fake backend reports token usage
+        self.assertEqual(snapshot['histograms']['completion_tokens']['count'], 1)
+
+    def test_failed_call_is_counted(self):
+        QuestionGenerator(FailingFirstCallsBackend(failures=1)).generate('autism', 1, 0, 0)
+        counters = self.metrics.snapshot()['counters']
+        self.assertEqual((counters['call_errors_total'], counters['generation_errors_total']), (1, 1))
+
+    def test_metrics_endpoint_is_admin_only_and_resets(self):
+        self.metrics.increment('calls_total')
+        student = make_user()
+        admin = make_user('admin@example.com', is_staff=True)
+
+        self.assertEqual(get(views.llm_metrics_view, '/api/quiz/metrics/', student).status_code, 403)
+        response = get(views.llm_metrics_view, '/api/quiz/metrics/?reset=true', admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counters']['calls_total'], 1)
+        self.assertIn('circuit_breaker', response.data)
+        self.assertEqual(self.metrics.snapshot()['counters']['calls_total'], 0)
+
+
+class CircuitBreakerTests(TestCase):
+
+    def test_opens_on_failure_rate_once_enough_calls(self):
+        breaker = CircuitBreaker(probe=lambda: True, min_calls=4, failure_rate_threshold=0.5, slow_call_seconds=10)
+        breaker.record(1, error=True)
+        breaker.record(11)  # Slow calls count as failures
+        breaker.record(1)
+        self.assertTrue(breaker.allow_request())
+        breaker.record(1)
+
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+        self.assertEqual(breaker.snapshot()['rejected_calls'], 1)
+
+    def test_probe_closes_or_keeps_open(self):
+        for healthy, state in ((True, 'closed'), (False, 'open')):
+            breaker = CircuitBreaker(probe=lambda healthy=healthy: healthy, open_seconds=0)
+            breaker._open(time.monotonic())
+            self.assertFalse(breaker.allow_request())
+            wait_until(lambda: breaker._probe_thread is None)
+            self.assertEqual(breaker.state, state)
+            self.assertEqual(breaker.times_opened, 1)
+
+
+@override_settings(QUESTION_BANK_ENABLED=False)
+class OpenBreakerTests(FakeGeneratorMixin, TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.backend = self.use_backend(FailingFirstCallsBackend(failures=0))
+        patcher = mock.patch.object(quiz_builder, '_breaker', open_breaker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored_quiz(self, condition_type='autism'):
+        for difficulty, count in (('easy', 4), ('moderate', 4), ('hard', 2)):
+            for i in range(count):
+                make_question(f'{difficulty}-{i}', condition_type, difficulty)
+
+    def stream(self):
+        return sse_events(post(views.generate_quiz_stream_view, '/api/quiz/generate/stream/',
+                               {'assessment_type': 'autism'}, self.user))
+
+    def test_generate_serves_stored_questions(self):
+        self.stored_quiz()
+        saved, error = quiz_builder.generate_quiz_questions('autism', 4, 4, 2)
+        self.assertIsNone(error)
+        self.assertEqual(len(saved), 10)
+        self.assertEqual(self.backend.calls, [])
+
+    def test_generate_fails_without_stored_questions(self):
+        saved, error = quiz_builder.generate_quiz_questions('autism', 4, 4, 2)
+        self.assertIsNone(saved)
+        self.assertIn('temporarily unavailable', error['details'])
+        self.assertEqual(self.backend.calls, [])
+
+    def test_stream_serves_stored_questions(self):
+        self.stored_quiz()
+        events = self.stream()
+        self.assertEqual([name for name, _ in events], ['start'] + ['question'] * 10 + ['done'])
+        self.assertEqual(self.backend.calls, [])
+
+    def test_stream_reports_error_without_stored_questions(self):
+        events = self.stream()
+        self.assertEqual([name for name, _ in events], ['start', 'error'])
+        self.assertIn('temporarily unavailable', events[-1][1]['details'])
+        self.assertEqual(self.backend.calls, [])
+
+
+class HedgedBackendTests(TestCase):
+    variables = {'condition': 'dyslexia', 'num_easy': 2, 'num_moderate': 0, 'num_hard': 0, 'total_questions': 2}
+
+    def use_limiter(self, max_concurrent_calls):
+        limiter = LLMCallLimiter(max_concurrent_calls=max_concurrent_calls, queue_timeout=0.5)
+        for module in (llm_backends, gemini_mcq_generator):
+            patcher = mock.patch.object(module, 'get_llm_limiter', return_value=limiter)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return limiter
+
+    def winner(self, backend):
+        return json.loads(backend.invoke(self.variables))['questions'][0]['question'].split(':')[0]
+
+    def test_slow_primary_is_hedged(self):
+        self.use_limiter(2)
+        backend = HedgedBackend([FakeBackend(latency=2, seed=1), FakeBackend(seed=2)], initial_delay=0.05)
+        self.assertEqual(self.winner(backend), '[2')
+
+    def test_failed_primary_starts_the_next_backend_at_once(self):
+        self.use_limiter(1)
+        backend = HedgedBackend([FailingFirstCallsBackend(failures=1, seed=1), FakeBackend(seed=2)], initial_delay=30)
+        started = time.monotonic()
+        self.assertEqual(self.winner(backend), '[2')
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_no_hedge_without_a_free_slot(self):
+        limiter = self.use_limiter(1)
+        hedge = FailingFirstCallsBackend(failures=0, seed=2)
+        backend = HedgedBackend([FakeBackend(latency=0.3, seed=1), hedge], initial_delay=0.05)
+
+        self.assertEqual(self.winner(backend), '[1')
+        self.assertEqual(hedge.calls, [])
+        self.assertEqual(limiter.active, 0)
+
+    def test_generator_leaves_slots_to_the_attempts(self):
+        self.use_limiter(1)
+        result = QuestionGenerator(HedgedBackend([FakeBackend()])).generate('dyslexia', 2, 0, 0)
+        self.assertEqual(len(result['questions']), 2)
+
+    def test_hedged_config_without_backends_races_two_gemini_calls(self):
+        with mock.patch.object(llm_backends, 'GeminiBackend') as gemini:
+            backend = create_backend({'name': 'hedged'}, 'prompt', [], google_api_key='key')
+        self.assertEqual(len(backend.backends), 2)
+        self.assertEqual(gemini.call_count, 2)
+        self.assertTrue(gemini_mcq_generator._uses_gemini({'name': 'hedged'}))
+        self.assertFalse(gemini_mcq_generator._uses_gemini({'name': 'hedged', 'backends': [{'name': 'fake'}]}))
+
+
+def keyed_question(number, condition_type='dyslexia', difficulty_level='easy'):
+    """A question whose correct answer is its first option (A)."""
+    return make_question(number, condition_type, difficulty_level, correct_answer=f'A) first {number}')
+
+
+def answer(question, letter, **extra):
+    return dict({'question_id': str(question.question_id), 'selected_answer': letter, 'response_time': 4.0}, **extra)
+
+
+class BatchedSubmitTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def submit(self, answers, **data):
+        return post(views.submit_assessment_view, '/api/quiz/submit/',
+                    dict({'answers': answers, 'total_questions': len(answers)}, **data), self.user)
+
+    def test_answers_are_scored_against_the_stored_keys(self):
+        questions = [keyed_question(number, condition, difficulty)
+                     for number, (condition, difficulty) in enumerate([('dyslexia', 'easy'), ('dyslexia', 'hard'),
+                                                                       ('autism', 'easy'), ('autism', 'moderate')])]
+        response = self.submit([answer(questions[0], 'A'), answer(questions[1], 'B'),
+                                answer(questions[2], 'A'), answer(questions[3], 'C')])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['correct_answers'], 2)
+        self.assertEqual(response.data['accuracy'], 50)
+        self.assertEqual(response.data['dyslexia_score'], 50)
+        self.assertEqual(response.data['autism_score'], 50)
+        self.assertEqual(response.data['difficulty_breakdown'], {
+            'easy': {'correct': 2, 'total': 2}, 'hard': {'correct': 0, 'total': 1},
+            'moderate': {'correct': 0, 'total': 1}
+        })
+        self.assertEqual([wrong['question_id'] for wrong in response.data['wrong_questions']],
+                         [str(questions[1].question_id), str(questions[3].question_id)])
+        session = AssessmentSession.objects.get(session_id=response.data['session_id'])
+        self.assertEqual(sorted(session.responses.values_list('is_correct', flat=True)), [False, False, True, True])
+
+    def test_query_count_does_not_grow_with_the_answers(self):
+        def queries(count):
+            questions = [keyed_question(f'{count}-{number}') for number in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.submit([answer(question, 'A') for question in questions]).status_code, 200)
+            return len(captured)
+
+        queries(1)  # Creates the student profile
+        self.assertEqual(queries(3), queries(12))
+
+    def test_cached_answer_keys_need_no_query(self):
+        question_ids = [str(keyed_question(number).question_id) for number in range(3)]
+        with self.assertNumQueries(1):
+            self.assertEqual(len(load_questions(question_ids)), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(set(load_questions(question_ids)), set(question_ids))
+        self.assertEqual(load_questions(['not-a-uuid']), {})
+
+
+class ScoringParityTests(TestCase):
+    """Scores match what the per-answer views computed before batching."""
+
+    def setUp(self):
+        self.user = make_user()
+        self.dyslexia = [keyed_question(f'd{number}', 'dyslexia') for number in range(2)]
+        self.autism = [keyed_question(f'a{number}', 'autism') for number in range(2)]
+        self.unknown = {'question_id': '00000000-0000-0000-0000-000000000000', 'selected_answer': 'A'}
+
+    def test_submit_trusts_the_client_only_for_unverifiable_answers(self):
+        answers = [
+            answer(self.dyslexia[0], 'A'),
+            answer(self.dyslexia[1], 'E', is_correct=True),
+            answer(self.autism[0], 'B', is_correct=True),
+            self.unknown,
+        ]
+        response = post(views.submit_assessment_view, '/api/quiz/submit/',
+                        {'answers': answers, 'total_questions': 5}, self.user)
+
+        self.assertEqual(response.data['correct_answers'], 1)
+        self.assertEqual(response.data['accuracy'], 20)
+        self.assertEqual(response.data['dyslexia_score'], 100)
+        self.assertEqual(response.data['autism_score'], 0)
+        self.assertEqual(len(response.data['wrong_questions']), 1)
+
+    def test_combined_scores_each_list_as_its_condition(self):
+        response = post(views.submit_combined_assessment_view, '/api/quiz/submit-combined/', {
+            'dyslexia_answers': [answer(self.dyslexia[0], 'A'), answer(self.autism[0], 'B'), self.unknown],
+            'autism_answers': [answer(self.autism[1], 'A'), answer(self.dyslexia[1], 'A')],
+        }, self.user)
+
+        self.assertEqual(response.data['total_questions'], 5)
+        self.assertEqual(response.data['correct_answers'], 3)
+        self.assertEqual(response.data['accuracy'], 60)
+        self.assertAlmostEqual(response.data['dyslexia_score'], 100 / 3)
+        self.assertEqual(response.data['autism_score'], 100)
+        self.assertEqual(response.data['wrong_questions'], [{
+            'question_id': str(self.autism[0].question_id), 'condition_type': 'dyslexia', 'difficulty': 'easy',
+            'user_answer': 'B', 'correct_answer': self.autism[0].correct_answer
+        }])
+
+    def test_combined_ignores_the_client_is_correct(self):
+        response = post(views.submit_combined_assessment_view, '/api/quiz/submit-combined/', {
+            'dyslexia_answers': [answer(self.dyslexia[0], 'E', is_correct=True)],
+            'autism_answers': [answer(self.autism[0], 'A')],
+        }, self.user)
+
+        self.assertEqual(response.data['dyslexia_score'], 0)
+        self.assertEqual(response.data['correct_answers'], 1)
+
+    def test_manual_autism_total_includes_unknown_questions(self):
+        response = post(views.submit_combined_manual_autism_view, '/api/quiz/submit-combined-manual-autism/', {
+            'dyslexia_results': {'accuracy_percentage': 50, 'total_time': 60},
+            'dyslexia_responses': [{}, {}],
+            'autism_session_id': 'manual',
+            'autism_answers': [answer(self.dyslexia[0], 'A'), self.unknown],
+        }, self.user)
+
+        self.assertEqual(response.data['autism_score'], 50)
+        self.assertEqual(response.data['total_questions'], 4)
+        self.assertEqual(response.data['accuracy'], 50)
+
+    def test_repeated_answer_is_counted_once(self):
+        # Previously a unique-constraint error failed the whole submission
+        response = post(views.submit_assessment_view, '/api/quiz/submit/', {
+            'answers': [answer(self.dyslexia[0], 'A'), answer(self.dyslexia[0], 'B')], 'total_questions': 1
+        }, self.user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['correct_answers'], 1)
+        self.assertEqual(AssessmentSession.objects.get(session_id=response.data['session_id']).responses.count(), 1)
+
+
+class AnswerKeyCacheTests(TestCase):
+    def worker_cache(self):
+        """A cache like another worker process's, sharing the version stamp in Django's cache."""
+        return AnswerKeyCache(ttl=300, version=current_answer_key_version)
+
+    def test_edit_reaches_other_workers_on_commit(self):
+        question = keyed_question(1)
+        other_worker = self.worker_cache()
+        other_worker.get_many([])
+        other_worker.put_many([question])
+
+        question.correct_answer = 'B) second 1'
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            question.save()
+        self.assertEqual(other_worker.get_many([str(question.question_id)])[1], [])
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(other_worker.get_many([str(question.question_id)]), ({}, [str(question.question_id)]))
+        self.assertEqual(other_worker.stats()['version_changes'], 1)
+
+    def test_new_questions_keep_the_version_and_cached_keys(self):
+        cached = keyed_question(1)
+        question_id = str(cached.question_id)
+        other_worker = self.worker_cache()
+        other_worker.get_many([])
+        other_worker.put_many([cached])
+        version = current_answer_key_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            keyed_question(2)
+            save_question(build_question(generated_questions([('autism', 'easy', 'Streamed')])[0], 'autism'))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(current_answer_key_version(), version)
+        self.assertEqual(list(other_worker.get_many([question_id])[0]), [question_id])
+
+        cached.correct_answer = 'B) second 1'
+        with self.captureOnCommitCallbacks(execute=True):
+            cached.save()
+        self.assertNotEqual(current_answer_key_version(), version)
+        self.assertEqual(other_worker.get_many([question_id]), ({}, [question_id]))
+
+    def test_bulk_update_invalidates_explicitly(self):
+        question = keyed_question(1)
+        question_id = str(question.question_id)
+        self.assertEqual(load_questions([question_id])[question_id].correct_answer, 'A) first 1')
+
+        AssessmentQuestion.objects.filter(pk=question.pk).update(correct_answer='B) second 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_answer_keys([question_id])
+
+        self.assertEqual(load_questions([question_id])[question_id].correct_answer, 'B) second 1')
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = AnswerKeyCache(ttl=300)
+        question = keyed_question(1)
+        with mock.patch('quiz_generator.answer_key_cache.time.monotonic', return_value=1000):
+            cache.put_many([question])
+        with mock.patch('quiz_generator.answer_key_cache.time.monotonic', return_value=1299):
+            self.assertEqual(len(cache.get_many([str(question.question_id)])[0]), 1)
+        with mock.patch('quiz_generator.answer_key_cache.time.monotonic', return_value=1300):
+            self.assertEqual(cache.get_many([str(question.question_id)])[1], [str(question.question_id)])
+
+
+class IdempotentSubmitTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.question = keyed_question(1)
+
+    def submit(self, key='retry-1', letter='A'):
+        request = APIRequestFactory().post('/api/quiz/submit/', {
+            'answers': [answer(self.question, letter)], 'total_questions': 1
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, user=self.user)
+        return views.submit_assessment_view(request)
+
+    def test_retry_replays_the_original_response(self):
+        first = self.submit()
+        retry = self.submit(letter='B')
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(AssessmentSession.objects.count(), 1)
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(self.submit(key='retry-2').data['correct_answers'], 1)
+        self.assertEqual(AssessmentSession.objects.count(), 2)
+
+    def test_quiz_session_id_is_the_default_key(self):
+        quiz = QuizSession.objects.create(
+            user=self.user, assessment_type='dyslexia', question_ids=[str(self.question.question_id)]
+        )
+        data = {'session_id': str(quiz.session_id), 'answers': [{'position': 0, 'selected_answer': 'A'}]}
+        first = post(views.submit_assessment_view, '/api/quiz/submit/', data, self.user)
+        retry = post(views.submit_assessment_view, '/api/quiz/submit/', data, self.user)
+
+        self.assertEqual(first.data['correct_answers'], 1)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(AssessmentSession.objects.count(), 1)
+
+    def test_concurrent_duplicate_returns_the_saved_response(self):
+        saved = self.submit()
+        # The duplicate passed the replay check before the first submission committed
+        with mock.patch.object(views, 'find_replay', side_effect=[None, saved.data]):
+            retry = self.submit()
+
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, saved.data)
+
+    def test_integrity_error_without_replay_is_a_json_error(self):
+        with mock.patch.object(views, 'find_replay', return_value=None), \
+                mock.patch.object(AssessmentSession, 'save', side_effect=IntegrityError('constraint failed')):
+            response = self.submit()
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data, {'error': 'Failed to save assessment results: constraint failed'})
+
+
+@override_settings(QUESTION_BANK_ENABLED=False)
+class ServerGradedSubmitTests(FakeGeneratorMixin, TestCase):
+    def setUp(self):
+        self.user = make_user()
+        closed_breaker(self)
+        self.use_backend(FakeBackend())
+
+    def generate(self, **data):
+        response = post(views.generate_quiz_view, '/api/quiz/generate/', data, self.user)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def correct_letter(self, question):
+        return 'ABCD'[question['options'].index(question['correct_answer'])]
+
+    def test_generated_quiz_is_stored_under_its_session_id(self):
+        quiz = self.generate(assessment_type='dyslexia', age=10, grade='5')
+        stored = QuizSession.objects.get(session_id=quiz['session_id'])
+
+        self.assertEqual(stored.user, self.user)
+        self.assertEqual(stored.assessment_type, 'dyslexia')
+        self.assertEqual(stored.question_ids, [question['question_id'] for question in quiz['questions']])
+        self.assertEqual(stored.difficulty_distribution, quiz['difficulty_distribution'])
+        self.assertEqual(stored.pre_assessment_data['age'], 10)
+
+    def test_positions_are_graded_against_the_stored_quiz(self):
+        quiz = self.generate(assessment_type='dyslexia', age=10, grade='5')
+        answers = [{'position': position, 'selected_answer': self.correct_letter(question)}
+                   for position, question in enumerate(quiz['questions'][:5])]
+        # The client's counts and type are ignored; unanswered questions count as wrong
+        response = post(views.submit_assessment_view, '/api/quiz/submit/', {
+            'session_id': quiz['session_id'], 'answers': answers, 'assessment_type': 'autism', 'total_questions': 5
+        }, self.user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assessment_type'], 'dyslexia')
+        self.assertEqual(response.data['total_questions'], 10)
+        self.assertEqual(response.data['correct_answers'], 5)
+        self.assertEqual(response.data['accuracy'], 50)
+        session = AssessmentSession.objects.get(session_id=response.data['session_id'])
+        self.assertEqual(session.student_age, 10)
+        self.assertEqual(session.student_grade, '5')
+
+    def test_questions_outside_the_quiz_are_not_graded(self):
+        quiz = self.generate(assessment_type='dyslexia', age=10)
+        outsider = keyed_question('outside')
+        response = post(views.submit_assessment_view, '/api/quiz/submit/', {
+            'session_id': quiz['session_id'],
+            'answers': [answer(outsider, 'A'), {'position': 99, 'selected_answer': 'A'}]
+        }, self.user)
+
+        self.assertEqual(response.data['correct_answers'], 0)
+        self.assertEqual(response.data['total_questions'], 10)
+
+    def test_another_users_quiz_is_not_used(self):
+        quiz = self.generate(assessment_type='dyslexia', age=10)
+        other = make_user('other@example.com')
+        response = post(views.submit_assessment_view, '/api/quiz/submit/', {
+            'session_id': quiz['session_id'], 'answers': [{'position': 0, 'selected_answer': 'A'}]
+        }, other)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CompactAnswersTests(TestCase):
+    question_ids = ['q0', 'q1', 'q2', 'q3']
+
+    def decode(self, **compact):
+        return decode_compact_answers(dict({'question_ids': self.question_ids}, **compact))
+
+    def test_letters_expand_in_quiz_order_skipping_unanswered(self):
+        answers, timings = self.decode(answers='AC-B', response_times=[5.2, 3.1, 0, 4])
+
+        self.assertEqual(answers, [
+            {'question_id': 'q0', 'selected_answer': 'A', 'response_time': 5.2},
+            {'question_id': 'q1', 'selected_answer': 'C', 'response_time': 3.1},
+            {'question_id': 'q3', 'selected_answer': 'B', 'response_time': 4.0},
+        ])
+        self.assertEqual(timings, [])
+
+    def test_timings_need_start_and_end_times(self):
+        _, timings = self.decode(answers='AB', start_times=[0, 5000], end_times=[5000, 9000])
+        self.assertEqual(timings[1], {'question_id': 'q1', 'start_time': 5000, 'end_time': 9000, 'response_time': 0})
+        self.assertEqual(self.decode(answers='AB', start_times=[0, 5000])[1], [])
+
+    def test_stored_quiz_supplies_the_question_order(self):
+        quiz = QuizSession(question_ids=['x', 'y'])
+        self.assertEqual(decode_compact_answers({'answers': '-D'}, quiz)[0][0]['question_id'], 'y')
+
+    def test_malformed_submissions_are_rejected(self):
+        for compact, message in [
+            ({'answers': 'AB'}, 'question_ids are required'),
+            ({'question_ids': ['q0'], 'answers': 'AB'}, 'at most 1 letters'),
+            ({'question_ids': ['q0', 'q1'], 'answers': 'AE'}, "invalid answer 'E' at position 1"),
+            ({'question_ids': ['q0', 'q1'], 'answers': 'AB', 'response_times': [1]}, 'one value per answer'),
+            ({'question_ids': ['q0'], 'answers': 'A', 'start_times': ['soon']}, 'must contain numbers'),
+        ]:
+            with self.subTest(compact=compact), self.assertRaisesMessage(ValueError, message):
+                decode_compact_answers(compact)
+        with self.assertRaisesMessage(ValueError, 'must be an object'):
+            decode_compact_answers('AB')
+
+    def test_submit_view_saves_compact_answers_and_timings(self):
+        user = make_user()
+        questions = [keyed_question(number) for number in range(3)]
+        response = post(views.submit_assessment_view, '/api/quiz/submit/', {'compact': {
+            'question_ids': [str(question.question_id) for question in questions],
+            'answers': 'AB-', 'response_times': [2.5, 3.0, 0],
+            'start_times': [0, 2500, 5500], 'end_times': [2500, 5500, 5500],
+        }}, user)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['correct_answers'], 1)
+        self.assertEqual(response.data['total_questions'], 2)
+        session = AssessmentSession.objects.get(session_id=response.data['session_id'])
+        self.assertEqual(session.responses.count(), 2)
+        self.assertEqual(sorted(session.question_timings.values_list('end_time', flat=True)), [2500, 5500])
+
+    def test_submit_view_reports_invalid_compact_answers(self):
+        response = post(views.submit_assessment_view, '/api/quiz/submit/',
+                        {'compact': {'answers': 'A'}}, make_user())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid compact answers')
+
+
+class PredictionTaskTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.session = AssessmentSession.objects.create(
+            user=self.user, assessment_type='dyslexia', total_questions=1, correct_answers=1, accuracy_percentage=100
+        )
+        for target in ('close_old_connections', '_prediction_function'):
+            patcher = mock.patch.object(prediction_tasks, target)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.predict = self._prediction_function.return_value
+
+    def enqueue(self, kind='dyslexia', **fields):
+        with mock.patch.object(prediction_tasks, 'dispatch_task'):
+            task = prediction_tasks.enqueue_prediction(self.session, kind)
+        PredictionTask.objects.filter(pk=task.pk).update(**fields)
+        return task
+
+    def test_submission_queues_its_prediction_after_commit(self):
+        question = keyed_question(1)
+        with mock.patch.object(prediction_tasks, 'dispatch_task') as dispatch, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = post(views.submit_assessment_view, '/api/quiz/submit/', {
+                'answers': [answer(question, 'A')], 'total_questions': 1, 'assessment_type': 'autism'
+            }, self.user)
+            dispatch.assert_not_called()
+
+        task = PredictionTask.objects.get(session__session_id=response.data['session_id'])
+        self.assertEqual((task.kind, task.status), ('autism', 'pending'))
+        dispatch.assert_called_once_with(task.pk)
+
+    def test_successful_task_completes(self):
+        task = self.enqueue()
+        self.assertIsNone(prediction_tasks.run_prediction_task(task.pk))
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('completed', 1))
+        self.assertIsNotNone(task.completed_at)
+        self.predict.assert_called_once_with(self.session.pk)
+        self._prediction_function.assert_called_once_with('dyslexia')
+
+    @override_settings(QUIZ_PREDICTION_RETRY_DELAY=5)
+    def test_failed_attempts_back_off_then_fail(self):
+        self.predict.side_effect = RuntimeError('model missing')
+        task = self.enqueue(max_attempts=3)
+
+        self.assertEqual(prediction_tasks.run_prediction_task(task.pk), 5)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error), ('pending', 'model missing'))
+        self.assertGreater(task.run_after, timezone.now())
+        # Not due yet
+        self.assertIsNone(prediction_tasks.run_prediction_task(task.pk))
+        self.assertEqual(self.predict.call_count, 1)
+
+        PredictionTask.objects.filter(pk=task.pk).update(run_after=timezone.now())
+        self.assertEqual(prediction_tasks.run_prediction_task(task.pk), 10)
+        PredictionTask.objects.filter(pk=task.pk).update(run_after=timezone.now())
+        self.assertIsNone(prediction_tasks.run_prediction_task(task.pk))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 3))
+
+    @override_settings(QUIZ_PREDICTION_TASK_TIMEOUT=300)
+    def test_stale_running_tasks_are_requeued_or_failed(self):
+        long_ago = timezone.now() - timedelta(seconds=600)
+        requeued = self.enqueue(status='running', started_at=long_ago, attempts=1, max_attempts=3)
+        exhausted = self.enqueue(status='running', started_at=long_ago, attempts=3, max_attempts=3)
+        running = self.enqueue(status='running', started_at=timezone.now(), attempts=1)
+
+        self.assertEqual(prediction_tasks.requeue_stale_tasks(), 2)
+        statuses = dict(PredictionTask.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {requeued.pk: 'pending', exhausted.pk: 'failed', running.pk: 'running'})
+
+    @override_settings(QUIZ_PREDICTION_EXECUTOR='worker')
+    def test_worker_command_runs_due_tasks(self):
+        self.assertIsNone(prediction_tasks.get_prediction_executor())
+        due = self.enqueue()
+        later = self.enqueue(run_after=timezone.now() + timedelta(hours=1))
+        output = io.StringIO()
+        with mock.patch('quiz_generator.management.commands.run_prediction_worker.get_model_registry'):
+            call_command('run_prediction_worker', once=True, stdout=output)
+
+        self.assertIn('Processed 1 prediction tasks', output.getvalue())
+        self.assertEqual(PredictionTask.objects.get(pk=due.pk).status, 'completed')
+        self.assertEqual(PredictionTask.objects.get(pk=later.pk).status, 'pending')
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'model.joblib')
+        with open(self.path, 'wb') as artifact:
+            artifact.write(b'model')
+        self.loads = []
+
+    def loader(self, path):
+        self.loads.append(path)
+        time.sleep(0.01)
+        return {'path': path}
+
+    def test_artifact_loads_once_on_first_use_and_is_shared(self):
+        registry = ModelRegistry()
+        registry.register('dyslexia_model', self.path, loader=self.loader)
+        registry.register('autism_model', self.path, loader=self.loader)
+        self.assertEqual(self.loads, [])
+
+        results = []
+        for thread in run_in_threads(4, lambda index: results.append(registry.get('dyslexia_model'))):
+            thread.join()
+        self.assertIs(registry.get('autism_model'), results[0])
+        self.assertEqual(self.loads, [os.path.abspath(self.path)])
+
+        stats = registry.stats()
+        self.assertTrue(stats['dyslexia_model']['loaded'])
+        self.assertEqual(stats['dyslexia_model']['shared_with'], ['autism_model'])
+        self.assertEqual(stats['autism_model']['file_bytes'], 5)
+
+    def test_failed_load_is_remembered(self):
+        def broken(path):
+            self.loads.append(path)
+            raise OSError('truncated file')
+
+        registry = ModelRegistry()
+        registry.register('dyslexia_model', self.path, loader=broken)
+        self.assertIsNone(registry.get('dyslexia_model'))
+        self.assertIsNone(registry.get('dyslexia_model'))
+
+        self.assertEqual(len(self.loads), 1)
+        stats = registry.stats()['dyslexia_model']
+        self.assertFalse(stats['loaded'])
+        self.assertEqual(stats['error'], 'truncated file')
+
+    def test_warm_up_loads_every_registered_artifact(self):
+        registry = ModelRegistry()
+        registry.register('dyslexia_model', self.path, loader=self.loader)
+        registry.register('never_loaded', self.path + '.missing', loader=self.loader)
+        self.assertNotIn('load_seconds', registry.stats()['dyslexia_model'])
+
+        stats = registry.warm_up(['dyslexia_model'])
+        self.assertTrue(stats['dyslexia_model']['loaded'])
+        self.assertFalse(stats['never_loaded']['loaded'])
+        self.assertEqual(len(registry.warm_up()), 2)
+        self.assertEqual(len(self.loads), 2)
+
+    def test_process_registry_holds_the_predictor_artifacts(self):
+        self.assertIs(get_model_registry(), get_model_registry())
+        self.assertEqual(set(get_model_registry().stats()),
+                         {'dyslexia_model', 'autism_model', 'difficulty_encoder'})
+
+
+class InferenceFastPathTests(TestCase):
+    model_path = os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.trees.joblib')
+    encoder_path = os.path.join(settings.BASE_DIR, 'difficulty_encoder.categories.joblib')
+
+    def responses(self, count, offset=0):
+        return [
+            {'difficulty_level': ('easy', 'moderate', 'hard')[(index + offset) % 3],
+             'response_time': 2.5 + 3 * ((index * 7 + offset) % 11), 'is_correct': (index + offset) % 3 != 1}
+            for index in range(count)
+        ]
+
+    def test_exported_artifacts_load_without_pandas_sklearn_or_xgboost(self):
+        script = (
+            'import sys\n'
+            'from quiz_generator.inference import difficulty_codes, feature_matrix, predict_levels\n'
+            'from quiz_generator.model_registry import load_model_artifact\n'
+            f'model = load_model_artifact({self.model_path!r})\n'
+            f'codes = difficulty_codes(load_model_artifact({self.encoder_path!r}))\n'
+            "predict_levels(model, feature_matrix([{'difficulty_level': 'hard', 'response_time': 3.0, "
+            "'is_correct': True}], codes))\n"
+            "print(sorted(name for name in ('pandas', 'sklearn', 'xgboost') if name in sys.modules))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_exported_categories_give_the_encoder_codes(self):
+        encoder = load_joblib(os.path.join(settings.BASE_DIR, 'difficulty_encoder.joblib'))
+        categories = load_model_artifact(self.encoder_path)
+
+        self.assertIsInstance(categories, DifficultyCategories)
+        self.assertEqual(difficulty_codes(categories), difficulty_codes(encoder))
+        self.assertEqual(difficulty_codes(categories), {'easy': 0.0, 'moderate': 1.0, 'hard': 2.0})
+        with self.assertRaises(KeyError):
+            feature_matrix([{'difficulty_level': 'extreme', 'response_time': 1, 'is_correct': True}],
+                           difficulty_codes(categories))
+
+    def test_predictions_match_the_pickled_model(self):
+        xgboost_model = load_joblib(os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib'))
+        model = load_model_artifact(self.model_path)
+        codes = difficulty_codes(load_model_artifact(self.encoder_path))
+        features = feature_matrix(self.responses(30), codes)
+
+        labels, confidence = predict_levels(model, features)
+        self.assertEqual(labels, [LEVEL_LABELS[int(level)] for level in xgboost_model.predict(features)])
+        self.assertAlmostEqual(confidence, float(xgboost_model.predict_proba(features).max(axis=1).mean()), places=5)
+
+    def test_batched_sessions_match_single_session_predictions(self):
+        model = load_model_artifact(self.model_path)
+        encoder = load_model_artifact(self.encoder_path)
+        sessions = [self.responses(12, offset) for offset in range(5)] + [[]]
+
+        results = session_results(model, encoder, sessions)
+        for responses, result in zip(sessions[:-1], results):
+            labels, confidence = predict_levels(model, feature_matrix(responses, difficulty_codes(encoder)))
+            self.assertEqual(result['confidence_scores'], labels)
+            self.assertEqual(result['predicted_level'], Counter(labels).most_common(1)[0][0])
+            self.assertAlmostEqual(result['confidence'], confidence, places=6)
+        self.assertEqual(results[-1], {'predicted_level': 'no', 'confidence': 0.0, 'confidence_scores': [],
+                                       'question_count': 0})
+
+    def test_successful_load_is_not_printed(self):
+        registry = ModelRegistry()
+        registry.register('dyslexia_model', self.model_path, loader=load_model_artifact)
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertIsNotNone(registry.get('dyslexia_model'))
+        self.assertEqual(stdout.getvalue(), '')
+
+
+class ClassroomRescoreTests(TestCase):
+    def setUp(self):
+        self.teacher = make_user('teacher@example.com', 'teacher')
+        TeacherProfile.objects.create(user=self.teacher, employee_id='EMP000001')
+        self.classroom = Classroom.objects.create(name='Year 5', teacher=self.teacher.teacher_profile)
+        self.questions = {
+            condition: [keyed_question(f'{condition}-{number}', condition, difficulty)
+                        for number, difficulty in enumerate(['easy', 'moderate', 'hard'] * 2)]
+            for condition in ('dyslexia', 'autism')
+        }
+        self.sessions = [self.assessed_student(index) for index in range(3)]
+
+    def assessed_student(self, index):
+        user = make_user(f'student{index}@example.com')
+        profile = StudentProfile.objects.create(user=user, student_id=f'STU{user.id:06d}')
+        ClassroomMembership.objects.create(classroom=self.classroom, student=profile)
+        # An older session, which rescoring must skip
+        AssessmentSession.objects.create(user=user, assessment_type='autism', total_questions=0,
+                                         correct_answers=0, accuracy_percentage=0)
+        session = AssessmentSession.objects.create(user=user, assessment_type='both', total_questions=12,
+                                                   correct_answers=0, accuracy_percentage=0)
+        for condition, questions in self.questions.items():
+            for number, question in enumerate(questions):
+                AssessmentResponse.objects.create(session=session, question=question, user_answer='A',
+                                                  is_correct=(number + index) % 2 == 0,
+                                                  response_time=3.0 + 4 * index + number)
+        return session
+
+    def rescore(self, user=None, **data):
+        request = APIRequestFactory().post(f'/api/classrooms/{self.classroom.id}/rescore/', data, format='json')
+        force_authenticate(request, user=user or self.teacher)
+        return classroom_views.rescore_classroom(request, classroom_id=self.classroom.id)
+
+    def test_latest_session_of_each_student_is_scored(self):
+        sessions = latest_assessment_sessions([session.user_id for session in self.sessions])
+        self.assertEqual(sorted(session.pk for session in sessions), sorted(session.pk for session in self.sessions))
+
+    def test_batched_predictions_match_single_session_predictions(self):
+        results = predict_sessions(self.sessions)
+        responses = load_session_responses(self.sessions)
+        for session in self.sessions:
+            with mock.patch('sys.stdout', new_callable=io.StringIO):
+                expected = {
+                    'dyslexia': dyslexia_predictor.predictor.predict_dyslexia_level(responses[session.pk]['dyslexia']),
+                    'autism': autism_predictor.autism_predictor.predict_autism_level(responses[session.pk]['autism']),
+                }
+            for condition in ('dyslexia', 'autism'):
+                self.assertEqual(results[session.pk][condition]['predicted_level'], expected[condition]['predicted_level'])
+                self.assertAlmostEqual(results[session.pk][condition]['confidence'], expected[condition]['confidence'],
+                                       places=6)
+
+    def test_rescore_updates_profiles_unless_dry_run(self):
+        for value in (True, 'true', '1'):
+            with self.subTest(dry_run=value):
+                response = self.rescore(dry_run=value)
+                self.assertEqual(response.status_code, 200)
+                self.assertIs(response.data['dry_run'], True)
+                self.assertEqual(response.data['sessions_scored'], 3)
+                self.assertFalse(StudentProfile.objects.filter(dyslexia_prediction_level__isnull=False).exists())
+
+        response = self.rescore(dry_run='false')
+        self.assertIs(response.data['dry_run'], False)
+        results = {result['session_id']: result for result in response.data['results']}
+        for profile in StudentProfile.objects.all():
+            session = next(session for session in self.sessions if session.user_id == profile.user_id)
+            result = results[str(session.session_id)]
+            self.assertEqual(profile.dyslexia_prediction_level, result['dyslexia']['predicted_level'])
+            self.assertEqual(profile.autism_prediction_level, result['autism']['predicted_level'])
+
+    def test_rescore_rejects_invalid_dry_run_and_non_teachers(self):
+        response = self.rescore(dry_run='maybe')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('dry_run', response.data)
+        self.assertEqual(self.rescore(user=make_user('student@example.com')).status_code, 403)
+
+
+class MemoryMappedArtifactTests(TestCase):
+    model_path = os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_exported_arrays_are_read_only_memory_maps(self):
+        path = save_tree_ensemble(load_joblib(self.model_path), os.path.join(self.directory, 'model.trees.joblib'))
+        model = load_model_artifact(path, mmap_mode='r')
+
+        self.assertIsInstance(model, TreeEnsembleClassifier)
+        for name in ('feature', 'threshold', 'left', 'right', 'value'):
+            self.assertIsInstance(model.arrays[name], np.memmap)
+            self.assertFalse(model.arrays[name].flags.writeable)
+        features = sample_feature_rows(500)
+        np.testing.assert_array_equal(model.predict_proba(features),
+                                      load_model_artifact(path, mmap_mode=None).predict_proba(features))
+
+    def test_pickled_model_is_converted_in_memory(self):
+        self.assertIsInstance(load_model_artifact(self.model_path, convert_xgboost=True), TreeEnsembleClassifier)
+        self.assertTrue(hasattr(load_model_artifact(self.model_path), 'get_booster'))
+
+    def test_export_command_writes_a_matching_artifact(self):
+        output = io.StringIO()
+        trees_path = os.path.join(self.directory, 'model.trees.joblib')
+        encoder_path = os.path.join(self.directory, 'encoder.categories.joblib')
+        call_command('export_model_arrays', model=self.model_path, output=trees_path, check_rows=500,
+                     encoder_output=encoder_path, stdout=output)
+
+        self.assertIn('Exported 400 trees', output.getvalue())
+        self.assertIsInstance(load_model_artifact(trees_path), TreeEnsembleClassifier)
+        self.assertEqual(difficulty_codes(load_model_artifact(encoder_path)), {'easy': 0.0, 'moderate': 1.0, 'hard': 2.0})
+
+    def test_export_command_refuses_to_overwrite_the_model(self):
+        with self.assertRaisesMessage(CommandError, 'must differ from the model path'):
+            call_command('export_model_arrays', model=self.model_path, output=self.model_path, stdout=io.StringIO())
+
+
+class TreeEvaluatorEquivalenceTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = load_joblib(os.path.join(settings.BASE_DIR, 'dyslexia_level_predictor.joblib'))
+        cls.arrays = export_tree_arrays(cls.model)
+
+    def features(self):
+        features = sample_feature_rows(5000, seed=7)
+        # Rows exactly on every split threshold, where < versus <= matters
+        thresholds = split_thresholds(self.arrays)
+        on_threshold = np.repeat(features[:1], sum(len(values) for values in thresholds), axis=0)
+        row = 0
+        for feature, values in enumerate(thresholds):
+            on_threshold[row:row + len(values), feature] = values
+            row += len(values)
+        return np.concatenate([features, on_threshold])
+
+    def assert_matches_xgboost(self, evaluator, features):
+        np.testing.assert_allclose(evaluator.predict_proba(features), self.model.predict_proba(features), atol=1e-5)
+        np.testing.assert_array_equal(evaluator.predict(features), self.model.predict(features))
+
+    def test_grid_and_walk_match_xgboost(self):
+        features = self.features()
+        grid = TreeEnsembleClassifier(self.arrays)
+        walk = TreeEnsembleClassifier(self.arrays, compile=False)
+        self.assertEqual((grid.evaluator, walk.evaluator), ('grid', 'walk'))
+        self.assert_matches_xgboost(grid, features)
+        self.assert_matches_xgboost(walk, features)
+
+    def test_missing_values_follow_the_default_direction(self):
+        features = self.features()[:300].copy()
+        features[np.arange(300), np.arange(300) % 3] = np.nan
+        self.assert_matches_xgboost(TreeEnsembleClassifier(self.arrays), features)
+
+    def test_exported_grid_is_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = save_tree_ensemble(self.model, os.path.join(directory, 'model.trees.joblib'))
+            evaluator = load_model_artifact(path, mmap_mode='r')
+            self.assertEqual(evaluator.evaluator, 'grid')
+            self.assertIsInstance(evaluator.grid['margins'], np.memmap)
+            self.assertIsInstance(evaluator.grid['probabilities'], np.memmap)
+            self.assert_matches_xgboost(evaluator, self.features())
+
+    def test_ensembles_too_large_to_tabulate_walk_the_trees(self):
+        without_grid = export_tree_arrays(self.model, grid=False)
+        self.assertNotIn('grid_margins', without_grid)
+        # Built on the heap when the export carries no grid
+        self.assertEqual(TreeEnsembleClassifier(without_grid).evaluator, 'grid')
+        with mock.patch('quiz_generator.tree_ensemble.MAX_GRID_CELLS', 10):
+            self.assertNotIn('grid_margins', export_tree_arrays(self.model))
+            evaluator = TreeEnsembleClassifier(without_grid)
+        self.assertEqual(evaluator.evaluator, 'walk')
+        self.assert_matches_xgboost(evaluator, self.features()[:500])
+
+    def test_benchmark_command_reports_equivalence(self):
+        output = io.StringIO()
+        with mock.patch('sys.stdout', new_callable=io.StringIO):
+            call_command('benchmark_tree_evaluator', rows=500, batch_sizes='1,10', repeats=2, stdout=output)
+        self.assertEqual(output.getvalue().count('OK'), 2)
@@ -0,0 +1,244 @@
+# quiz_generator/tree_ensemble.py
+import json
+
+import numpy as np
+
+# Marks a joblib artifact holding an exported tree ensemble rather than a pickled model
+TREE_ENSEMBLE_FORMAT = 'neurobridge.tree_ensemble'
+TREE_ENSEMBLE_VERSION = 1
+
+# Largest threshold grid TreeEnsembleClassifier tabulates; bigger ensembles walk the trees
+MAX_GRID_CELLS = 1 << 20
+
+
+def export_tree_arrays(model, grid=True):
+    """
+    Flatten a trained multi-class XGBoost classifier into plain NumPy arrays.
+
+    The nodes of every tree are concatenated into flat per-node arrays, with the trees
+    ordered by the class they score. Leaves point to themselves, so a walk of max_depth
+    steps ends on every row's leaf whatever its depth.
+
+    Args:
+        model: Fitted XGBClassifier with a gbtree booster and a multi:softmax or
+               multi:softprob objective.
+        grid (bool): Also tabulate the threshold grid (see TreeEnsembleClassifier), so
+                     processes loading the export share it instead of each building it.
+
+    Returns:
+        dict: The arrays and metadata TreeEnsembleClassifier is built from.
+
+    Raises:
+        ValueError: For a booster or split type the evaluator does not support.
+    """
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    if objective not in ('multi:softmax', 'multi:softprob'):
+        raise ValueError(f"Unsupported objective '{objective}'")
+    gradient_booster = learner['gradient_booster']
+    if gradient_booster['name'] != 'gbtree':
+        raise ValueError(f"Unsupported booster '{gradient_booster['name']}'")
+
+    n_classes = int(learner['learner_model_param']['num_class'])
+    base_score = np.broadcast_to(
+        np.asarray(json.loads(learner['learner_model_param']['base_score']), dtype=np.float32), (n_classes,)
+    )
+    trees = gradient_booster['model']['trees']
+    tree_info = gradient_booster['model']['tree_info']
+    n_trees = len(trees)
+    try:
+        # Early-stopped models predict with the trees up to their best iteration only
+        n_trees = gradient_booster['model']['iteration_indptr'][model.best_iteration + 1]
+    except AttributeError:
+        pass
+
+    order = sorted(range(n_trees), key=lambda tree: tree_info[tree])
+    feature, threshold, left, right, default_left, value, roots, depths = [], [], [], [], [], [], [], []
+    for tree_index in order:
+        tree = trees[tree_index]
+        if any(tree['split_type']) or int(tree['tree_param']['size_leaf_vector']) > 1:
+            raise ValueError('Categorical splits and vector leaves are not supported')
+        offset = len(feature)
+        roots.append(offset)
+        node_depth = [0] * len(tree['left_children'])
+        for node, (left_child, right_child) in enumerate(zip(tree['left_children'], tree['right_children'])):
+            is_leaf = left_child == -1
+            feature.append(0 if is_leaf else tree['split_indices'][node])
+            threshold.append(0.0 if is_leaf else tree['split_conditions'][node])
+            left.append(offset + (node if is_leaf else left_child))
+            right.append(offset + (node if is_leaf else right_child))
+            default_left.append(bool(tree['default_left'][node]))
+            # A leaf's weight is stored in its split condition
+            value.append(tree['split_conditions'][node] if is_leaf else 0.0)
+            if not is_leaf:
+                node_depth[left_child] = node_depth[right_child] = node_depth[node] + 1
+        depths.append(max(node_depth))
+
+    tree_class = np.asarray([tree_info[tree] for tree in order], dtype=np.int32)
+    if len(np.unique(tree_class)) != n_classes:
+        raise ValueError('Every class needs at least one tree')
+    arrays = {
+        'format': TREE_ENSEMBLE_FORMAT,
+        'version': TREE_ENSEMBLE_VERSION,
+        'objective': objective,
+        'n_features': int(learner['learner_model_param']['num_feature']),
+        'max_depth': max(depths, default=0),
+        'classes': np.asarray(model.classes_),
+        'base_score': np.ascontiguousarray(base_score),
+        'roots': np.asarray(roots, dtype=np.intp),
+        # First tree of each class in the class-ordered tree list
+        'class_offsets': np.searchsorted(tree_class, np.arange(n_classes)).astype(np.int32),
+        'feature': np.asarray(feature, dtype=np.intp),
+        'threshold': np.asarray(threshold, dtype=np.float32),
+        'left': np.asarray(left, dtype=np.intp),
+        'right': np.asarray(right, dtype=np.intp),
+        'default_left': np.asarray(default_left, dtype=np.bool_),
+        'value': np.asarray(value, dtype=np.float32),
+    }
+    if grid:
+        tabulated = TreeEnsembleClassifier(arrays).grid
+        if tabulated is not None:
+            arrays.update({
+                'grid_thresholds': tabulated['thresholds'],
+                'grid_margins': tabulated['margins'],
+                'grid_probabilities': tabulated['probabilities'],
+            })
+    return arrays
+
+
+def save_tree_ensemble(model, path):
+    """
+    Export a model's trees (see export_tree_arrays) to an uncompressed joblib file,
+    which joblib.load(path, mmap_mode='r') maps instead of reading into memory.
+    """
+    import joblib
+    joblib.dump(export_tree_arrays(model), path)
+    return path
+
+
+def is_tree_ensemble(artifact):
+    """True for a loaded artifact produced by save_tree_ensemble."""
+    return isinstance(artifact, dict) and artifact.get('format') == TREE_ENSEMBLE_FORMAT
+
+
+def split_thresholds(arrays):
+    """Sorted distinct split thresholds of each feature, as float32 arrays."""
+    is_split = arrays['left'] != np.arange(len(arrays['left']))
+    return [
+        np.unique(arrays['threshold'][is_split & (arrays['feature'] == feature)])
+        for feature in range(arrays['n_features'])
+    ]
+
+
+def softmax(margins):
+    exp = np.exp(margins - margins.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TreeEnsembleClassifier:
+    """
+    Predicts from exported tree arrays with NumPy only, mirroring the XGBClassifier
+    methods the predictors use (predict_proba, predict, classes_).
+
+    The arrays can be read-only memory maps: the evaluator never writes to them, so
+    processes loading the same file share its pages through the OS page cache.
+
+    With compile=True (and few enough split thresholds, as with the three-feature level
+    model) the ensemble is also tabulated over its threshold grid, and predictions become
+    a lookup per row instead of a walk down every tree. Exports made by
+    export_model_arrays carry the grid, which is then memory-mapped like the trees;
+    otherwise each process builds its own copy on the heap, of cells x classes x 8 bytes
+    (5 KB for the level model's 156 cells, at most 32 MB for four classes).
+    """
+
+    def __init__(self, arrays, compile=True):
+        if arrays.get('version') != TREE_ENSEMBLE_VERSION:
+            raise ValueError(f"Unsupported tree ensemble version {arrays.get('version')}")
+        self.arrays = arrays
+        self.classes_ = np.asarray(arrays['classes'])
+        self.n_features_in_ = arrays['n_features']
+        self.max_depth = arrays['max_depth']
+        if not compile:
+            self.grid = None
+        elif 'grid_margins' in arrays:
+            self.grid = {
+                'thresholds': arrays['grid_thresholds'],
+                'shape': tuple(len(feature_thresholds) + 1 for feature_thresholds in arrays['grid_thresholds']),
+                'margins': arrays['grid_margins'],
+                'probabilities': arrays['grid_probabilities'],
+            }
+        else:
+            self.grid = self._compile()
+
+    @property
+    def evaluator(self):
+        """'grid' when predictions are table lookups, otherwise 'walk'."""
+        return 'grid' if self.grid is not None else 'walk'
+
+    def _compile(self):
+        """
+        Tabulate margins and probabilities for every cell of the threshold grid.
+
+        A split only compares its feature against its threshold, so all inputs between
+        the same consecutive thresholds of each feature take the same path through every
+        tree. Walking the trees once for one point per cell therefore gives the exact
+        result for any input in that cell.
+        """
+        thresholds = split_thresholds(self.arrays)
+        shape = tuple(len(feature_thresholds) + 1 for feature_thresholds in thresholds)
+        if np.prod(shape) > MAX_GRID_CELLS:
+            return None
+        # Cell 0 holds the values below a feature's first threshold, cell k those from threshold k-1 on
+        representatives = [np.concatenate(([-np.inf], feature_thresholds)) for feature_thresholds in thresholds]
+        points = np.stack(np.meshgrid(*representatives, indexing='ij'), axis=-1).reshape(-1, self.n_features_in_)
+        margins = self._walk_margin(np.ascontiguousarray(points, dtype=np.float32))
+        return {'thresholds': thresholds, 'shape': shape, 'margins': margins, 'probabilities': softmax(margins)}
+
+    def _grid_cells(self, features):
+        cells = [
+            np.searchsorted(feature_thresholds, features[:, feature], side='right')
+            for feature, feature_thresholds in enumerate(self.grid['thresholds'])
+        ]
+        return np.ravel_multi_index(cells, self.grid['shape'])
+
+    def _prepare(self, features):
+        features = np.ascontiguousarray(features, dtype=np.float32).reshape(-1, self.n_features_in_)
+        # Missing values follow each split's default direction, which the grid does not encode
+        return features, self.grid is not None and not np.isnan(features).any()
+
+    def predict_margin(self, features):
+        """Raw per-class scores: base_score plus the sum of each class's tree leaves."""
+        features, use_grid = self._prepare(features)
+        if use_grid:
+            return self.grid['margins'][self._grid_cells(features)]
+        return self._walk_margin(features)
+
+    def _walk_margin(self, features):
+        """Margins by walking all trees, depth-synchronously, for a float32 (n_rows, n_features) array."""
+        arrays = self.arrays
+        has_missing = np.isnan(features).any()
+        flat_features = features.ravel()
+        row_offsets = np.arange(len(features), dtype=np.intp)[:, None] * self.n_features_in_
+
+        # Walk every (row, tree) pair one level per step; rows that reach a leaf early stay on it
+        node = np.tile(arrays['roots'], (len(features), 1))
+        for _ in range(self.max_depth):
+            split_values = np.take(flat_features, row_offsets + np.take(arrays['feature'], node))
+            go_left = split_values < np.take(arrays['threshold'], node)
+            if has_missing:
+                go_left = np.where(np.isnan(split_values), np.take(arrays['default_left'], node), go_left)
+            node = np.where(go_left, np.take(arrays['left'], node), np.take(arrays['right'], node))
+
+        margins = np.add.reduceat(np.take(arrays['value'], node), arrays['class_offsets'], axis=1, dtype=np.float32)
+        return margins + arrays['base_score']
+
+    def predict_proba(self, features):
+        """Class probabilities (softmax of the margins), shaped (n_rows, n_classes)."""
+        features, use_grid = self._prepare(features)
+        if use_grid:
+            return self.grid['probabilities'][self._grid_cells(features)]
+        return softmax(self._walk_margin(features))
+
+    def predict(self, features):
+        return self.classes_[self.predict_margin(features).argmax(axis=1)]
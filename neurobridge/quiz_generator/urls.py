@@ -4,8 +4,12 @@ from . import views
 
 urlpatterns = [
     path('generate/', views.generate_quiz_view, name='generate_quiz'),
+    path('generate/stream/', views.generate_quiz_stream_view, name='generate_quiz_stream'),
+    path('jobs/', views.create_generation_job_view, name='create_generation_job'),
+    path('jobs/<uuid:job_id>/', views.generation_job_status_view, name='generation_job_status'),
     path('submit/', views.submit_assessment_view, name='submit_assessment'),
     path('submit-combined/', views.submit_combined_assessment_view, name='submit_combined_assessment'),
     path('submit-combined-manual-autism/', views.submit_combined_manual_autism_view, name='submit_combined_manual_autism'),
     path('info/', views.quiz_info_view, name='quiz_info'),
+    path('metrics/', views.llm_metrics_view, name='llm_metrics'),
 ]
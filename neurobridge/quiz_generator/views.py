@@ -1,17 +1,39 @@
 # quiz_generator/views.py
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.utils import timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from .serializers import QuizGenerationRequestSerializer
-from .models import AssessmentQuestion, AssessmentSession, AssessmentResponse, QuestionTiming
+from .models import AssessmentSession, AssessmentResponse, QuestionTiming, QuizGenerationJob
 from profiles.models import StudentProfile
+import json
 import random
+import time
 import uuid
 
 # Import your function from the script
-from .gemini_mcq_generator import generate_assessment_questions
+from .answer_key_cache import get_answer_key_cache
+from .concurrency import generation_flight, get_llm_limiter
+from .gemini_mcq_generator import stream_assessment_questions
+from .generation_jobs import enqueue_generation_job, expire_stale_job
+from .idempotency import find_replay, replay_response, submission_key
+from .llm_metrics import llm_metrics
+from .model_registry import get_model_registry
+from .persistence import build_question, is_storable_question, resolve_condition_type, save_question
+from .prediction_tasks import enqueue_prediction
+from .question_bank import draw_questions, fallback_questions, schedule_refill
+from .quiz_builder import (
+    build_quiz_payload, format_question, generate_quiz_questions, get_customization_reason,
+    get_generation_breaker, get_pre_assessment_data, save_quiz_session
+)
+from .scoring import (
+    build_responses, canonical_question_id, decode_compact_answers, load_questions, load_quiz_session, quiz_question_ids,
+    resolve_positions, score_answers, tally_percentage
+)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -27,11 +49,27 @@ def submit_assessment_view(request):
             {"question_id": "uuid", "selected_answer": "B", "is_correct": false, "response_time": 3.1},
             ...
         ],
-        "total_questions": 10,
-        "correct_answers": 7
+        "total_questions": 10
     }
     
     Returns the assessment results and assigns random dyslexic type/severity for now.
+    
+    When session_id belongs to a quiz served by the generate endpoints, the stored quiz
+    decides the question set, assessment type, total and pre-assessment data, so the
+    client only needs to send answers; each may give the question's 0-based "position"
+    in the quiz instead of its question_id, e.g. {"position": 0, "selected_answer": "A"}.
+    
+    Instead of "answers" and "question_timings", a compact columnar form may be sent
+    (see scoring.decode_compact_answers):
+    {
+        "session_id": "uuid-string",
+        "compact": {"answers": "ACB-D...", "response_times": [5.2, ...],
+                    "start_times": [...], "end_times": [...]}
+    }
+    
+    Submissions are idempotent per Idempotency-Key header, or per session_id when it is
+    the UUID from generate_quiz_view: a retry returns the original response with an
+    "Idempotent-Replayed: true" header and nothing is saved or predicted again.
     """
     # Check if user is a student
     if request.user.user_type != 'student':
@@ -42,186 +80,154 @@ def submit_assessment_view(request):
     assessment_type = request.data.get('assessment_type', 'both')
     answers = request.data.get('answers', [])
     total_questions = request.data.get('total_questions', 0)
-    correct_answers = request.data.get('correct_answers', 0)
     total_assessment_time = request.data.get('total_assessment_time', 0)
     question_timings = request.data.get('question_timings', [])
     
+    # A retried submission returns the stored result without rescoring or rerunning predictions
+    idempotency_key = submission_key(request, 'submit', session_id)
+    replay = find_replay(request.user, idempotency_key)
+    if replay is not None:
+        return replay_response(replay)
+    
+    # A quiz served by the generate endpoints is stored server-side: its question set,
+    # type, length and pre-assessment snapshot replace the client's copies
+    quiz_session = load_quiz_session(request.user, session_id)
+    if quiz_session is not None:
+        assessment_type = quiz_session.assessment_type
+        total_questions = quiz_session.total_questions
+        answers = resolve_positions(answers, quiz_session)
+        question_timings = resolve_positions(question_timings, quiz_session)
+    
+    # Compact columnar answers replace both "answers" and "question_timings"
+    compact = request.data.get('compact')
+    if compact is not None:
+        try:
+            answers, question_timings = decode_compact_answers(compact, quiz_session)
+        except ValueError as e:
+            return Response({
+                'error': 'Invalid compact answers',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        total_questions = total_questions or len(answers)
+    
     if not answers or total_questions == 0:
         return Response({
             'error': 'Assessment answers and total questions are required'
         }, status=status.HTTP_400_BAD_REQUEST)
-      # Calculate accuracy percentage
-    accuracy = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
     
     try:
         # Get pre-assessment data if available
-        pre_assessment_data = request.data.get('pre_assessment_data', {})
-        
-        # Create assessment session with timing data and pre-assessment info
-        session = AssessmentSession.objects.create(
-            user=request.user,
-            assessment_type=assessment_type,
-            total_questions=total_questions,
-            correct_answers=correct_answers,
-            accuracy_percentage=accuracy,
-            total_assessment_time=total_assessment_time,
-            # Pre-assessment data fields
-            student_age=pre_assessment_data.get('age'),
-            student_grade=pre_assessment_data.get('grade'),
-            reading_level=pre_assessment_data.get('reading_level'),
-            primary_language=pre_assessment_data.get('primary_language', 'English'),
-            has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
-            needs_assistance=pre_assessment_data.get('needs_assistance', False),
-            previous_assessment=pre_assessment_data.get('previous_assessment', False),
-            difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
-            customization_reason=pre_assessment_data.get('customization_reason'),
-            visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
-            # Assign random values for now (AI model will update these later)
-            predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
-            predicted_severity=random.choice(['mild', 'moderate', 'severe'])
-        )
-        
-        # Save individual responses for AI analysis
-        wrong_questions = []
-        backend_correct_count = 0  # Recalculate based on backend verification
-        
-        # Separate counters for dyslexia and autism scores
-        dyslexia_correct = 0
-        dyslexia_total = 0
-        autism_correct = 0
-        autism_total = 0
-        
-        for answer in answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')  # This will be A, B, C, or D
-            is_correct = answer.get('is_correct', False)  # Frontend calculated this
-            response_time = answer.get('response_time', 0)
-            
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                # Double-check correctness on backend as well
-                if user_answer in ['A', 'B', 'C', 'D']:
-                    option_index = ord(user_answer) - ord('A')
-                    if 0 <= option_index < len(question.options):
-                        selected_option_text = question.options[option_index]
-                        backend_is_correct = selected_option_text == question.correct_answer
-                        # Use backend calculation as authoritative
-                        is_correct = backend_is_correct
-                        if is_correct:
-                            backend_correct_count += 1
-                
-                # Count by condition type for separate scoring
-                if question.condition_type == 'dyslexia':
-                    dyslexia_total += 1
-                    if is_correct:
-                        dyslexia_correct += 1
-                elif question.condition_type == 'autism':
-                    autism_total += 1
-                    if is_correct:
-                        autism_correct += 1
-                
-                # Create assessment response
-                AssessmentResponse.objects.create(
-                    session=session,
-                    question=question,
-                    user_answer=user_answer,
-                    is_correct=is_correct,
-                    response_time=response_time
-                )
-                
-                # Track wrong questions with their condition type
-                if not is_correct:
-                    wrong_questions.append({
-                        'question_id': str(question_id),
-                        'condition_type': question.condition_type,
-                        'difficulty': question.difficulty_level,
-                        'user_answer': user_answer,
-                        'correct_answer': question.correct_answer
-                    })
-                    
-            except AssessmentQuestion.DoesNotExist:
-                print(f"Question with ID {question_id} not found")
-                continue          # Calculate separate scores
-        dyslexia_score = (dyslexia_correct / dyslexia_total * 100) if dyslexia_total > 0 else None
-        autism_score = (autism_correct / autism_total * 100) if autism_total > 0 else None
-        
-        # Update session with backend-verified correct count and accuracy
-        session.correct_answers = backend_correct_count
-        session.accuracy_percentage = (backend_correct_count / total_questions) * 100 if total_questions > 0 else 0
-        session.dyslexia_score = dyslexia_score
-        session.autism_score = autism_score
-        session.save()
-        
-        # Save detailed question timing data
+        if quiz_session is not None:
+            pre_assessment_data = quiz_session.pre_assessment_data
+        else:
+            pre_assessment_data = request.data.get('pre_assessment_data', {})
+        
+        # Fetch the quiz's questions (or every referenced question) in at most one query
+        questions = load_questions(quiz_question_ids(quiz_session, answers + question_timings))
+        
+        # Score all answers in one pass; the backend result is authoritative wherever the
+        # answer can be checked, otherwise the client's is_correct counts toward the scores
+        scores = score_answers(answers, questions, trust_client=True)
+        for question_id in scores['missing']:
+            print(f"Question with ID {question_id} not found")
+        backend_correct_count = scores['correct']
+        wrong_questions = scores['wrong_questions']
+        
+        # Calculate separate scores
+        dyslexia_score = tally_percentage(scores['by_condition'], 'dyslexia')
+        autism_score = tally_percentage(scores['by_condition'], 'autism')
+        
+        # Detailed question timing data
+        timing_rows = []
+        timed = set()
         for timing_data in question_timings:
             question_id = timing_data.get('question_id')
-            start_time = timing_data.get('start_time', 0)
-            end_time = timing_data.get('end_time', 0)
-            response_time = timing_data.get('response_time', 0)
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                QuestionTiming.objects.create(
-                    session=session,
-                    question=question,
-                    start_time=start_time,
-                    end_time=end_time,
-                    response_time=response_time
-                )
-            except AssessmentQuestion.DoesNotExist:
+            question = questions.get(canonical_question_id(question_id))
+            if question is None:
                 print(f"Question with ID {question_id} not found for timing data")
                 continue
+            if question.pk in timed:
+                continue
+            timed.add(question.pk)
+            timing_rows.append(QuestionTiming(
+                question_id=question.pk,
+                start_time=timing_data.get('start_time', 0),
+                end_time=timing_data.get('end_time', 0),
+                response_time=timing_data.get('response_time', 0)
+            ))
+        
+        with transaction.atomic():
+            # Create assessment session with backend-verified scores, timing data and pre-assessment info
+            session = AssessmentSession(
+                user=request.user,
+                assessment_type=assessment_type,
+                total_questions=total_questions,
+                correct_answers=backend_correct_count,
+                accuracy_percentage=(backend_correct_count / total_questions) * 100 if total_questions > 0 else 0,
+                dyslexia_score=dyslexia_score,
+                autism_score=autism_score,
+                total_assessment_time=total_assessment_time,
+                # Pre-assessment data fields
+                student_age=pre_assessment_data.get('age'),
+                student_grade=pre_assessment_data.get('grade'),
+                reading_level=pre_assessment_data.get('reading_level'),
+                primary_language=pre_assessment_data.get('primary_language', 'English'),
+                has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
+                needs_assistance=pre_assessment_data.get('needs_assistance', False),
+                previous_assessment=pre_assessment_data.get('previous_assessment', False),
+                difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
+                customization_reason=pre_assessment_data.get('customization_reason'),
+                visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
+                # Assign random values for now (AI model will update these later)
+                predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
+                predicted_severity=random.choice(['mild', 'moderate', 'severe']),
+                idempotency_key=idempotency_key
+            )
+            session.response_payload = payload = {
+                'session_id': str(session.session_id),
+                'assessment_type': assessment_type,
+                'accuracy': session.accuracy_percentage,
+                'total_questions': total_questions,
+                'correct_answers': backend_correct_count,
+                'dyslexia_score': dyslexia_score,
+                'autism_score': autism_score,
+                'wrong_questions': wrong_questions,
+                'wrong_questions_count': len(wrong_questions),
+                'difficulty_breakdown': scores['by_difficulty'],
+                'predicted_dyslexic_type': session.predicted_dyslexic_type,
+                'predicted_severity': session.predicted_severity,
+                'message': 'Assessment completed successfully. Results saved for AI analysis.'
+            }
+            session.save(force_insert=True)
+            
+            AssessmentResponse.objects.bulk_create(build_responses(session, scores['results']))
+            for row in timing_rows:
+                row.session = session
+            QuestionTiming.objects.bulk_create(timing_rows)
+            
+            # Update student profile with corrected assessment score and separate scores
+            student_profile, created = StudentProfile.objects.get_or_create(
+                user=request.user,
+                defaults={'student_id': f'STU{request.user.id:06d}'}
+            )
+            student_profile.assessment_score = session.accuracy_percentage
+            student_profile.assessment_type = assessment_type
+            student_profile.dyslexia_score = dyslexia_score
+            student_profile.autism_score = autism_score
+            student_profile.save(update_fields=['assessment_score', 'assessment_type', 'dyslexia_score', 'autism_score'])
+            
+            # Predictions run on the background queue once this transaction commits
+            if assessment_type in ['both', 'dyslexia', 'autism']:
+                enqueue_prediction(session, assessment_type)
         
-        # Update student profile with corrected assessment score and separate scores
-        student_profile, created = StudentProfile.objects.get_or_create(
-            user=request.user,
-            defaults={'student_id': f'STU{request.user.id:06d}'}
-        )
-        student_profile.assessment_score = session.accuracy_percentage
-        student_profile.assessment_type = assessment_type
-        student_profile.dyslexia_score = dyslexia_score
-        student_profile.autism_score = autism_score
-        student_profile.save()
-        
-        # Trigger AI predictions asynchronously based on assessment type
-        if assessment_type == 'both':
-            # Use unified prediction function for combined assessments
-            from .dyslexia_predictor import run_both_predictions_async
-            try:
-                run_both_predictions_async(session.id)
-            except Exception as e:
-                print(f"Both predictions failed: {e}")  # Log but don't fail assessment
-        elif assessment_type == 'dyslexia':
-            # Use dyslexia-only prediction
-            from .dyslexia_predictor import run_dyslexia_prediction_async
-            try:
-                run_dyslexia_prediction_async(session.id)
-            except Exception as e:
-                print(f"Dyslexia prediction failed: {e}")  # Log but don't fail assessment
-        elif assessment_type == 'autism':
-            # Use autism-only prediction
-            from .autism_predictor import run_autism_prediction_async
-            try:
-                run_autism_prediction_async(session.id)
-            except Exception as e:
-                print(f"Autism prediction failed: {e}")  # Log but don't fail assessment
-        
-        return Response({
-            'session_id': str(session.session_id),
-            'assessment_type': assessment_type,
-            'accuracy': session.accuracy_percentage,
-            'total_questions': total_questions,
-            'correct_answers': backend_correct_count,
-            'dyslexia_score': dyslexia_score,
-            'autism_score': autism_score,
-            'wrong_questions': wrong_questions,
-            'wrong_questions_count': len(wrong_questions),
-            'predicted_dyslexic_type': session.predicted_dyslexic_type,
-            'predicted_severity': session.predicted_severity,
-            'message': 'Assessment completed successfully. Results saved for AI analysis.'
-        }, status=status.HTTP_200_OK)
+        return Response(payload, status=status.HTTP_200_OK)
         
     except Exception as e:
+        if isinstance(e, IntegrityError):
+            # A concurrent retry with the same idempotency key may have been saved first
+            replay = find_replay(request.user, idempotency_key)
+            if replay is not None:
+                return replay_response(replay)
         return Response({
             'error': f'Failed to save assessment results: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -260,14 +266,6 @@ def generate_quiz_view(request):
     num_moderate = custom_distribution['moderate']
     num_hard = custom_distribution['hard']
     
-    # Set condition based on assessment type
-    if assessment_type == 'dyslexia':
-        condition = 'dyslexia'
-    elif assessment_type == 'autism':
-        condition = 'autism'
-    else:  # both
-        condition = 'mixed'
-    
     # Check if visual assessment is recommended
     use_visual_assessment = serializer.should_use_visual_assessment()
       # Log pre-assessment customization for debugging
@@ -301,128 +299,20 @@ def generate_quiz_view(request):
     print(f"  Visual assessment recommended: {use_visual_assessment}")
 
     try:
-        # Generate questions based on assessment type
-        questions_data = generate_assessment_questions(
-            condition=condition,
-            num_easy=num_easy,
-            num_moderate=num_moderate,
-            num_hard=num_hard
-        )
-
-        # Check for errors
-        if "error" in questions_data:
-            return Response({
-                'error': 'Failed to generate questions',
-                'details': questions_data.get('error')
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        saved_questions, error = generate_quiz_questions(assessment_type, num_easy, num_moderate, num_hard)
+        if error is not None:
+            return Response(error, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Process and save questions to database
-        all_questions = []
-        questions = questions_data.get("questions", [])
-          # Calculate expected total questions
-        expected_total = num_easy + num_moderate + num_hard
-        
-        # Ensure we have the expected number of questions
-        if len(questions) != expected_total:
-            return Response({
-                'error': f'Expected {expected_total} questions but got {len(questions)}',
-                'details': 'Question generation did not produce the expected count'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)        # Save questions to database and format for response
-        dyslexia_count = 0
-        autism_count = 0
-        
-        for i, q in enumerate(questions):
-            # Determine condition type based on assessment type and question data
-            if assessment_type == 'dyslexia':
-                condition_type = 'dyslexia'
-                dyslexia_count += 1
-            elif assessment_type == 'autism':
-                condition_type = 'autism'
-                autism_count += 1
-            else:  # both assessments
-                # For 'both' assessment type, use focus_area field from Gemini
-                if 'focus_area' in q:
-                    condition_type = q['focus_area']
-                else:
-                    # Fallback: alternate between dyslexia and autism to ensure mix
-                    condition_type = 'dyslexia' if i % 2 == 0 else 'autism'
-                
-                if condition_type == 'dyslexia':
-                    dyslexia_count += 1
-                else:
-                    autism_count += 1
-            
-            question = AssessmentQuestion.objects.create(
-                question_text=q['question'],
-                options=q['options'],
-                correct_answer=q['correct_answer'],
-                condition_type=condition_type,
-                difficulty_level=q.get('difficulty', 'medium')
-            )
-            
-            formatted_question = {
-                'id': i + 1,
-                'question_id': str(question.question_id),
-                'question': q['question'],
-                'options': q['options'],
-                'correct_answer': q['correct_answer'],
-                'difficulty': q.get('difficulty', 'medium'),
-                'condition': condition_type,
-                'question_type': condition_type,  # Added for frontend clarity
-                'explanation': q.get('explanation', '')
-            }
-            all_questions.append(formatted_question)
-          # Shuffle questions for randomized order
-        random.shuffle(all_questions)
-        
-        # Validate question counts based on assessment type
-        expected_total = 10 if assessment_type in ['dyslexia', 'autism'] else 20
-        if len(all_questions) != expected_total:
-            return Response({
-                'error': f'Expected {expected_total} questions but got {len(all_questions)}',
-                'details': f'Question generation failed for assessment type: {assessment_type}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # For 'both' assessment type, ensure we have questions from both conditions
-        if assessment_type == 'both':
-            if dyslexia_count == 0 or autism_count == 0:
-                return Response({
-                    'error': 'Both assessment types must have questions',
-                    'details': f'Generated {dyslexia_count} dyslexia and {autism_count} autism questions'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Generate session ID for tracking
-        session_id = str(uuid.uuid4())        # Build response
-        response_data = {
-            'session_id': session_id,
-            'questions': all_questions,
-            'total_questions': len(all_questions),
-            'condition': condition,
-            'assessment_type': assessment_type,
-            'dyslexia_questions': dyslexia_count,
-            'autism_questions': autism_count,
-            'difficulty_distribution': {
-                'easy': num_easy,
-                'moderate': num_moderate,
-                'hard': num_hard
-            },
-            'pre_assessment_data': {
-                'age': validated_data.get('age'),
-                'grade': validated_data.get('grade'),
-                'reading_level': validated_data.get('reading_level'),
-                'primary_language': validated_data.get('primary_language'),
-                'has_reading_difficulty': validated_data.get('has_reading_difficulty', False),
-                'needs_assistance': validated_data.get('needs_assistance', False),
-                'previous_assessment': validated_data.get('previous_assessment', False)
-            },            'recommendations': {
-                'use_visual_assessment': use_visual_assessment,
-                'difficulty_customized': True,
-                'customization_reason': _get_customization_reason(validated_data)
-            },
-            'generated_at': timezone.now(),
-            'generated_by': request.user.id,
-            'message': f'Generated {len(all_questions)} questions for {assessment_type} assessment (customized based on pre-assessment data)'
-        }        
+        response_data, error = build_quiz_payload(
+            saved_questions,
+            assessment_type=assessment_type,
+            distribution=custom_distribution,
+            validated_data=validated_data,
+            use_visual_assessment=use_visual_assessment,
+            user_id=request.user.id
+        )
+        if error is not None:
+            return Response(error, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(response_data, status=status.HTTP_200_OK)
 
     except Exception as e:
@@ -432,36 +322,231 @@ def generate_quiz_view(request):
             'details': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def _get_customization_reason(validated_data, user=None):
-    """Helper function to explain why difficulty was customized."""
-    # Get data from user profile if available
-    age = 10
-    reading_level = ''
-    has_reading_difficulty = False
-    
-    if user and hasattr(user, 'student_profile'):
-        try:
-            profile = user.student_profile
-            if profile.pre_assessment_completed:
-                age = profile.age or 10
-                reading_level = profile.reading_level or ''
-                has_reading_difficulty = profile.has_reading_difficulty
-        except Exception:
-            pass
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_generation_job_view(request):
+    """
+    Start generating a quiz in the background and return immediately.
+    
+    POST /api/quiz/jobs/
+    
+    Takes the same request body as /api/quiz/generate/. Responds with 202 and the job id;
+    poll GET /api/quiz/jobs/<job_id>/ until the status is "completed" or "failed".
+    """
+    serializer = QuizGenerationRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'error': 'Invalid request data',
+            'details': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    validated_data = serializer.validated_data
+    custom_distribution = serializer.get_customized_difficulty_distribution(user=request.user)
+    
+    try:
+        with transaction.atomic():
+            job = QuizGenerationJob.objects.create(
+                user=request.user,
+                assessment_type=validated_data.get('assessment_type', 'both'),
+                request_data=dict(validated_data),
+                num_easy=custom_distribution['easy'],
+                num_moderate=custom_distribution['moderate'],
+                num_hard=custom_distribution['hard'],
+                use_visual_assessment=serializer.should_use_visual_assessment()
+            )
+            enqueue_generation_job(job)
+    except Exception as e:
+        return Response({
+            'error': 'Failed to start question generation',
+            'details': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'job_id': str(job.job_id),
+        'status': job.status,
+        'total_questions': job.total_questions,
+        'status_url': request.build_absolute_uri(reverse('generation_job_status', args=[job.job_id]))
+    }, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def generation_job_status_view(request, job_id):
+    """
+    Get the progress of a quiz generation job, and the quiz once it is ready.
+    
+    GET /api/quiz/jobs/<job_id>/
+    
+    "quiz" holds the same body /api/quiz/generate/ returns and is only set when the
+    status is "completed"; "error" is only set when the status is "failed".
+    """
+    try:
+        job = QuizGenerationJob.objects.get(job_id=job_id, user=request.user)
+    except QuizGenerationJob.DoesNotExist:
+        return Response({
+            'error': 'Generation job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    expire_stale_job(job)
+    
+    return Response({
+        'job_id': str(job.job_id),
+        'status': job.status,
+        'assessment_type': job.assessment_type,
+        'questions_ready': job.questions_ready,
+        'total_questions': job.total_questions,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'completed_at': job.completed_at,
+        'quiz': job.result if job.status == 'completed' else None,
+        'error': job.error if job.status == 'failed' else None
+    }, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def generate_quiz_stream_view(request):
+    """
+    Streaming variant of generate_quiz_view using Server-Sent Events.
+    
+    POST /api/quiz/generate/stream/
+    
+    Takes the same request body as /api/quiz/generate/. Each question is saved and sent
+    as soon as Gemini finishes writing it, so the first question can be shown while the
+    rest are still being generated. Questions arrive in generation order (not shuffled).
+    
+    Events:
+    - start:    {"session_id", "assessment_type", "condition", "total_questions", "difficulty_distribution"}
+    - question: one formatted question, same shape as in generate_quiz_view
+    - done:     {"session_id", "total_questions", "dyslexia_questions", "autism_questions"}
+    - error:    {"error", "details"}
+    """
+    serializer = QuizGenerationRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'error': 'Invalid request data',
+            'details': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Fallback to request data if profile data not available
-    age = validated_data.get('age', age)
-    reading_level = validated_data.get('reading_level', reading_level)
-    has_reading_difficulty = validated_data.get('has_reading_difficulty', has_reading_difficulty)
-    
-    if age < 7 or reading_level in ['Cannot read yet', 'Beginning reader (simple words)']:
-        return "Adjusted for young age or beginning reading level"
-    elif age < 12 or reading_level == 'Early reader (simple sentences)':
-        return "Adjusted for younger student or early reading level"
-    elif has_reading_difficulty:
-        return "Adjusted for reported reading difficulties"
-    else:
-        return "Standard distribution for typical student profile"
+    validated_data = serializer.validated_data
+    assessment_type = validated_data.get('assessment_type', 'both')
+    custom_distribution = serializer.get_customized_difficulty_distribution(user=request.user)
+    num_easy = custom_distribution['easy']
+    num_moderate = custom_distribution['moderate']
+    num_hard = custom_distribution['hard']
+    condition = assessment_type if assessment_type in ['dyslexia', 'autism'] else 'mixed'
+    session_id = str(uuid.uuid4())
+
+    def event_stream():
+        expected_total = num_easy + num_moderate + num_hard
+        yield _sse_event('start', {
+            'session_id': session_id,
+            'assessment_type': assessment_type,
+            'condition': condition,
+            'total_questions': expected_total,
+            'difficulty_distribution': custom_distribution
+        })
+
+        sent = 0
+        dyslexia_count = 0
+        generation_started = None
+        try:
+            banked_questions = None
+            if getattr(settings, 'QUESTION_BANK_ENABLED', True):
+                banked_questions = draw_questions(condition, num_easy, num_moderate, num_hard)
+                schedule_refill()
+            if banked_questions is None and not get_generation_breaker().allow_request():
+                # Generator is failing: serve stored questions instead of waiting on it
+                banked_questions = fallback_questions(condition, num_easy, num_moderate, num_hard)
+                if banked_questions is None:
+                    yield _sse_event('error', {
+                        'error': 'Failed to generate questions',
+                        'details': 'Question generation is temporarily unavailable and not enough stored questions match'
+                    })
+                    return
+
+            if banked_questions is not None:
+                random.shuffle(banked_questions)
+                question_source = iter(banked_questions)
+            else:
+                generation_started = time.monotonic()
+                saved_questions = (
+                    _save_streamed_question(q, assessment_type, i)
+                    for i, q in enumerate(stream_assessment_questions(
+                        condition=condition,
+                        num_easy=num_easy,
+                        num_moderate=num_moderate,
+                        num_hard=num_hard
+                    ))
+                )
+                # Invalid questions are skipped, as save_generated_questions rejects them
+                question_source = (question for question in saved_questions if question is not None)
+
+            sent_ids = set()
+            sent_question_ids = []
+            for question in question_source:
+                if question.id in sent_ids:
+                    # The model repeated a question that resolved to an already-sent row
+                    continue
+                sent_ids.add(question.id)
+                sent_question_ids.append(str(question.question_id))
+                if question.condition_type == 'dyslexia':
+                    dyslexia_count += 1
+                get_answer_key_cache().put_many([question])
+                yield _sse_event('question', format_question(sent, question))
+                sent += 1
+                if sent >= expected_total:
+                    break
+        except Exception as e:
+            print(f"An unexpected error occurred in generate_quiz_stream_view: {e}")
+            if generation_started is not None:
+                get_generation_breaker().record(time.monotonic() - generation_started, error=True)
+            yield _sse_event('error', {
+                'error': 'Failed to generate questions',
+                'details': str(e)
+            })
+            return
+
+        if generation_started is not None:
+            get_generation_breaker().record(time.monotonic() - generation_started, error=sent != expected_total)
+
+        if sent != expected_total:
+            yield _sse_event('error', {
+                'error': f'Expected {expected_total} questions but got {sent}',
+                'details': 'Question generation did not produce the expected count'
+            })
+            return
+
+        save_quiz_session(
+            user_id=request.user.id,
+            assessment_type=assessment_type,
+            question_ids=sent_question_ids,
+            distribution=custom_distribution,
+            pre_assessment_data=get_pre_assessment_data(validated_data),
+            customization_reason=get_customization_reason(validated_data),
+            use_visual_assessment=serializer.should_use_visual_assessment(),
+            session_id=session_id
+        )
+        yield _sse_event('done', {
+            'session_id': session_id,
+            'total_questions': sent,
+            'dyslexia_questions': dyslexia_count,
+            'autism_questions': sent - dyslexia_count
+        })
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+    return response
+
+def _sse_event(event, data):
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _save_streamed_question(question_data, assessment_type, index):
+    """Persist one streamed question as soon as it arrives; None if it is not storable."""
+    condition_type = resolve_condition_type(assessment_type, question_data, index)
+    if not is_storable_question(question_data, condition_type):
+        return None
+    return save_question(build_question(question_data, condition_type))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -482,6 +567,34 @@ def quiz_info_view(request):
     
     return Response(info, status=status.HTTP_200_OK)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def llm_metrics_view(request):
+    """
+    LLM call and question generation metrics for this worker process.
+    
+    GET /api/quiz/metrics/
+    
+    Histograms report count, sum, mean, max, cumulative bucket counts and estimated
+    p50/p95/p99. Pass ?reset=true to clear them after reading.
+    """
+    limiter = get_llm_limiter()
+    metrics = llm_metrics.snapshot()
+    metrics['llm_calls'] = {
+        'active': limiter.active,
+        'queued': limiter.waiting,
+        'max_concurrent': limiter.max_concurrent_calls
+    }
+    metrics['coalesced_generations_in_flight'] = len(generation_flight.in_flight())
+    metrics['circuit_breaker'] = get_generation_breaker().snapshot()
+    metrics['answer_key_cache'] = get_answer_key_cache().stats()
+    metrics['models'] = get_model_registry().stats()
+    
+    if request.query_params.get('reset') == 'true':
+        llm_metrics.reset()
+    
+    return Response(metrics, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def submit_combined_assessment_view(request):
@@ -503,6 +616,9 @@ def submit_combined_assessment_view(request):
         "total_assessment_time": 300
     }
     
+    Either answer list may instead be sent as "dyslexia_compact" / "autism_compact" in the
+    compact columnar form accepted by submit_assessment_view.
+    
     Returns combined assessment results with separate scores for each condition.
     """
     # Check if user is a student
@@ -518,6 +634,26 @@ def submit_combined_assessment_view(request):
     autism_answers = request.data.get('autism_answers', [])
     total_assessment_time = request.data.get('total_assessment_time', 0)
     
+    idempotency_key = submission_key(request, 'submit-combined', dyslexia_session_id, autism_session_id)
+    replay = find_replay(request.user, idempotency_key)
+    if replay is not None:
+        return replay_response(replay)
+    
+    dyslexia_quiz = load_quiz_session(request.user, dyslexia_session_id)
+    autism_quiz = load_quiz_session(request.user, autism_session_id)
+    dyslexia_answers = resolve_positions(dyslexia_answers, dyslexia_quiz)
+    autism_answers = resolve_positions(autism_answers, autism_quiz)
+    try:
+        if request.data.get('dyslexia_compact') is not None:
+            dyslexia_answers, _ = decode_compact_answers(request.data['dyslexia_compact'], dyslexia_quiz)
+        if request.data.get('autism_compact') is not None:
+            autism_answers, _ = decode_compact_answers(request.data['autism_compact'], autism_quiz)
+    except ValueError as e:
+        return Response({
+            'error': 'Invalid compact answers',
+            'details': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
     if not dyslexia_answers or not autism_answers:
         return Response({
             'error': 'Both dyslexia and autism answers are required'
@@ -528,178 +664,102 @@ def submit_combined_assessment_view(request):
         all_answers = dyslexia_answers + autism_answers
         total_questions = len(all_answers)
         
-        # Process all answers and separate by condition
-        wrong_questions = []
-        backend_correct_count = 0
-        dyslexia_correct = 0
-        dyslexia_total = len(dyslexia_answers)
-        autism_correct = 0
-        autism_total = len(autism_answers)
+        # Fetch each question once and score all answers in one pass, each under the
+        # condition of the list it was submitted in
+        questions = load_questions(
+            quiz_question_ids(dyslexia_quiz, dyslexia_answers) + quiz_question_ids(autism_quiz, autism_answers)
+        )
+        scores = score_answers(
+            [dict(answer, condition_type='dyslexia') for answer in dyslexia_answers]
+            + [dict(answer, condition_type='autism') for answer in autism_answers],
+            questions
+        )
+        for question_id in scores['missing']:
+            print(f"Question with ID {question_id} not found")
+        backend_correct_count = scores['correct']
+        wrong_questions = scores['wrong_questions']
+        
+        # Calculate scores; as before, each list's length (unknown questions included) is its total
+        by_condition = scores['by_condition']
+        dyslexia_score = by_condition.get('dyslexia', {}).get('correct', 0) / len(dyslexia_answers) * 100
+        autism_score = by_condition.get('autism', {}).get('correct', 0) / len(autism_answers) * 100
+        overall_accuracy = (backend_correct_count / total_questions * 100) if total_questions > 0 else 0
         
-        # Process dyslexia answers
-        for answer in dyslexia_answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')
-            response_time = answer.get('response_time', 0)
+        # Get pre-assessment data, preferring the snapshot stored with the quiz
+        quiz_session = dyslexia_quiz or autism_quiz
+        if quiz_session is not None:
+            pre_assessment_data = quiz_session.pre_assessment_data
+        else:
+            pre_assessment_data = request.data.get('pre_assessment_data', {})
+        
+        with transaction.atomic():
+            # Create combined assessment session
+            session = AssessmentSession(
+                user=request.user,
+                assessment_type='both',
+                total_questions=total_questions,
+                correct_answers=backend_correct_count,
+                accuracy_percentage=overall_accuracy,
+                dyslexia_score=dyslexia_score,
+                autism_score=autism_score,
+                total_assessment_time=total_assessment_time,
+                # Pre-assessment data fields
+                student_age=pre_assessment_data.get('age'),
+                student_grade=pre_assessment_data.get('grade'),
+                reading_level=pre_assessment_data.get('reading_level'),
+                primary_language=pre_assessment_data.get('primary_language', 'English'),
+                has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
+                needs_assistance=pre_assessment_data.get('needs_assistance', False),
+                previous_assessment=pre_assessment_data.get('previous_assessment', False),
+                difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
+                customization_reason=pre_assessment_data.get('customization_reason'),
+                visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
+                predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
+                predicted_severity=random.choice(['mild', 'moderate', 'severe']),
+                idempotency_key=idempotency_key
+            )
+            session.response_payload = payload = {
+                'session_id': str(session.session_id),
+                'assessment_type': 'both',
+                'accuracy': overall_accuracy,
+                'total_questions': total_questions,
+                'correct_answers': backend_correct_count,
+                'dyslexia_score': dyslexia_score,
+                'autism_score': autism_score,
+                'wrong_questions': wrong_questions,
+                'wrong_questions_count': len(wrong_questions),
+                'difficulty_breakdown': scores['by_difficulty'],
+                'predicted_dyslexic_type': session.predicted_dyslexic_type,
+                'predicted_severity': session.predicted_severity,
+                'message': 'Combined assessment completed successfully. Results saved for AI analysis.'
+            }
+            session.save(force_insert=True)
             
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                # Verify correctness on backend
-                is_correct = False
-                if user_answer in ['A', 'B', 'C', 'D']:
-                    option_index = ord(user_answer) - ord('A')
-                    if 0 <= option_index < len(question.options):
-                        selected_option_text = question.options[option_index]
-                        is_correct = selected_option_text == question.correct_answer
-                        if is_correct:
-                            backend_correct_count += 1
-                            dyslexia_correct += 1
-                
-                # Track wrong questions
-                if not is_correct:
-                    wrong_questions.append({
-                        'question_id': str(question_id),
-                        'condition_type': 'dyslexia',
-                        'difficulty': question.difficulty_level,
-                        'user_answer': user_answer,
-                        'correct_answer': question.correct_answer
-                    })
-                    
-            except AssessmentQuestion.DoesNotExist:
-                print(f"Dyslexia question with ID {question_id} not found")
-                continue
-        
-        # Process autism answers
-        for answer in autism_answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')
-            response_time = answer.get('response_time', 0)
+            # Save individual responses for both dyslexia and autism
+            AssessmentResponse.objects.bulk_create(build_responses(session, scores['results']))
             
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                # Verify correctness on backend
-                is_correct = False
-                if user_answer in ['A', 'B', 'C', 'D']:
-                    option_index = ord(user_answer) - ord('A')
-                    if 0 <= option_index < len(question.options):
-                        selected_option_text = question.options[option_index]
-                        is_correct = selected_option_text == question.correct_answer
-                        if is_correct:
-                            backend_correct_count += 1
-                            autism_correct += 1
-                
-                # Track wrong questions
-                if not is_correct:
-                    wrong_questions.append({
-                        'question_id': str(question_id),
-                        'condition_type': 'autism',
-                        'difficulty': question.difficulty_level,
-                        'user_answer': user_answer,
-                        'correct_answer': question.correct_answer
-                    })
-                    
-            except AssessmentQuestion.DoesNotExist:
-                print(f"Autism question with ID {question_id} not found")
-                continue
-        
-        # Calculate scores
-        dyslexia_score = (dyslexia_correct / dyslexia_total * 100) if dyslexia_total > 0 else 0
-        autism_score = (autism_correct / autism_total * 100) if autism_total > 0 else 0
-        overall_accuracy = (backend_correct_count / total_questions * 100) if total_questions > 0 else 0
-          # Get pre-assessment data if available
-        pre_assessment_data = request.data.get('pre_assessment_data', {})
-        
-        # Create combined assessment session
-        session = AssessmentSession.objects.create(
-            user=request.user,
-            assessment_type='both',
-            total_questions=total_questions,
-            correct_answers=backend_correct_count,
-            accuracy_percentage=overall_accuracy,
-            dyslexia_score=dyslexia_score,
-            autism_score=autism_score,
-            total_assessment_time=total_assessment_time,
-            # Pre-assessment data fields
-            student_age=pre_assessment_data.get('age'),
-            student_grade=pre_assessment_data.get('grade'),
-            reading_level=pre_assessment_data.get('reading_level'),
-            primary_language=pre_assessment_data.get('primary_language', 'English'),
-            has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
-            needs_assistance=pre_assessment_data.get('needs_assistance', False),
-            previous_assessment=pre_assessment_data.get('previous_assessment', False),
-            difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
-            customization_reason=pre_assessment_data.get('customization_reason'),
-            visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
-            predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
-            predicted_severity=random.choice(['mild', 'moderate', 'severe'])
-        )
-        
-        # Save individual responses for both dyslexia and autism
-        for answer in all_answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')
-            response_time = answer.get('response_time', 0)
+            # Update student profile with combined assessment results
+            student_profile, created = StudentProfile.objects.get_or_create(
+                user=request.user,
+                defaults={'student_id': f'STU{request.user.id:06d}'}
+            )
+            student_profile.assessment_score = overall_accuracy
+            student_profile.assessment_type = 'both'
+            student_profile.dyslexia_score = dyslexia_score
+            student_profile.autism_score = autism_score
+            student_profile.save(update_fields=['assessment_score', 'assessment_type', 'dyslexia_score', 'autism_score'])
             
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                # Calculate correctness
-                is_correct = False
-                if user_answer in ['A', 'B', 'C', 'D']:
-                    option_index = ord(user_answer) - ord('A')
-                    if 0 <= option_index < len(question.options):
-                        selected_option_text = question.options[option_index]
-                        is_correct = selected_option_text == question.correct_answer
-                
-                AssessmentResponse.objects.create(
-                    session=session,
-                    question=question,
-                    user_answer=user_answer,
-                    is_correct=is_correct,
-                    response_time=response_time,
-                    difficulty_level=question.difficulty_level,
-                    condition_type=question.condition_type
-                )
-                
-            except AssessmentQuestion.DoesNotExist:
-                print(f"Question with ID {question_id} not found")
-                continue
-          # Update student profile with combined assessment results
-        student_profile, created = StudentProfile.objects.get_or_create(
-            user=request.user,
-            defaults={'student_id': f'STU{request.user.id:06d}'}
-        )
-        student_profile.assessment_score = overall_accuracy
-        student_profile.assessment_type = 'both'
-        student_profile.dyslexia_score = dyslexia_score
-        student_profile.autism_score = autism_score
-        student_profile.save()
+            # Predictions run on the background queue once this transaction commits
+            enqueue_prediction(session, 'both')
         
-        # Trigger both predictions asynchronously for combined assessment
-        try:
-            from .dyslexia_predictor import run_both_predictions_async
-            run_both_predictions_async(session.id)
-        except Exception as e:
-            print(f"Both predictions failed: {e}")  # Log but don't fail assessment
-        
-        return Response({
-            'session_id': str(session.session_id),
-            'assessment_type': 'both',
-            'accuracy': overall_accuracy,
-            'total_questions': total_questions,
-            'correct_answers': backend_correct_count,
-            'dyslexia_score': dyslexia_score,
-            'autism_score': autism_score,
-            'wrong_questions': wrong_questions,
-            'wrong_questions_count': len(wrong_questions),
-            'predicted_dyslexic_type': session.predicted_dyslexic_type,
-            'predicted_severity': session.predicted_severity,
-            'message': 'Combined assessment completed successfully. Results saved for AI analysis.'
-        }, status=status.HTTP_200_OK)
+        return Response(payload, status=status.HTTP_200_OK)
         
     except Exception as e:
+        if isinstance(e, IntegrityError):
+            # A concurrent retry with the same idempotency key may have been saved first
+            replay = find_replay(request.user, idempotency_key)
+            if replay is not None:
+                return replay_response(replay)
         return Response({
             'error': f'Failed to save combined assessment results: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -721,6 +781,9 @@ def submit_combined_manual_autism_view(request):
         "autism_question_timings": [...],
         "pre_assessment_data": {...}
     }
+    
+    autism_answers may instead be sent as "autism_compact" in the compact columnar form
+    accepted by submit_assessment_view.
     """
     # Check if user is a student
     if request.user.user_type != 'student':
@@ -736,48 +799,40 @@ def submit_combined_manual_autism_view(request):
     total_autism_time = request.data.get('total_autism_time', 0)
     pre_assessment_data = request.data.get('pre_assessment_data', {})
     
+    idempotency_key = submission_key(request, 'submit-combined-manual-autism', autism_session_id)
+    replay = find_replay(request.user, idempotency_key)
+    if replay is not None:
+        return replay_response(replay)
+    
+    autism_quiz = load_quiz_session(request.user, autism_session_id)
+    if autism_quiz is not None:
+        autism_answers = resolve_positions(autism_answers, autism_quiz)
+        pre_assessment_data = autism_quiz.pre_assessment_data
+    if request.data.get('autism_compact') is not None:
+        try:
+            autism_answers, _ = decode_compact_answers(request.data['autism_compact'], autism_quiz)
+        except ValueError as e:
+            return Response({
+                'error': 'Invalid compact answers',
+                'details': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
     if not all([dyslexia_results, dyslexia_responses, autism_session_id, autism_answers]):
         return Response({
             'error': 'All assessment data is required'
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Process autism answers
-        autism_correct = 0
+        # Fetch each question once and score all autism answers in one pass
+        scores = score_answers(
+            [dict(answer, condition_type='autism') for answer in autism_answers],
+            load_questions(quiz_question_ids(autism_quiz, autism_answers))
+        )
+        for question_id in scores['missing']:
+            print(f"Autism question with ID {question_id} not found")
+        autism_correct = scores['correct']
         autism_total = len(autism_answers)
-        wrong_questions = []
-        
-        for answer in autism_answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')
-            response_time = answer.get('response_time', 0)
-            
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                # Verify correctness on backend
-                is_correct = False
-                if user_answer in ['A', 'B', 'C', 'D']:
-                    option_index = ord(user_answer) - ord('A')
-                    if 0 <= option_index < len(question.options):
-                        selected_option_text = question.options[option_index]
-                        is_correct = selected_option_text == question.correct_answer
-                        if is_correct:
-                            autism_correct += 1
-                
-                # Track wrong questions
-                if not is_correct:
-                    wrong_questions.append({
-                        'question_id': str(question_id),
-                        'condition_type': 'autism',
-                        'difficulty': question.difficulty_level,
-                        'user_answer': user_answer,
-                        'correct_answer': question.correct_answer
-                    })
-                    
-            except AssessmentQuestion.DoesNotExist:
-                print(f"Autism question with ID {question_id} not found")
-                continue
+        wrong_questions = scores['wrong_questions']
         
         # Calculate scores
         autism_score = (autism_correct / autism_total * 100) if autism_total > 0 else 0
@@ -792,81 +847,70 @@ def submit_combined_manual_autism_view(request):
         total_questions = dyslexia_total_questions + autism_total
         overall_accuracy = (dyslexia_score * dyslexia_total_questions + autism_score * autism_total) / total_questions if total_questions > 0 else 0
         
-        # Create combined assessment session
-        session = AssessmentSession.objects.create(
-            user=request.user,
-            assessment_type='both',
-            total_questions=total_questions,
-            correct_answers=int(dyslexia_score * dyslexia_total_questions / 100) + autism_correct,
-            accuracy_percentage=overall_accuracy,
-            dyslexia_score=dyslexia_score,
-            autism_score=autism_score,
-            total_assessment_time=dyslexia_results.get('total_time', 0) + total_autism_time,
-            # Pre-assessment data fields
-            student_age=pre_assessment_data.get('age'),
-            student_grade=pre_assessment_data.get('grade'),
-            reading_level=pre_assessment_data.get('reading_level'),
-            primary_language=pre_assessment_data.get('primary_language', 'English'),
-            has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
-            needs_assistance=pre_assessment_data.get('needs_assistance', False),
-            previous_assessment=pre_assessment_data.get('previous_assessment', False),
-            difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
-            customization_reason=pre_assessment_data.get('customization_reason'),
-            visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
-            predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
-            predicted_severity=random.choice(['mild', 'moderate', 'severe'])
-        )
-        
-        # Save autism responses (dyslexia responses are already saved in manual assessment)
-        for answer in autism_answers:
-            question_id = answer.get('question_id')
-            user_answer = answer.get('selected_answer')
-            response_time = answer.get('response_time', 0)
-            is_correct = answer.get('is_correct', False)
+        with transaction.atomic():
+            # Create combined assessment session
+            session = AssessmentSession(
+                user=request.user,
+                assessment_type='both',
+                total_questions=total_questions,
+                correct_answers=int(dyslexia_score * dyslexia_total_questions / 100) + autism_correct,
+                accuracy_percentage=overall_accuracy,
+                dyslexia_score=dyslexia_score,
+                autism_score=autism_score,
+                total_assessment_time=dyslexia_results.get('total_time', 0) + total_autism_time,
+                # Pre-assessment data fields
+                student_age=pre_assessment_data.get('age'),
+                student_grade=pre_assessment_data.get('grade'),
+                reading_level=pre_assessment_data.get('reading_level'),
+                primary_language=pre_assessment_data.get('primary_language', 'English'),
+                has_reading_difficulty=pre_assessment_data.get('has_reading_difficulty', False),
+                needs_assistance=pre_assessment_data.get('needs_assistance', False),
+                previous_assessment=pre_assessment_data.get('previous_assessment', False),
+                difficulty_customized=pre_assessment_data.get('difficulty_customized', False),
+                customization_reason=pre_assessment_data.get('customization_reason'),
+                visual_assessment_recommended=pre_assessment_data.get('visual_assessment_recommended', False),
+                predicted_dyslexic_type=random.choice(['phonological', 'surface', 'mixed', 'rapid_naming', 'double_deficit']),
+                predicted_severity=random.choice(['mild', 'moderate', 'severe']),
+                idempotency_key=idempotency_key
+            )
+            session.response_payload = payload = {
+                'session_id': str(session.session_id),
+                'assessment_type': 'both',
+                'accuracy': overall_accuracy,
+                'total_questions': total_questions,
+                'dyslexia_score': dyslexia_score,
+                'autism_score': autism_score,
+                'wrong_questions': wrong_questions,
+                'difficulty_breakdown': scores['by_difficulty'],
+                'message': 'Combined manual dyslexia + autism assessment completed successfully.'
+            }
+            session.save(force_insert=True)
             
-            try:
-                question = AssessmentQuestion.objects.get(question_id=question_id)
-                
-                AssessmentResponse.objects.create(
-                    session=session,
-                    question=question,
-                    user_answer=user_answer,
-                    is_correct=is_correct,
-                    response_time=response_time
-                )
-            except AssessmentQuestion.DoesNotExist:
-                continue
-        
-        # Update student profile
-        student_profile, created = StudentProfile.objects.get_or_create(
-            user=request.user,
-            defaults={'student_id': f'STU{request.user.id:06d}'}
-        )
-        student_profile.assessment_score = overall_accuracy
-        student_profile.assessment_type = 'both'
-        student_profile.dyslexia_score = dyslexia_score
-        student_profile.autism_score = autism_score
-        student_profile.save()
-        
-        # Trigger both predictions asynchronously
-        try:
-            from .dyslexia_predictor import run_both_predictions_async
-            run_both_predictions_async(session.id)
-        except Exception as e:
-            print(f"Combined predictions failed: {e}")
+            # Save autism responses (dyslexia responses are already saved in manual assessment)
+            AssessmentResponse.objects.bulk_create(build_responses(session, scores['results']))
+            
+            # Update student profile
+            student_profile, created = StudentProfile.objects.get_or_create(
+                user=request.user,
+                defaults={'student_id': f'STU{request.user.id:06d}'}
+            )
+            student_profile.assessment_score = overall_accuracy
+            student_profile.assessment_type = 'both'
+            student_profile.dyslexia_score = dyslexia_score
+            student_profile.autism_score = autism_score
+            student_profile.save(update_fields=['assessment_score', 'assessment_type', 'dyslexia_score', 'autism_score'])
+            
+            # Predictions run on the background queue once this transaction commits
+            enqueue_prediction(session, 'both')
         
-        return Response({
-            'session_id': str(session.session_id),
-            'assessment_type': 'both',
-            'accuracy': overall_accuracy,
-            'total_questions': total_questions,
-            'dyslexia_score': dyslexia_score,
-            'autism_score': autism_score,
-            'wrong_questions': wrong_questions,
-            'message': 'Combined manual dyslexia + autism assessment completed successfully.'
-        }, status=status.HTTP_200_OK)
+        return Response(payload, status=status.HTTP_200_OK)
         
     except Exception as e:
+        if isinstance(e, IntegrityError):
+            # A concurrent retry with the same idempotency key may have been saved first
+            replay = find_replay(request.user, idempotency_key)
+            if replay is not None:
+                return replay_response(replay)
         return Response({
             'error': f'Failed to save combined manual-autism assessment results: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)